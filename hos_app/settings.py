@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import tempfile
 from decouple import config
 
 from pathlib import Path
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'trips.metrics.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -159,4 +161,103 @@ REST_FRAMEWORK = {
 }
 
 # OpenRouteService API Key
-OPENROUTESERVICE_API_KEY = config('OPENROUTESERVICE_API_KEY')
\ No newline at end of file
+OPENROUTESERVICE_API_KEY = config('OPENROUTESERVICE_API_KEY')
+OPENROUTESERVICE_BASE_URL = config('OPENROUTESERVICE_BASE_URL', default='https://api.openrouteservice.org')
+
+# Geocode cache: in-process LRU tier (size/TTL in seconds) in front of the
+# shared GeocodeCacheEntry table (TTL in seconds, 0 keeps entries forever).
+GEOCODE_CACHE_SIZE = config('GEOCODE_CACHE_SIZE', default=2048, cast=int)
+GEOCODE_CACHE_TTL = config('GEOCODE_CACHE_TTL', default=6 * 60 * 60, cast=int)
+GEOCODE_CACHE_DB_TTL = config('GEOCODE_CACHE_DB_TTL', default=30 * 24 * 60 * 60, cast=int)
+
+# OpenRouteService HTTP client: keep-alive pool size (also the number of
+# concurrent lookups), connect/read timeouts in seconds and retry backoff.
+# The async client used by AsyncPlanTripView may open up to
+# ORS_ASYNC_POOL_SIZE connections per event loop.
+ORS_POOL_SIZE = config('ORS_POOL_SIZE', default=8, cast=int)
+ORS_ASYNC_POOL_SIZE = config('ORS_ASYNC_POOL_SIZE', default=100, cast=int)
+ORS_CONNECT_TIMEOUT = config('ORS_CONNECT_TIMEOUT', default=3.05, cast=float)
+ORS_READ_TIMEOUT = config('ORS_READ_TIMEOUT', default=10, cast=float)
+ORS_RETRIES = config('ORS_RETRIES', default=3, cast=int)
+ORS_BACKOFF_FACTOR = config('ORS_BACKOFF_FACTOR', default=0.3, cast=float)
+
+# OpenRouteService quota: requests per minute per endpoint, e.g.
+# "geocode=100,directions=40,matrix=40" for the free plan; empty disables
+# client-side limiting. Bursts are capped at a tenth of the quota. Buckets
+# are shared by every process on the host through files in
+# ORS_RATE_LIMIT_DIR. Calls wait for quota up to
+# ORS_RATE_LIMIT_WAIT seconds (ORS_RATE_LIMIT_BATCH_WAIT for batch plans and
+# plan jobs), and batch work never takes the last ORS_RATE_LIMIT_RESERVE
+# share of a bucket.
+ORS_RATE_LIMITS = {
+    name.strip(): int(limit)
+    for name, limit in (item.split('=') for item in config('ORS_RATE_LIMITS', default='').split(',') if item.strip())
+}
+ORS_RATE_LIMIT_DIR = config('ORS_RATE_LIMIT_DIR', default=tempfile.gettempdir())
+ORS_RATE_LIMIT_WAIT = config('ORS_RATE_LIMIT_WAIT', default=10, cast=float)
+ORS_RATE_LIMIT_BATCH_WAIT = config('ORS_RATE_LIMIT_BATCH_WAIT', default=120, cast=float)
+ORS_RATE_LIMIT_RESERVE = config('ORS_RATE_LIMIT_RESERVE', default=0.25, cast=float)
+
+# Routing backend for get_route(): 'ors' (hosted directions API) or 'local'
+# (A* over the road graph file at ROUTING_GRAPH_PATH, built with
+# `manage.py build_road_graph`).
+ROUTING_BACKEND = config('ROUTING_BACKEND', default='ors')
+ROUTING_GRAPH_PATH = config('ROUTING_GRAPH_PATH', default='')
+
+# Fueling stops snap to the nearest truck stop from FUEL_STATIONS_PATH (CSV
+# with name, latitude, longitude[, city, state]) that is within
+# FUEL_STATION_SEARCH_MILES of the planned stop and FUEL_STATION_CORRIDOR_MILES
+# of the route. Unset, stops stay at approximate mile markers.
+FUEL_STATIONS_PATH = config('FUEL_STATIONS_PATH', default='')
+FUEL_STATION_CORRIDOR_MILES = config('FUEL_STATION_CORRIDOR_MILES', default=5, cast=float)
+FUEL_STATION_SEARCH_MILES = config('FUEL_STATION_SEARCH_MILES', default=50, cast=float)
+
+# Route geometry cache: keyed on waypoints rounded to ROUTE_CACHE_PRECISION
+# decimal places (4 is roughly 11 m) and bounded by packed geometry bytes.
+ROUTE_CACHE_MAX_BYTES = config('ROUTE_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+ROUTE_CACHE_PRECISION = config('ROUTE_CACHE_PRECISION', default=4, cast=int)
+ROUTE_CACHE_TTL = config('ROUTE_CACHE_TTL', default=24 * 60 * 60, cast=int)
+
+# Distance matrix for ordering multi-stop tours: pairwise distances are
+# cached (MATRIX_CACHE_SIZE pairs, ROUTE_CACHE_TTL) and cache misses are
+# fetched in requests of at most MATRIX_MAX_ELEMENTS origin/destination pairs.
+# TOUR_MAX_SHIPMENTS caps the shipments in one plan request.
+MATRIX_CACHE_SIZE = config('MATRIX_CACHE_SIZE', default=100_000, cast=int)
+MATRIX_MAX_ELEMENTS = config('MATRIX_MAX_ELEMENTS', default=3500, cast=int)
+TOUR_MAX_SHIPMENTS = config('TOUR_MAX_SHIPMENTS', default=25, cast=int)
+
+# Batch planning: schedules are computed on a pool of PLAN_PROCESS_WORKERS
+# processes (0 computes them in the request thread).
+PLAN_PROCESS_WORKERS = config('PLAN_PROCESS_WORKERS', default=os.cpu_count() or 1, cast=int)
+BATCH_PLAN_MAX_TRIPS = config('BATCH_PLAN_MAX_TRIPS', default=500, cast=int)
+
+# Plan memoization: identical plan requests (normalized locations, cycle
+# hours, geometry options and Idempotency-Key) within PLAN_MEMO_TTL seconds
+# replay the first response instead of planning and saving a new trip.
+# 0 disables it; concurrent identical requests are always coalesced.
+PLAN_MEMO_TTL = config('PLAN_MEMO_TTL', default=5 * 60, cast=int)
+PLAN_MEMO_SIZE = config('PLAN_MEMO_SIZE', default=1024, cast=int)
+PLAN_MEMO_MAX_BYTES = config('PLAN_MEMO_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+
+# Plan jobs: POST /api/plan-trip/jobs/ queues a plan for `manage.py
+# plan_worker`. A job still running PLAN_JOB_TIMEOUT seconds after a worker
+# claimed it is presumed lost and handed to another worker, up to
+# PLAN_JOB_MAX_ATTEMPTS claims. Idle workers poll every PLAN_JOB_POLL_INTERVAL
+# seconds.
+PLAN_JOB_TIMEOUT = config('PLAN_JOB_TIMEOUT', default=5 * 60, cast=int)
+PLAN_JOB_MAX_ATTEMPTS = config('PLAN_JOB_MAX_ATTEMPTS', default=3, cast=int)
+PLAN_JOB_POLL_INTERVAL = config('PLAN_JOB_POLL_INTERVAL', default=1.0, cast=float)
+PLAN_JOB_WORKERS = config('PLAN_JOB_WORKERS', default=os.cpu_count() or 1, cast=int)
+
+# Trip history API: default and largest page size of GET /api/trips/.
+TRIP_PAGE_SIZE = config('TRIP_PAGE_SIZE', default=20, cast=int)
+TRIP_PAGE_MAX_SIZE = config('TRIP_PAGE_MAX_SIZE', default=100, cast=int)
+
+# Rendered daily log sheets (SVG/PDF) are cached in LOGSHEET_CACHE_DIR;
+# empty renders every request.
+LOGSHEET_CACHE_DIR = config('LOGSHEET_CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'hos-logsheets'))
+
+# Stage timings: Server-Timing response headers plus per-process latency
+# histograms served at /api/metrics/. Off, the middleware is not loaded and
+# timed stages cost one settings lookup.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
@@ -0,0 +1,44 @@
+"""
+Lean settings for the Vercel serverless deployment (vercel_app/main.py).
+
+Every cold start pays for each installed app, middleware and renderer, so this
+profile keeps only what the JSON API needs: no admin, sessions, messages or
+static files, no authentication (the API is anonymous), JSON-only renderers
+and parsers, and no planning process pool.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    'corsheaders',
+    'rest_framework',
+    'trips.apps.TripsConfig',
+]
+
+MIDDLEWARE = [
+    'trips.metrics.ServerTimingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': (
+        'djangorestframework_camel_case.render.CamelCaseJSONRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'djangorestframework_camel_case.parser.CamelCaseJSONParser',
+    ),
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
+}
+
+# A lambda instance handles one request at a time; spawning a process pool
+# would only add to the cold start.
+PLAN_PROCESS_WORKERS = 0
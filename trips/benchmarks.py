@@ -0,0 +1,321 @@
+"""Micro-benchmarks for planning hot paths; run them with `manage.py benchmark`."""
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.test import Client, override_settings
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from djangorestframework_camel_case.util import camelize
+
+from . import metrics
+from .geometry import RouteIndex
+from .models import GeocodeCacheEntry, Trip
+from .planning import compute_plan, compute_tour_plan
+from .renderers import FastJSONRenderer
+from .scheduling import STATUS_LABELS, format_minutes, plan_trip_schedule, split_by_day
+from .stations import StationIndex, snap_stops
+from .testing import FakeORSServer, fake_matrix
+from .tour import is_dropoff, order_stops
+from .views import convert_keys
+
+
+def timed(fn, repeat):
+    """Call fn repeat times and return min/median/mean wall time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def synthetic_route(points):
+    """A gently curving Dallas -> Chicago polyline with `points` vertices."""
+    return [
+        [round(32.7767 + 9.1 * i / points, 6), round(-96.797 + 9.17 * i / points + 0.05 * ((i % 200) / 200), 6)]
+        for i in range(points)
+    ]
+
+
+def sample_response(points):
+    """A snake_case plan response shaped like views.build_response, built without touching the database."""
+    route = synthetic_route(points)
+    start, pickup, dropoff = route[0], route[points // 3], route[-1]
+    plan = compute_plan("Dallas, TX", "Tulsa, OK", "Chicago, IL", 10, start, pickup, dropoff, route)
+    return {
+        "trip": {
+            "id": 1,
+            "current_location": "Dallas, TX",
+            "pickup_location": "Tulsa, OK",
+            "dropoff_location": "Chicago, IL",
+            "cycle_used": 10.0,
+            "duty_statuses": [
+                {"date": str(day), "start_time": format_minutes(start), "end_time": format_minutes(end),
+                 "status": STATUS_LABELS[status], "remarks": remarks}
+                for day, start, end, status, remarks in plan["duty_log"]
+            ],
+        },
+        "stops": plan["stops"],
+        "total_distance": plan["total_distance"],
+        "total_driving_time": plan["total_driving_time"],
+        "total_on_duty_time": plan["total_on_duty_time"],
+        "remaining_cycle": plan["remaining_cycle"],
+        "route_coordinates": route,
+        "start_coords": start,
+        "pickup_coords": pickup,
+        "stop_coords": plan["stop_coords"],
+        "end_coords": dropoff,
+    }
+
+
+def bench_render(points=10000, repeat=20):
+    """Compare the previous double camelCase + json path with the single-pass orjson path."""
+    data = sample_response(points)
+    legacy_renderer, fast_renderer = CamelCaseJSONRenderer(), FastJSONRenderer()
+
+    def legacy():
+        return legacy_renderer.render(camelize(data))
+
+    def fast():
+        return fast_renderer.render(convert_keys(data))
+
+    legacy_bytes, fast_bytes = legacy(), fast()
+    results = {
+        "points": points,
+        "legacy": timed(legacy, repeat),
+        "fast": timed(fast, repeat),
+        "bytes": len(fast_bytes),
+        "identical": json.loads(legacy_bytes) == json.loads(fast_bytes),
+    }
+    results["speedup"] = round(results["legacy"]["median_ms"] / results["fast"]["median_ms"], 1)
+    return results
+
+
+def synthetic_stations(count, seed=0):
+    """`count` random truck stops spread over the continental US."""
+    rng = np.random.default_rng(seed)
+    lats, lons = rng.uniform(25, 49, count), rng.uniform(-124, -67, count)
+    return [(lat, lon, f"Station {i}") for i, (lat, lon) in enumerate(zip(lats.tolist(), lons.tolist()))]
+
+
+def bench_stages(points=10000, repeat=20, stations=50000):
+    """Time the CPU stages of a plan separately: interpolation, station snapping, scheduling and serialization."""
+    route = synthetic_route(points)
+    data = sample_response(points)
+    renderer = FastJSONRenderer()
+    route_index = RouteIndex(route)
+    length = route_index.length
+    targets = np.arange(50.0, length, 50.0)
+    stop_points = route_index.interpolate(targets).tolist()
+    station_index = StationIndex(synthetic_stations(stations))
+
+    def interpolation():
+        return RouteIndex(route).interpolate(targets)
+
+    def snapping():
+        return snap_stops(station_index, route_index, targets, stop_points, 5, 50)
+
+    def scheduling():
+        schedule = plan_trip_schedule("Dallas, TX", "Tulsa, OK", "Chicago, IL", length / 3, length * 2 / 3,
+                                      cycle_used=10, fuel_stops=[(t, f"Mile {t:.1f}") for t in targets])
+        return split_by_day(schedule.segments, date(2025, 3, 25))
+
+    def serialization():
+        return renderer.render(convert_keys(data))
+
+    def plan():
+        return compute_plan("Dallas, TX", "Tulsa, OK", "Chicago, IL", 10, route[0], route[points // 3], route[-1], route)
+
+    return {
+        "points": points,
+        "interpolation": timed(interpolation, repeat),
+        "snapping": timed(snapping, repeat),
+        "stations": stations,
+        "scheduling": timed(scheduling, repeat),
+        "serialization": timed(serialization, repeat),
+        "compute_plan": timed(plan, repeat),
+    }
+
+
+def bench_tour(points=10000, repeat=20, shipments=(5, 10, 20)):
+    """Time stop ordering on a cached distance matrix, and planning the ordered tour, by shipment count."""
+    rng = np.random.default_rng(0)
+    route = synthetic_route(points)
+    results = {"points": points}
+    for count in shipments:
+        locations = np.column_stack((rng.uniform(-120, -75, 2 * count + 1), rng.uniform(30, 45, 2 * count + 1))).tolist()
+        matrix = fake_matrix(locations, range(len(locations)))
+        order = order_stops(matrix, count)
+        waypoints = [("dropoff" if is_dropoff(i) else "pickup", f"Stop {i}", locations[i][::-1]) for i in order[1:]]
+        results[f"{count}_shipments"] = {
+            "order": timed(lambda: order_stops(matrix, count), repeat),
+            "compute_plan": timed(
+                lambda: compute_tour_plan("Start", 10, locations[0][::-1], waypoints, route), repeat,
+            ),
+        }
+    return results
+
+
+def bench_plan(points=10000, repeat=20, latency=0.0):
+    """Time POST /api/plan-trip/ end to end against a local FakeORSServer.
+
+    Cold runs use fresh location names so every cache misses; warm runs
+    repeat one trip and are answered from the plan memo. Trips and cache rows
+    created here are deleted afterwards.
+    """
+    client = Client()
+    counter = itertools.count()
+    locations = set()
+    trip_ids = []
+
+    def post(suffix):
+        payload = {
+            "current_location": f"Dallas, TX{suffix}",
+            "pickup_location": f"Tulsa, OK{suffix}",
+            "dropoff_location": f"Chicago, IL{suffix}",
+            "cycle_used": 10,
+        }
+        locations.update(payload[key] for key in ("current_location", "pickup_location", "dropoff_location"))
+        response = client.post("/api/plan-trip/", payload, content_type="application/json")
+        if response.status_code not in (200, 201):
+            raise RuntimeError(f"plan-trip returned {response.status_code}: {response.content[:200]!r}")
+        trip_ids.append(response.json()["trip"]["id"])
+        return response
+
+    with FakeORSServer(latency=latency, route_points=points) as server, \
+            override_settings(OPENROUTESERVICE_BASE_URL=server.url):
+        try:
+            post(" #warmup")
+            cold = timed(lambda: post(f" #{next(counter)}"), repeat)
+            warm = timed(lambda: post(" #warm"), repeat)
+            calls = dict(server.calls)
+        finally:
+            Trip.objects.filter(id__in=trip_ids).delete()
+            GeocodeCacheEntry.objects.filter(location__in=locations).delete()
+    return {
+        "points": points,
+        "latency_ms": latency * 1000,
+        "cold": cold,
+        "warm": warm,
+        "upstream_calls": calls,
+    }
+
+
+def bench_metrics(repeat=20, calls=100000):
+    """Cost per timed stage in nanoseconds, with instrumentation enabled and disabled."""
+    def run():
+        for _ in range(calls):
+            with metrics.stage("bench"):
+                pass
+
+    results = {"calls": calls}
+    for enabled in (False, True):
+        with override_settings(METRICS_ENABLED=enabled):
+            median = timed(run, repeat)["median_ms"]
+        results["enabled" if enabled else "disabled"] = {"per_stage_ns": round(median * 1e6 / calls, 1)}
+    metrics.registry.families.get(("trips_stage_duration_seconds", "stage"), {}).pop("bench", None)
+    return results
+
+
+# Run in a fresh interpreter by bench_startup: time Django setup through
+# get_wsgi_application() (what vercel_app/main.py does on a cold start), then
+# one POST /api/plan-trip/ through the returned WSGI app.
+STARTUP_SCRIPT = """
+import io, json, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+app = get_wsgi_application()
+imported = time.perf_counter()
+host, body = sys.argv[1], sys.argv[2].encode()
+environ = {
+    "REQUEST_METHOD": "POST", "PATH_INFO": "/api/plan-trip/", "SERVER_NAME": host, "SERVER_PORT": "80",
+    "SERVER_PROTOCOL": "HTTP/1.1", "wsgi.url_scheme": "http", "wsgi.input": io.BytesIO(body),
+    "CONTENT_TYPE": "application/json", "CONTENT_LENGTH": str(len(body)),
+}
+statuses = []
+b"".join(app(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+finished = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (finished - imported) * 1000,
+    "status": int(statuses[0].split()[0]),
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def summarize(samples):
+    return {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def bench_startup(repeat=5, profiles=None):
+    """Cold-start cost per settings module, each run in a new Python process.
+
+    Reports Django setup time, the first plan request (against a local
+    FakeORSServer, so it includes URLconf and view imports plus first-use
+    imports such as the HTTP client), the whole process wall time and the
+    number of loaded modules. Defaults to the current settings and the
+    serverless profile.
+    """
+    profiles = list(dict.fromkeys(profiles or [settings.SETTINGS_MODULE, "hos_app.settings_serverless"]))
+    host = next((h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")), "localhost")
+    locations = set()
+    results = {}
+    with FakeORSServer() as server:
+        try:
+            for profile in profiles:
+                env = dict(os.environ, DJANGO_SETTINGS_MODULE=profile, OPENROUTESERVICE_BASE_URL=server.url)
+                runs = []
+                for run in range(repeat):
+                    payload = {
+                        "current_location": f"Dallas, TX #startup{run}",
+                        "pickup_location": f"Tulsa, OK #startup{run}",
+                        "dropoff_location": f"Chicago, IL #startup{run} {profile}",
+                        "cycle_used": 10,
+                    }
+                    locations.update(payload[key] for key in ("current_location", "pickup_location", "dropoff_location"))
+                    started = time.perf_counter()
+                    output = subprocess.run(
+                        [sys.executable, "-c", STARTUP_SCRIPT, host, json.dumps(payload)],
+                        env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+                    ).stdout
+                    run_result = json.loads(output.strip().splitlines()[-1])
+                    run_result["process_ms"] = (time.perf_counter() - started) * 1000
+                    if run_result["status"] not in (200, 201):
+                        raise RuntimeError(f"{profile}: plan-trip returned {run_result['status']}")
+                    runs.append(run_result)
+                results[profile] = {
+                    "import": summarize([r["import_ms"] for r in runs]),
+                    "first_request": summarize([r["first_request_ms"] for r in runs]),
+                    "process": summarize([r["process_ms"] for r in runs]),
+                    "modules": runs[-1]["modules"],
+                }
+        finally:
+            Trip.objects.filter(current_location__in=locations).delete()
+            GeocodeCacheEntry.objects.filter(location__in=locations).delete()
+    return results
+
+
+SUITES = {
+    "render": bench_render,
+    "stages": bench_stages,
+    "plan": bench_plan,
+    "tour": bench_tour,
+    "metrics": bench_metrics,
+    "startup": bench_startup,
+}
@@ -0,0 +1,332 @@
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an optional per-entry TTL (seconds).
+
+    Eviction is bounded by entry count (maxsize) and, when sizeof is given, by
+    the summed sizeof(value) of all entries (max_bytes).
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, max_bytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _size(self, value):
+        return self.sizeof(value) if self.sizeof else 0
+
+    def _pop(self, key):
+        value, _ = self._data.pop(key)
+        self.nbytes -= self._size(value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self._size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, expires_at)
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+def normalize_location(location):
+    """Normalize a free-text location so equivalent spellings share a cache key."""
+    location = ' '.join(str(location).lower().split())
+    location = re.sub(r'\s*,\s*', ', ', location)
+    return location.strip(' ,.')
+
+
+class GeocodeCache:
+    """Two-tier geocode cache: an in-process LRU in front of the GeocodeCacheEntry table."""
+
+    def __init__(self, maxsize, ttl, db_ttl=None):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.db_ttl = db_ttl
+        self._counters = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def get(self, location):
+        """Return cached [lat, lon] for a location, or None on a miss in both tiers."""
+        from .models import GeocodeCacheEntry
+
+        key = normalize_location(location)
+        coords = self.memory.get(key)
+        if coords is not None:
+            self._count('memory_hits')
+            return coords
+
+        entries = GeocodeCacheEntry.objects.filter(key=key)
+        if self.db_ttl:
+            entries = entries.filter(updated_at__gte=timezone.now() - timedelta(seconds=self.db_ttl))
+        entry = entries.only('latitude', 'longitude').first()
+        if entry is not None:
+            coords = [entry.latitude, entry.longitude]
+            self.memory.set(key, coords)
+            self._count('db_hits')
+            return coords
+
+        self._count('misses')
+        return None
+
+    def set(self, location, coords):
+        from .models import GeocodeCacheEntry
+
+        key = normalize_location(location)
+        GeocodeCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={'location': location, 'latitude': coords[0], 'longitude': coords[1]},
+        )
+        self.memory.set(key, list(coords))
+
+    def clear(self):
+        """Drop the in-process tier; the shared table is left untouched."""
+        self.memory.clear()
+
+
+geocode_cache = GeocodeCache(
+    maxsize=settings.GEOCODE_CACHE_SIZE,
+    ttl=settings.GEOCODE_CACHE_TTL,
+    db_ttl=settings.GEOCODE_CACHE_DB_TTL,
+)
+
+
+def pack_coordinates(coords):
+    """Pack [[lat, lon], ...] into a flat int32 array of microdegrees (8 bytes per point)."""
+    return array('i', [round(value * 1e6) for point in coords for value in point])
+
+
+def unpack_coordinates(packed):
+    values = [value / 1e6 for value in packed]
+    return [values[i:i + 2] for i in range(0, len(values), 2)]
+
+
+class RouteCache:
+    """In-process cache of route geometries keyed by snapped waypoint coordinates.
+
+    Geometries are held packed (see pack_coordinates) and evicted by total
+    bytes, so a few long-haul polylines cannot crowd out many short lanes.
+    """
+
+    def __init__(self, max_bytes, precision, ttl=None):
+        self.precision = precision
+        self.memory = LRUCache(
+            maxsize=float('inf'),
+            ttl=ttl,
+            max_bytes=max_bytes,
+            sizeof=lambda packed: packed.itemsize * len(packed),
+        )
+        self._counters = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def key(self, coordinates):
+        return tuple(round(value, self.precision) for point in coordinates for value in point)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, bytes=self.memory.nbytes, entries=len(self.memory))
+
+    def get(self, coordinates):
+        packed = self.memory.get(self.key(coordinates))
+        if packed is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return unpack_coordinates(packed)
+
+    def set(self, coordinates, route_coords):
+        self.memory.set(self.key(coordinates), pack_coordinates(route_coords))
+
+    def clear(self):
+        self.memory.clear()
+
+
+route_cache = RouteCache(
+    max_bytes=settings.ROUTE_CACHE_MAX_BYTES,
+    precision=settings.ROUTE_CACHE_PRECISION,
+    ttl=settings.ROUTE_CACHE_TTL,
+)
+
+
+class DistanceMatrixCache:
+    """In-process cache of driving distances (miles) between snapped point pairs.
+
+    Entries are per (origin, destination) pair, so a tour that shares stops
+    with an earlier one only fetches the rows it has not seen.
+    """
+
+    def __init__(self, maxsize, precision, ttl=None):
+        self.precision = precision
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def point(self, coords):
+        return (round(coords[0], self.precision), round(coords[1], self.precision))
+
+    def get(self, coordinates):
+        """Return the n x n matrix for coordinates, with None for pairs not cached."""
+        points = [self.point(coords) for coords in coordinates]
+        return [[self.memory.get((a, b)) for b in points] for a in points]
+
+    def set(self, coordinates, matrix):
+        points = [self.point(coords) for coords in coordinates]
+        for a, row in zip(points, matrix):
+            for b, miles in zip(points, row):
+                self.memory.set((a, b), miles)
+
+    def clear(self):
+        self.memory.clear()
+
+
+matrix_cache = DistanceMatrixCache(
+    maxsize=settings.MATRIX_CACHE_SIZE,
+    precision=settings.ROUTE_CACHE_PRECISION,
+    ttl=settings.ROUTE_CACHE_TTL,
+)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs fn; callers arriving while it runs wait
+    and receive its result (or exception) instead of running fn themselves.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return (result, shared), where shared is True if another caller's run was reused."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def normalize_input(value):
+    if isinstance(value, str):
+        return normalize_location(value)
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, (tuple, list)):
+        return tuple(normalize_input(item) for item in value)
+    return value
+
+
+class PlanMemo:
+    """Recently planned trips keyed on normalized inputs, with in-flight coalescing.
+
+    Values are (trip_id, rendered response bytes) and are evicted by TTL and
+    total bytes; a ttl of 0 disables memoization but keeps coalescing.
+    Failures are shared with concurrent callers but never stored.
+    """
+
+    def __init__(self, maxsize, ttl, max_bytes):
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl, max_bytes=max_bytes, sizeof=lambda entry: len(entry[1]))
+        self.flight = SingleFlight()
+
+    def key(self, trip_input, geometry=None, idempotency_key=None):
+        """Key for a trip or tour input tuple: locations normalized, hours rounded."""
+        geometry = geometry or {}
+        return (
+            normalize_input(trip_input),
+            geometry.get('tolerance'),
+            geometry.get('encoded', False),
+            idempotency_key,
+        )
+
+    def get_or_compute(self, key, compute):
+        """Return (value, replayed); replayed is False only for the call that ran compute."""
+        value = self.memory.get(key) if self.ttl else None
+        if value is not None:
+            return value, True
+
+        def run():
+            # A leader that finished just before this call was made has stored its result.
+            value = self.memory.get(key) if self.ttl else None
+            if value is None:
+                value = compute()
+                if self.ttl:
+                    self.memory.set(key, value)
+            return value
+
+        return self.flight.do(key, run)
+
+    def clear(self):
+        self.memory.clear()
+
+
+plan_memo = PlanMemo(
+    maxsize=settings.PLAN_MEMO_SIZE,
+    ttl=settings.PLAN_MEMO_TTL,
+    max_bytes=settings.PLAN_MEMO_MAX_BYTES,
+)
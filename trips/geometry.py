@@ -0,0 +1,168 @@
+from math import radians, sin, cos, sqrt, atan2
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+def calculate_distance(coords1, coords2):
+    R = EARTH_RADIUS_MILES
+    lat1, lon1 = radians(coords1[0]), radians(coords1[1])
+    lat2, lon2 = radians(coords2[0]), radians(coords2[1])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1-a))
+    return R * c
+
+
+class RouteIndex:
+    """Cumulative-distance index over a route polyline.
+
+    Segment lengths are computed once with a vectorized haversine; any number
+    of distances along the route can then be located by binary search.
+    """
+
+    def __init__(self, route_coords):
+        self.points = np.asarray(route_coords, dtype=np.float64).reshape(-1, 2)
+        lat = np.radians(self.points[:, 0])
+        lon = np.radians(self.points[:, 1])
+        a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+        segments = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        self.cumulative = np.concatenate(([0.0], np.cumsum(segments)))
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def length(self):
+        """Total route length in miles."""
+        return float(self.cumulative[-1])
+
+    def interpolate(self, target_distances):
+        """Return an (n, 2) array of [lat, lon] points at the given distances (miles) along the route.
+
+        Distances beyond either end are clamped to the first/last vertex.
+        """
+        targets = np.atleast_1d(np.asarray(target_distances, dtype=np.float64))
+        if len(self.points) < 2:
+            return np.repeat(self.points[:1], len(targets), axis=0)
+        idx = np.clip(np.searchsorted(self.cumulative, targets, side='left'), 1, len(self.points) - 1)
+        start = self.cumulative[idx - 1]
+        segment = self.cumulative[idx] - start
+        fraction = np.divide(targets - start, segment, out=np.ones_like(targets), where=segment > 0)
+        fraction = np.clip(fraction, 0.0, 1.0)[:, None]
+        p0 = self.points[idx - 1]
+        return p0 + fraction * (self.points[idx] - p0)
+
+    def locate(self, points):
+        """Distances (miles) along the route of the vertices nearest to each point, in visiting order.
+
+        Each point is searched for from the previous one's vertex onwards, so
+        a route that passes near a later stop early on cannot short-cut it.
+        """
+        lat = np.radians(self.points[:, 0])
+        lon = np.radians(self.points[:, 1])
+        positions = []
+        start = 0
+        for point_lat, point_lon in np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2)):
+            a = (np.sin((lat[start:] - point_lat) / 2) ** 2
+                 + np.cos(lat[start:]) * np.cos(point_lat) * np.sin((lon[start:] - point_lon) / 2) ** 2)
+            start += int(np.argmin(a))
+            positions.append(float(self.cumulative[start]))
+        return positions
+
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_MILE = 1609.344
+METERS_PER_PIXEL_AT_ZOOM_0 = 156543.03392
+MAX_ZOOM = 30  # deeper than any web map; beyond it a pixel is under a millimetre
+
+
+def zoom_tolerance(zoom):
+    """Simplification tolerance (meters) of one 256px web-map tile pixel at the equator."""
+    return METERS_PER_PIXEL_AT_ZOOM_0 / 2 ** zoom
+
+
+def simplify(route_coords, tolerance):
+    """Douglas-Peucker simplification of [[lat, lon], ...] with tolerance in meters.
+
+    Points are projected to a local equirectangular plane around the route's
+    mean latitude; endpoints are always kept. Returns an (n, 2) array.
+    """
+    points = np.asarray(route_coords, dtype=np.float64).reshape(-1, 2)
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+    lat = np.radians(points[:, 0])
+    xy = np.column_stack((
+        np.radians(points[:, 1]) * np.cos(lat.mean()) * EARTH_RADIUS_METERS,
+        lat * EARTH_RADIUS_METERS,
+    ))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, direction = xy[first], xy[last] - xy[first]
+        offsets = xy[first + 1:last] - start
+        length = np.hypot(*direction)
+        if length > 0:
+            distances = np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / length
+        else:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+def encode_polyline(route_coords, precision=5):
+    """Encode [[lat, lon], ...] with the Google encoded polyline algorithm."""
+    values = np.round(np.asarray(route_coords, dtype=np.float64).reshape(-1, 2) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    chunks = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def pack_route(route_coords, stop_coords, precision=6):
+    """Route and stop positions as compact bytes for storage: encoded polylines, one per line.
+
+    The first line holds the precision, so it can change without breaking
+    stored routes.
+    """
+    return "\n".join([
+        str(precision), encode_polyline(route_coords, precision), encode_polyline(stop_coords, precision),
+    ]).encode('ascii')
+
+
+def unpack_route(packed):
+    """Inverse of pack_route; returns (route_coords, stop_coords)."""
+    precision, route, stops = bytes(packed).decode('ascii').split("\n")
+    return decode_polyline(route, int(precision)), decode_polyline(stops, int(precision))
+
+
+def decode_polyline(encoded, precision=5):
+    """Inverse of encode_polyline; returns [[lat, lon], ...]."""
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    coords = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return coords.tolist()
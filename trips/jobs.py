@@ -0,0 +1,110 @@
+"""Asynchronous plan jobs backed by the PlanJob table.
+
+PlanJobView saves a request as a queued PlanJob and answers at once; worker
+processes (`manage.py plan_worker`) claim the oldest queued job with
+SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never wait on each
+other's rows, plan it exactly like PlanTripView and store the rendered
+response for PlanJobDetailView to return.
+"""
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import ratelimit
+from .models import PlanJob
+from .views import parse_plan_request
+
+
+def runnable(now):
+    """Queued jobs, and running jobs whose worker has not finished them within PLAN_JOB_TIMEOUT."""
+    stale = now - timedelta(seconds=settings.PLAN_JOB_TIMEOUT)
+    return Q(status=PlanJob.Status.QUEUED) | Q(
+        status=PlanJob.Status.RUNNING, started_at__lt=stale, attempts__lt=settings.PLAN_JOB_MAX_ATTEMPTS,
+    )
+
+
+def fail_abandoned(now):
+    """Fail running jobs that timed out on their last allowed attempt."""
+    stale = now - timedelta(seconds=settings.PLAN_JOB_TIMEOUT)
+    return PlanJob.objects.filter(
+        status=PlanJob.Status.RUNNING, started_at__lt=stale, attempts__gte=settings.PLAN_JOB_MAX_ATTEMPTS,
+    ).update(status=PlanJob.Status.FAILED, error="Planning did not finish", finished_at=now)
+
+
+def claim():
+    """Mark the oldest runnable job as running and return it, or None when there is none."""
+    # Without row locks (SQLite) a read-then-write transaction only risks
+    # "database is locked" errors; the conditional update below is the guard there.
+    locking = connection.features.has_select_for_update
+    while True:
+        now = timezone.now()
+        with transaction.atomic() if locking else nullcontext():
+            job = (
+                PlanJob.objects.select_for_update(skip_locked=True)
+                .filter(runnable(now)).order_by('created_at').only('pk').first()
+            )
+            if job is None:
+                return None
+            claimed = PlanJob.objects.filter(runnable(now), pk=job.pk).update(
+                status=PlanJob.Status.RUNNING, started_at=now, attempts=F('attempts') + 1,
+            )
+        if claimed:
+            return PlanJob.objects.get(pk=job.pk)
+
+
+def run(job):
+    """Plan a claimed job and record its result or error.
+
+    The outcome is only written while the job is still this worker's claim,
+    so a worker that overran PLAN_JOB_TIMEOUT cannot overwrite the retry.
+    """
+    try:
+        trip_input, plan, _ = parse_plan_request(job.payload)
+        if trip_input is None:
+            raise Exception("Missing required fields")
+        with ratelimit.priority(ratelimit.BATCH):
+            trip_id, body = plan(trip_input, job.geometry or None)
+    except Exception as e:
+        outcome = {"status": PlanJob.Status.FAILED, "error": str(e)}
+    else:
+        outcome = {"status": PlanJob.Status.SUCCEEDED, "trip_id": trip_id, "result": body}
+    PlanJob.objects.filter(pk=job.pk, status=PlanJob.Status.RUNNING, started_at=job.started_at).update(
+        finished_at=timezone.now(), **outcome,
+    )
+
+
+def recycle_connections():
+    """What the request cycle does between requests: drop broken or expired connections."""
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def work(burst=False, poll_interval=None, stop=None):
+    """Claim and run jobs until `stop` (a threading.Event) is set; return how many ran.
+
+    With burst, return as soon as the queue is empty instead of polling.
+    """
+    if poll_interval is None:
+        poll_interval = settings.PLAN_JOB_POLL_INTERVAL
+    done = 0
+    while stop is None or not stop.is_set():
+        recycle_connections()
+        job = claim()
+        if job is None:
+            fail_abandoned(timezone.now())
+            if burst:
+                break
+            if stop is None:
+                time.sleep(poll_interval)
+            else:
+                stop.wait(poll_interval)
+            continue
+        run(job)
+        done += 1
+    recycle_connections()
+    return done
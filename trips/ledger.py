@@ -0,0 +1,82 @@
+"""Per-driver on-duty ledger for the 70-hour/8-day cycle.
+
+DriverDay holds each driver's on-duty minutes per log date. record() adds a
+trip's duty log to it in the transaction that saves the log, so the hours a
+driver has used in the rolling window are a sum over at most eight indexed
+rows, however long their history. `manage.py backfill_ledger` rebuilds the
+table from DutyStatus, for trips saved before it existed or edited since.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Sum, When
+
+from .models import DriverDay, DutyStatus
+from .scheduling import DRIVING, MINUTES_PER_DAY, ON_DUTY
+
+CYCLE_DAYS = 8
+ON_DUTY_STATUSES = (DRIVING, ON_DUTY)
+
+
+def daily_minutes(duty_log):
+    """{date: on-duty minutes} for (date, start, end, status, remarks) duty log rows."""
+    totals = defaultdict(int)
+    for day, start, end, status, _ in duty_log:
+        if status in ON_DUTY_STATUSES:
+            totals[day] += end - start
+    return totals
+
+
+def add_minutes(driver, day, minutes):
+    updated = DriverDay.objects.filter(driver=driver, date=day).update(on_duty_minutes=F('on_duty_minutes') + minutes)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            DriverDay.objects.create(driver=driver, date=day, on_duty_minutes=minutes)
+    except IntegrityError:
+        # Another trip created the day first.
+        add_minutes(driver, day, minutes)
+
+
+def record(driver, duty_log):
+    """Add a saved trip's duty log to the driver's daily totals; call in the transaction that saves it."""
+    for day, minutes in sorted(daily_minutes(duty_log).items()):
+        if minutes:
+            add_minutes(driver, day, minutes)
+
+
+def cycle_used(driver, day):
+    """Hours the driver logged on duty in the 8 days ending on `day`."""
+    minutes = DriverDay.objects.filter(
+        driver=driver, date__range=(day - timedelta(days=CYCLE_DAYS - 1), day),
+    ).aggregate(total=Sum('on_duty_minutes'))['total']
+    return (minutes or 0) / 60
+
+
+def rebuild(driver=None):
+    """Recompute DriverDay from DutyStatus for one driver, or every driver; returns the rows written."""
+    statuses = DutyStatus.objects.filter(status__in=ON_DUTY_STATUSES).exclude(trip__driver='')
+    days = DriverDay.objects.all()
+    if driver is not None:
+        statuses = statuses.filter(trip__driver=driver)
+        days = days.filter(driver=driver)
+    # Rows saved before logs were split at midnight can end "before" they
+    # start (23:30 -> 00:30); they run into the next day.
+    minutes = Case(
+        When(end_time__lt=F('start_time'), then=F('end_time') + MINUTES_PER_DAY - F('start_time')),
+        default=F('end_time') - F('start_time'),
+    )
+    totals = (
+        statuses.values('trip__driver', 'date')
+        .annotate(minutes=Sum(minutes))
+        .order_by()
+    )
+    with transaction.atomic():
+        days.delete()
+        created = DriverDay.objects.bulk_create([
+            DriverDay(driver=row['trip__driver'], date=row['date'], on_duty_minutes=row['minutes'])
+            for row in totals.iterator() if row['minutes']
+        ], batch_size=1000)
+    return len(created)
@@ -0,0 +1,255 @@
+"""Driver's daily log sheets (the 24-hour ELD grid) rendered as SVG or PDF.
+
+A sheet is first laid out as a list of drawing primitives, which to_svg()
+and to_pdf_content() translate into each format, so both look the same.
+Rendered days are cached on disk under LOGSHEET_CACHE_DIR, named by trip,
+date and a hash of everything drawn, so a repeat view is a file read and an
+edited log simply renders under a new name.
+"""
+import hashlib
+import os
+import tempfile
+import zlib
+from xml.sax.saxutils import escape
+
+from .scheduling import DRIVING, MINUTES_PER_DAY, OFF_DUTY, ON_DUTY, SLEEPER_BERTH, STATUS_LABELS, format_minutes
+
+# Bump when the layout changes so cached sheets are re-rendered.
+LAYOUT_VERSION = 2
+
+WIDTH, HEIGHT = 792, 612  # US Letter landscape, in points
+GRID_LEFT, GRID_TOP, GRID_WIDTH, ROW_HEIGHT = 150, 150, 576, 36
+ROWS = (OFF_DUTY, SLEEPER_BERTH, DRIVING, ON_DUTY)
+REMARKS_TOP, REMARK_LINE = GRID_TOP + len(ROWS) * ROW_HEIGHT + 50, 12
+MAX_REMARK_CHARS = 110
+
+
+def x_at(minutes):
+    return GRID_LEFT + GRID_WIDTH * minutes / MINUTES_PER_DAY
+
+
+def row_y(status):
+    """Vertical centre of a status row."""
+    return GRID_TOP + ROW_HEIGHT * (ROWS.index(status) + 0.5)
+
+
+def hour_label(hour):
+    if hour in (0, 24):
+        return "Mid"
+    if hour == 12:
+        return "Noon"
+    return str(hour % 12)
+
+
+def sheet(day, statuses, trip):
+    """Lay out one day's log: ("line", x1, y1, x2, y2, width) and ("text", x, y, size, text, anchor) primitives.
+
+    statuses are (start_minute, end_minute, status, remarks) for the day in
+    log order; trip is (current_location, pickup_location, dropoff_location).
+    Rows saved before logs were split at midnight end before they start; they
+    are drawn up to midnight.
+    """
+    current_location, pickup_location, dropoff_location = trip
+    statuses = [
+        (start, end if end >= start else MINUTES_PER_DAY, status, remarks) for start, end, status, remarks in statuses
+    ]
+    grid_bottom = GRID_TOP + len(ROWS) * ROW_HEIGHT
+    items = [
+        ("text", WIDTH / 2, 40, 18, "Driver's Daily Log", "middle"),
+        ("text", GRID_LEFT, 70, 11, f"Date: {day.isoformat()}", "start"),
+        ("text", GRID_LEFT, 88, 11, f"From: {current_location}", "start"),
+        ("text", GRID_LEFT, 106, 11, f"Via: {pickup_location}   To: {dropoff_location}", "start"),
+        ("text", GRID_LEFT + GRID_WIDTH + 30, GRID_TOP - 8, 9, "Total", "middle"),
+    ]
+
+    # Grid: row borders, hour lines, and half/quarter-hour ticks in every row.
+    for row in range(len(ROWS) + 1):
+        y = GRID_TOP + row * ROW_HEIGHT
+        items.append(("line", GRID_LEFT, y, GRID_LEFT + GRID_WIDTH, y, 1))
+    for hour in range(25):
+        x = x_at(hour * 60)
+        items.append(("line", x, GRID_TOP, x, grid_bottom, 0.75))
+        items.append(("text", x, GRID_TOP - 8, 8, hour_label(hour), "middle"))
+        if hour < 24:
+            for quarter, length in ((1, 5), (2, 10), (3, 5)):
+                xq = x_at(hour * 60 + quarter * 15)
+                for row in range(len(ROWS)):
+                    top = GRID_TOP + row * ROW_HEIGHT
+                    items.append(("line", xq, top, xq, top + length, 0.5))
+
+    totals = dict.fromkeys(ROWS, 0)
+    for start, end, status, _ in statuses:
+        totals[status] += end - start
+    for status in ROWS:
+        label = f"{ROWS.index(status) + 1}. {STATUS_LABELS[status]}"
+        items.append(("text", 20, row_y(status) + 3, 9, label, "start"))
+        items.append(("text", GRID_LEFT + GRID_WIDTH + 30, row_y(status) + 3, 10, format_minutes(totals[status]), "middle"))
+    items.append(("text", GRID_LEFT + GRID_WIDTH + 30, grid_bottom + 14, 10, format_minutes(sum(totals.values())), "middle"))
+
+    # The duty line: a bar along each status row, joined by verticals at every change.
+    previous = None
+    for start, end, status, _ in statuses:
+        y = row_y(status)
+        if previous is not None and previous != y:
+            items.append(("line", x_at(start), previous, x_at(start), y, 2))
+        items.append(("line", x_at(start), y, x_at(end), y, 2.5))
+        previous = y
+
+    items.append(("text", 20, REMARKS_TOP - 16, 11, "Remarks", "start"))
+    fits = (HEIGHT - 30 - REMARKS_TOP) // REMARK_LINE
+    remarks = [(start, text) for start, _, _, text in statuses if text]
+    shown = remarks if len(remarks) <= fits else remarks[:fits - 1]
+    for i, (start, text) in enumerate(shown):
+        line = f"{format_minutes(start)}  {text}"
+        if len(line) > MAX_REMARK_CHARS:
+            line = line[:MAX_REMARK_CHARS - 3] + "..."
+        items.append(("text", 20, REMARKS_TOP + i * REMARK_LINE, 9, line, "start"))
+    if len(shown) < len(remarks):
+        items.append(("text", 20, REMARKS_TOP + len(shown) * REMARK_LINE, 9,
+                      f"... and {len(remarks) - len(shown)} more", "start"))
+    return items
+
+
+def to_svg(items):
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" '
+        f'viewBox="0 0 {WIDTH} {HEIGHT}" font-family="Helvetica, Arial, sans-serif">',
+        f'<rect width="{WIDTH}" height="{HEIGHT}" fill="white"/>',
+    ]
+    for item in items:
+        if item[0] == "line":
+            _, x1, y1, x2, y2, width = item
+            parts.append(f'<line x1="{x1:.2f}" y1="{y1:.2f}" x2="{x2:.2f}" y2="{y2:.2f}" stroke="black" stroke-width="{width}"/>')
+        else:
+            _, x, y, size, text, anchor = item
+            parts.append(f'<text x="{x:.2f}" y="{y:.2f}" font-size="{size}" text-anchor="{anchor}">{escape(text)}</text>')
+    parts.append('</svg>')
+    return "\n".join(parts).encode()
+
+
+def stack_svg(pages, count):
+    """Yield one SVG document showing count page SVGs one below the other, as the pages arrive."""
+    yield (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT * count}" '
+        f'viewBox="0 0 {WIDTH} {HEIGHT * count}">\n'
+    ).encode()
+    for i, page in enumerate(pages):
+        yield f'<g transform="translate(0,{HEIGHT * i})">\n'.encode() + page + b'\n</g>\n'
+    yield b'</svg>\n'
+
+
+def pdf_string(text):
+    text = text.encode('cp1252', errors='replace').decode('latin-1')
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def to_pdf_content(items):
+    """A zlib-compressed PDF page content stream drawing items (font /F1 is Helvetica)."""
+    ops = ["0 0 0 RG 0 0 0 rg"]
+    for item in items:
+        if item[0] == "line":
+            _, x1, y1, x2, y2, width = item
+            ops.append(f"{width} w {x1:.2f} {HEIGHT - y1:.2f} m {x2:.2f} {HEIGHT - y2:.2f} l S")
+        else:
+            _, x, y, size, text, anchor = item
+            # Helvetica averages about half an em per character; close enough to centre labels.
+            shift = {"start": 0, "middle": 0.5, "end": 1}[anchor] * 0.5 * size * len(text)
+            ops.append(f"BT /F1 {size} Tf {x - shift:.2f} {HEIGHT - y:.2f} Td {pdf_string(text)} Tj ET")
+    return zlib.compress("\n".join(ops).encode('latin-1'))
+
+
+def pdf_document(pages, count):
+    """Yield a PDF with one page per compressed content stream, as the pages arrive.
+
+    count must be the number of pages, which the page tree lists up front.
+    """
+    offsets = []
+    position = 0
+
+    def emit(chunk):
+        nonlocal position
+        position += len(chunk)
+        return chunk
+
+    def obj(number, body):
+        offsets.append(position)
+        return emit(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(count))
+    yield emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    yield obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode())
+    yield obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    for i, content in enumerate(pages):
+        page, stream = 4 + 2 * i, 5 + 2 * i
+        yield obj(page, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {WIDTH} {HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {stream} 0 R >>"
+        ).encode())
+        yield obj(stream, f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode() + content + b"\nendstream")
+    xref = position
+    entries = "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    yield (
+        f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n{entries}"
+        f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    ).encode()
+
+
+def content_hash(day, statuses, trip):
+    """Hash of everything a day's sheet draws, plus the layout version."""
+    digest = hashlib.sha256(repr((LAYOUT_VERSION, day.isoformat(), tuple(trip), tuple(statuses))).encode())
+    return digest.hexdigest()[:20]
+
+
+RENDERERS = {
+    "svg": to_svg,
+    "pdf": to_pdf_content,
+}
+
+
+class LogSheetCache:
+    """Rendered sheets on disk at <directory>/<trip id>/<date>-<content hash>.<format>.
+
+    With no directory, every call renders.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, trip_id, day, statuses, trip, fmt):
+        """Return the rendered sheet bytes for one day, rendering and storing it on a miss."""
+        digest = content_hash(day, statuses, trip)
+        if not self.directory:
+            return RENDERERS[fmt](sheet(day, statuses, trip))
+        folder = os.path.join(self.directory, str(trip_id))
+        path = os.path.join(folder, f"{day.isoformat()}-{digest}.{fmt}")
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        rendered = RENDERERS[fmt](sheet(day, statuses, trip))
+        os.makedirs(folder, exist_ok=True)
+        # Write-then-rename, so a concurrent reader never sees a partial file;
+        # a unique temporary name keeps concurrent renders of one day apart.
+        fd, temporary = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(rendered)
+            os.replace(temporary, path)
+        except FileNotFoundError:
+            # The folder was cleared meanwhile; serve the sheet without storing it.
+            return rendered
+        self.prune(folder, day, fmt, keep=path)
+        return rendered
+
+    def prune(self, folder, day, fmt, keep):
+        """Remove sheets of this day and format rendered from an older version of the log."""
+        prefix, suffix = f"{day.isoformat()}-", f".{fmt}"
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if name.startswith(prefix) and name.endswith(suffix) and path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
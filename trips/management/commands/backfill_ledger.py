@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from trips import ledger
+from trips.models import Trip
+
+
+class Command(BaseCommand):
+    help = "Rebuild the drivers' daily on-duty totals (DriverDay) from saved duty statuses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', help="Only rebuild this driver's totals.")
+        parser.add_argument('--trips', nargs='+', type=int, metavar='ID',
+                            help="First attribute these trips (saved without a driver) to --driver.")
+
+    def handle(self, *args, **options):
+        driver = options['driver']
+        if options['trips']:
+            if not driver:
+                raise CommandError("--trips needs --driver.")
+            # update() skips auto_now; bump updated_at so cached trip reads revalidate.
+            assigned = Trip.objects.filter(pk__in=options['trips']).update(driver=driver, updated_at=timezone.now())
+            self.stdout.write(f"Attributed {assigned} trips to {driver}.")
+        rows = ledger.rebuild(driver)
+        self.stdout.write(f"Wrote {rows} driver-day totals.")
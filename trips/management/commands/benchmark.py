@@ -0,0 +1,76 @@
+import inspect
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.benchmarks import SUITES
+
+
+def medians(results, path=()):
+    """Flatten {"suite": {"stage": {"median_ms": ...}}} into {"suite.stage": median_ms}."""
+    found = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            if "median_ms" in value:
+                found[".".join(path + (key,))] = value["median_ms"]
+            else:
+                found.update(medians(value, path + (key,)))
+    return found
+
+
+class Command(BaseCommand):
+    help = "Run planning benchmarks offline (against a local fake OpenRouteService) and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('suites', nargs='*', help=f"Suites to run (default: all of {', '.join(sorted(SUITES))}).")
+        parser.add_argument('--points', type=int, default=10000, help="Route size in vertices.")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per measurement.")
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds the fake upstream waits per request.")
+        parser.add_argument('--profiles', nargs='+',
+                            help="Settings modules for the startup suite (default: current and hos_app.settings_serverless).")
+        parser.add_argument('--output', help="Also write the JSON results to this file.")
+        parser.add_argument('--baseline', help="Results file from an earlier run to compare medians against.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed median slowdown against the baseline, as a fraction (default 0.25).")
+
+    def handle(self, *args, **options):
+        suites = options['suites'] or sorted(SUITES)
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            raise CommandError(f"Unknown suites: {', '.join(sorted(unknown))}")
+        results = {}
+        for name in suites:
+            suite = SUITES[name]
+            parameters = inspect.signature(suite).parameters
+            results[name] = suite(**{key: options[key] for key in ('points', 'repeat', 'latency', 'profiles') if key in parameters})
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+            },
+            "results": results,
+        }
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = medians(json.load(f)["results"])
+            current = medians(results)
+            report["regressions"] = regressions = [
+                {"name": name, "baseline_ms": baseline[name], "median_ms": median}
+                for name, median in sorted(current.items())
+                if name in baseline and median > baseline[name] * (1 + options['tolerance'])
+            ]
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmark(s) slower than the baseline: "
+                               f"{', '.join(r['name'] for r in regressions)}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.routing import build_graph, read_csv_edges, read_osm_edges
+
+
+class Command(BaseCommand):
+    help = "Build a road graph file for ROUTING_BACKEND=local from a CSV edge list or an OSM XML extract."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="CSV edge list (from_lat,from_lon,to_lat,to_lon[,length][,oneway]) or .osm file.")
+        parser.add_argument('output', help="Graph file to write.")
+        parser.add_argument('--format', choices=['csv', 'osm'], help="Input format (default: from the file extension).")
+
+    def handle(self, *args, **options):
+        source = options['source']
+        input_format = options['format'] or ('osm' if source.endswith('.osm') else 'csv')
+        try:
+            if input_format == 'osm':
+                with open(source, 'rb') as f:
+                    nodes, edges = build_graph(read_osm_edges(f), options['output'])
+            else:
+                with open(source, newline='') as f:
+                    nodes, edges = build_graph(read_csv_edges(f), options['output'])
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Cannot build a graph from {source}: {e}")
+        self.stdout.write(f"Wrote {options['output']}: {nodes} nodes, {edges} directed edges.")
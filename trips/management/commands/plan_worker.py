@@ -0,0 +1,61 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def stop_on_signals():
+    """An Event set by SIGTERM/SIGINT, so a worker finishes its current job before exiting."""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    return stop
+
+
+def run_worker(burst, poll_interval):
+    """Entry point of one worker process."""
+    import django
+
+    django.setup()
+    from trips.jobs import work
+
+    return work(burst=burst, poll_interval=poll_interval, stop=stop_on_signals())
+
+
+class Command(BaseCommand):
+    help = "Run plan job workers: each process claims queued plan jobs and stores their results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.PLAN_JOB_WORKERS,
+                            help="Worker processes to run (default: PLAN_JOB_WORKERS).")
+        parser.add_argument('--poll-interval', type=float, default=settings.PLAN_JOB_POLL_INTERVAL,
+                            help="Seconds an idle worker waits before checking the queue again.")
+        parser.add_argument('--burst', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        burst, poll_interval = options['burst'], options['poll_interval']
+        if options['processes'] <= 1:
+            from trips.jobs import work
+
+            done = work(burst=burst, poll_interval=poll_interval, stop=stop_on_signals())
+            self.stdout.write(f"Ran {done} plan jobs.")
+            return
+
+        # spawn, like the planning pool: workers must not share this process's connections or threads.
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=run_worker, args=(burst, poll_interval), name=f"plan-worker-{i}")
+            for i in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} plan workers.")
+        # Workers get Ctrl-C from the terminal themselves; pass SIGTERM on.
+        signal.signal(signal.SIGTERM, lambda *args: [worker.terminate() for worker in workers])
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for worker in workers:
+            worker.join()
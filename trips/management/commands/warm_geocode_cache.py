@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.cache import geocode_cache
+from trips.views import fetch_geocode
+
+
+class Command(BaseCommand):
+    help = "Pre-warm the geocode cache from a list of locations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('locations', nargs='*', help="Locations to geocode.")
+        parser.add_argument('--file', help="Read locations from a file, one per line.")
+        parser.add_argument('--refresh', action='store_true', help="Re-fetch locations that are already cached.")
+
+    def handle(self, *args, **options):
+        locations = list(options['locations'])
+        if options['file']:
+            try:
+                with open(options['file']) as f:
+                    locations += [line.strip() for line in f if line.strip()]
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['file']}: {e}")
+        if not locations:
+            raise CommandError("No locations given.")
+
+        fetched = failed = 0
+        for location in locations:
+            if not options['refresh'] and geocode_cache.get(location) is not None:
+                continue
+            try:
+                geocode_cache.set(location, fetch_geocode(location))
+                fetched += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"{location}: {e}")
+
+        stats = geocode_cache.stats()
+        self.stdout.write(
+            f"Warmed {fetched} locations ({failed} failed). "
+            f"Cache stats: {stats['memory_hits']} memory hits, {stats['db_hits']} db hits, {stats['misses']} misses."
+        )
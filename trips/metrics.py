@@ -0,0 +1,174 @@
+"""Per-stage timings for Server-Timing headers and in-process latency histograms.
+
+Code under measurement wraps a stage in ``with metrics.stage("name"):``.
+Every stage is observed into a histogram, and when ServerTimingMiddleware is
+handling the current request it is also listed in that response's
+Server-Timing header. With METRICS_ENABLED off, stage() hands back a shared
+no-op context manager and the middleware removes itself at startup.
+
+Histograms live in process memory, so each worker exposes its own counts on
+the metrics endpoint; aggregate them in the scraper.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_disabled = nullcontext()
+_timings = contextvars.ContextVar('server_timings', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in seconds, safe to observe from any thread."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        """Return ([(upper_bound, cumulative_count), ...], sum, count); the last bound is +Inf."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            running += n
+            cumulative.append((bound, running))
+        return cumulative, total, count
+
+
+class Registry:
+    """Histograms grouped into named metric families, each keyed by one label value."""
+
+    def __init__(self):
+        self.families = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, family, label, value):
+        key = (family, label)
+        histograms = self.families.get(key)
+        if histograms is None:
+            with self._lock:
+                histograms = self.families.setdefault(key, {})
+        histogram = histograms.get(value)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(value, Histogram())
+        return histogram
+
+    def observe(self, family, label, value, seconds):
+        self.histogram(family, label, value).observe(seconds)
+
+    def clear(self):
+        with self._lock:
+            self.families.clear()
+
+    def render(self):
+        """Prometheus text exposition of every histogram."""
+        lines = []
+        for (family, label), histograms in sorted(self.families.items()):
+            lines.append(f"# TYPE {family} histogram")
+            for value, histogram in sorted(histograms.items()):
+                buckets, total, count = histogram.snapshot()
+                for bound, n in buckets:
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{family}_bucket{{{label}="{value}",le="{le}"}} {n}')
+                lines.append(f'{family}_sum{{{label}="{value}"}} {total:.6f}')
+                lines.append(f'{family}_count{{{label}="{value}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+@contextmanager
+def _stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe('trips_stage_duration_seconds', 'stage', name, elapsed)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def stage(name):
+    """Context manager timing one stage of the current request."""
+    if not settings.METRICS_ENABLED:
+        return _disabled
+    return _stage(name)
+
+
+def server_timing(timings, total):
+    """Format (name, seconds) pairs as a Server-Timing value; repeated names are summed."""
+    merged = {}
+    for name, seconds in timings:
+        calls, elapsed = merged.get(name, (0, 0.0))
+        merged[name] = (calls + 1, elapsed + seconds)
+    entries = [
+        f'{name};desc="{calls} calls";dur={elapsed * 1000:.1f}' if calls > 1 else f"{name};dur={elapsed * 1000:.1f}"
+        for name, (calls, elapsed) in merged.items()
+    ]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """Collect stage timings for each request into a Server-Timing header and a per-view histogram."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token, started = self.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings, token, started = self.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings, started)
+
+    def begin(self):
+        timings = []
+        return timings, _timings.set(timings), time.perf_counter()
+
+    def finish(self, request, response, timings, started):
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.observe('trips_request_duration_seconds', 'view', view, total)
+        response['Server-Timing'] = server_timing(timings, total)
+        return response
@@ -0,0 +1,148 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, CharField, F, IntegerField, Value, When
+from django.db.models.functions import Cast, Concat, LPad, Mod, Substr
+
+STATUS_CODES = {
+    'Off Duty': 1,
+    'Sleeper Berth': 2,
+    'Driving': 3,
+    'On Duty (Not Driving)': 4,
+}
+
+
+def clock_to_minutes(field):
+    return Cast(Substr(field, 1, 2), IntegerField()) * 60 + Cast(Substr(field, 4, 2), IntegerField())
+
+
+def minutes_to_clock(field):
+    hours = Cast(F(field) / 60, IntegerField())
+    minutes = Cast(Mod(F(field), 60), IntegerField())
+    return Concat(
+        LPad(Cast(hours, CharField()), 2, Value('0')),
+        Value(':'),
+        LPad(Cast(minutes, CharField()), 2, Value('0')),
+    )
+
+
+def to_compact(apps, schema_editor):
+    DutyStatus = apps.get_model('trips', 'DutyStatus')
+    DutyStatus.objects.update(
+        start_minute=clock_to_minutes('start_time'),
+        end_minute=clock_to_minutes('end_time'),
+        status_code=Case(
+            *[When(status=label, then=Value(code)) for label, code in STATUS_CODES.items()],
+            default=Value(STATUS_CODES['Off Duty']),
+        ),
+    )
+
+
+def to_text(apps, schema_editor):
+    DutyStatus = apps.get_model('trips', 'DutyStatus')
+    DutyStatus.objects.update(
+        start_time=minutes_to_clock('start_minute'),
+        end_time=minutes_to_clock('end_minute'),
+        status=Case(
+            *[When(status_code=code, then=Value(label)) for label, code in STATUS_CODES.items()],
+            default=Value('Off Duty'),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dutystatus',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='dutystatus',
+            name='end_minute',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='dutystatus',
+            name='status_code',
+            field=models.SmallIntegerField(null=True),
+        ),
+        # Relax the old columns first so that, when reversing, they can be
+        # re-added empty and filled by to_text before becoming NOT NULL again.
+        migrations.AlterField(
+            model_name='dutystatus',
+            name='start_time',
+            field=models.CharField(max_length=5, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dutystatus',
+            name='end_time',
+            field=models.CharField(max_length=5, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dutystatus',
+            name='status',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.RunPython(to_compact, to_text),
+        migrations.RemoveField(
+            model_name='dutystatus',
+            name='start_time',
+        ),
+        migrations.RemoveField(
+            model_name='dutystatus',
+            name='end_time',
+        ),
+        migrations.RemoveField(
+            model_name='dutystatus',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='dutystatus',
+            old_name='start_minute',
+            new_name='start_time',
+        ),
+        migrations.RenameField(
+            model_name='dutystatus',
+            old_name='end_minute',
+            new_name='end_time',
+        ),
+        migrations.RenameField(
+            model_name='dutystatus',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='dutystatus',
+            name='start_time',
+            field=models.PositiveSmallIntegerField(help_text='Minutes after midnight.'),
+        ),
+        migrations.AlterField(
+            model_name='dutystatus',
+            name='end_time',
+            field=models.PositiveSmallIntegerField(help_text='Minutes after midnight; 1440 is midnight at the end of the day.'),
+        ),
+        migrations.AlterField(
+            model_name='dutystatus',
+            name='status',
+            field=models.SmallIntegerField(choices=[(1, 'Off Duty'), (2, 'Sleeper Berth'), (3, 'Driving'), (4, 'On Duty (Not Driving)')]),
+        ),
+        migrations.AlterField(
+            model_name='dutystatus',
+            name='trip',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='duty_statuses', to='trips.trip'),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='dutystatus',
+            index=models.Index(fields=['trip', 'date'], name='dutystatus_trip_date_idx'),
+        ),
+    ]
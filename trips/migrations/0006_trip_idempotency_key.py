@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_compact_dutystatus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
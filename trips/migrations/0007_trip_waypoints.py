@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0006_trip_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='waypoints',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
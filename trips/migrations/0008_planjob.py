@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:24
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_trip_waypoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('payload', models.JSONField(help_text='The plan request body, with snake_case keys.')),
+                ('geometry', models.JSONField(blank=True, default=dict, help_text='Parsed route geometry options.')),
+                ('result', models.BinaryField(help_text='The rendered plan response.', null=True)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('trip', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='trips.trip')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='planjob_status_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_trip_updated_at_trip_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='endpoint_coords',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_geometry',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_trip_endpoint_coords_trip_route_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='driver',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='DriverDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('on_duty_minutes', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('driver', 'date'), name='driverday_driver_date_uniq')],
+            },
+        ),
+    ]
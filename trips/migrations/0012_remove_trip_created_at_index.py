@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_driverday_trip_driver'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trip',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
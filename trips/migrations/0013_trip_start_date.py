@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def copy_first_log_date(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    DutyStatus = apps.get_model('trips', 'DutyStatus')
+    first_date = (
+        DutyStatus.objects.filter(trip=OuterRef('pk')).order_by().values('trip')
+        .annotate(first=Min('date')).values('first')
+    )
+    Trip.objects.update(start_date=Subquery(first_date))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0012_remove_trip_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_first_log_date, migrations.RunPython.noop),
+    ]
@@ -1,22 +1,122 @@
+import uuid
+
 from django.db import models
 
+from . import scheduling
+from .geometry import unpack_route
+
 class Trip(models.Model):
     current_location = models.CharField(max_length=255)
     pickup_location = models.CharField(max_length=255)
     dropoff_location = models.CharField(max_length=255)
     cycle_used = models.FloatField(default=0.0)
+    # Whose log this trip is; trips with a driver count towards their DriverDay totals.
+    driver = models.CharField(max_length=255, blank=True, default='')
+    # The day the duty log starts, at midnight.
+    start_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save; the read API derives ETag/Last-Modified from it.
+    updated_at = models.DateTimeField(auto_now=True)
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    # Ordered stops of a multi-shipment tour: {type, location, shipment, coords}.
+    # Empty for single pickup/dropoff trips.
+    waypoints = models.JSONField(default=list, blank=True)
+    # Geocoded {"start", "pickup", "dropoff"} positions as [lat, lon].
+    endpoint_coords = models.JSONField(null=True, blank=True)
+    # Route and stop positions packed by geometry.pack_route; deferred by
+    # trip reads and decoded by route() only when the geometry is asked for.
+    route_geometry = models.BinaryField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the trip list, newest first; also serves created_at lookups.
+            models.Index(fields=['-created_at', '-id'], name='trip_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Trip from {self.current_location} to {self.dropoff_location}"
 
+    def route(self):
+        """(route_coordinates, stop_coords) as planned, or None for trips saved without geometry."""
+        if self.route_geometry is None:
+            return None
+        return unpack_route(self.route_geometry)
+
 class DutyStatus(models.Model):
-    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='duty_statuses')
+    class Status(models.IntegerChoices):
+        OFF_DUTY = scheduling.OFF_DUTY, scheduling.STATUS_LABELS[scheduling.OFF_DUTY]
+        SLEEPER_BERTH = scheduling.SLEEPER_BERTH, scheduling.STATUS_LABELS[scheduling.SLEEPER_BERTH]
+        DRIVING = scheduling.DRIVING, scheduling.STATUS_LABELS[scheduling.DRIVING]
+        ON_DUTY = scheduling.ON_DUTY, scheduling.STATUS_LABELS[scheduling.ON_DUTY]
+
+    # The composite (trip, date) index below also serves trip-only lookups.
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='duty_statuses', db_index=False)
     date = models.DateField()
-    start_time = models.CharField(max_length=5)
-    end_time = models.CharField(max_length=5)
-    status = models.CharField(max_length=50)
+    start_time = models.PositiveSmallIntegerField(help_text="Minutes after midnight.")
+    end_time = models.PositiveSmallIntegerField(help_text="Minutes after midnight; 1440 is midnight at the end of the day.")
+    status = models.SmallIntegerField(choices=Status.choices)
     remarks = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['trip', 'date'], name='dutystatus_trip_date_idx'),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.get_status_display()} on {self.date} from "
+            f"{scheduling.format_minutes(self.start_time)} to {scheduling.format_minutes(self.end_time)}"
+        )
+
+class DriverDay(models.Model):
+    """A driver's on-duty minutes (driving included) on one log date, kept current by trips.ledger."""
+    driver = models.CharField(max_length=255)
+    date = models.DateField()
+    on_duty_minutes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the rolling 8-day range read.
+            models.UniqueConstraint(fields=['driver', 'date'], name='driverday_driver_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.driver} on {self.date}: {scheduling.format_minutes(self.on_duty_minutes)} on duty"
+
+class PlanJob(models.Model):
+    """A plan request queued for `manage.py plan_worker` (see trips.jobs)."""
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        SUCCEEDED = 'succeeded', 'Succeeded'
+        FAILED = 'failed', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    payload = models.JSONField(help_text="The plan request body, with snake_case keys.")
+    geometry = models.JSONField(default=dict, blank=True, help_text="Parsed route geometry options.")
+    trip = models.ForeignKey(Trip, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    result = models.BinaryField(null=True, help_text="The rendered plan response.")
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='planjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Plan job {self.pk} ({self.status})"
+
+class GeocodeCacheEntry(models.Model):
+    key = models.CharField(max_length=255, unique=True)
+    location = models.CharField(max_length=255)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"{self.status} on {self.date} from {self.start_time} to {self.end_time}"
\ No newline at end of file
+        return f"{self.key} -> ({self.latitude}, {self.longitude})"
@@ -0,0 +1,95 @@
+"""CPU-bound trip planning.
+
+compute_plan() does no database or network access and takes only plain
+values, so it can run on the planning process pool.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.conf import settings
+
+from .geometry import RouteIndex
+from .scheduling import CYCLE_LIMIT, FUEL_INTERVAL_MILES, plan_tour_schedule, split_by_day
+from .stations import get_station_index, snap_stops
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """Return the shared planning process pool, or None when PLAN_PROCESS_WORKERS is 0."""
+    global _process_pool
+    if not settings.PLAN_PROCESS_WORKERS:
+        return None
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                # spawn, not fork: the parent already runs upstream I/O threads.
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=settings.PLAN_PROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _process_pool
+
+
+def compute_plan(current_location, pickup_location, dropoff_location, cycle_used,
+                 start_coords, pickup_coords, dropoff_coords, route_coordinates, start_date=None):
+    """Place fueling stops along the route and build the HOS duty log for one trip.
+
+    The log starts at midnight on start_date (default: today).
+    """
+    return compute_tour_plan(
+        current_location, cycle_used, start_coords,
+        [("pickup", pickup_location, pickup_coords), ("dropoff", dropoff_location, dropoff_coords)],
+        route_coordinates, start_date,
+    )
+
+
+def compute_tour_plan(current_location, cycle_used, start_coords, waypoints, route_coordinates, start_date=None):
+    """compute_plan() for an ordered list of ("pickup" | "dropoff", location, coords) waypoints.
+
+    route_coordinates must run from start_coords through every waypoint in
+    order; each leg is measured along it up to the vertex nearest the
+    waypoint, and the last leg ends where the route does.
+    """
+    route_index = RouteIndex(route_coordinates)
+    total_distance = route_index.length
+    positions = route_index.locate([coords for _, _, coords in waypoints[:-1]]) + [total_distance]
+    leg_distances = [end - start for start, end in zip([0.0] + positions, positions)]
+
+    num_fueling_stops = int(total_distance / FUEL_INTERVAL_MILES)
+    distance_per_stop = total_distance / (num_fueling_stops + 1) if num_fueling_stops > 0 else total_distance
+    target_distances = [(i + 1) * distance_per_stop for i in range(num_fueling_stops)]
+    stop_coordinates = route_index.interpolate(target_distances).tolist()
+    stops = [
+        {"location": f"Mile {target_distance:.1f} (approx)", "type": "Fueling Stop"}
+        for target_distance in target_distances
+    ]
+    station_index = get_station_index() if target_distances else None
+    if station_index is not None:
+        snapped = snap_stops(
+            station_index, route_index, target_distances, stop_coordinates,
+            settings.FUEL_STATION_CORRIDOR_MILES, settings.FUEL_STATION_SEARCH_MILES,
+        )
+        for i, station in enumerate(snapped):
+            if station is not None:
+                stops[i]["location"], stop_coordinates[i] = station
+
+    schedule = plan_tour_schedule(
+        current_location,
+        [(kind, location) for kind, location, _ in waypoints],
+        leg_distances,
+        cycle_used=cycle_used,
+        fuel_stops=[(target_distance, stop["location"]) for target_distance, stop in zip(target_distances, stops)],
+    )
+    return {
+        "duty_log": split_by_day(schedule.segments, start_date=start_date or date.today()),
+        "stops": stops,
+        "stop_coords": stop_coordinates,
+        "total_distance": total_distance,
+        "total_driving_time": schedule.total_driving / 60,
+        "total_on_duty_time": schedule.total_on_duty / 60,
+        "remaining_cycle": (CYCLE_LIMIT - schedule.cycle) / 60,
+    }
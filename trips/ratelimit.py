@@ -0,0 +1,164 @@
+"""Client-side OpenRouteService quota, shared by every process on the host.
+
+ORS limits each API key per endpoint and per minute. ORS_RATE_LIMITS gives
+one token bucket per endpoint ("geocode", "directions", "matrix"); its state
+is two doubles in a small file under ORS_RATE_LIMIT_DIR, updated under an
+exclusive flock, so web workers, plan workers and planning pools all draw
+from the same budget.
+
+A request that finds the bucket empty waits for a token, until its deadline
+(ORS_RATE_LIMIT_WAIT, or ORS_RATE_LIMIT_BATCH_WAIT for batch work), rather
+than being sent and failing upstream. Batch work runs at BATCH priority,
+which never takes the last ORS_RATE_LIMIT_RESERVE share of a bucket, so
+interactive plans keep getting tokens while a batch saturates the quota.
+"""
+import asyncio
+import contextvars
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: the bucket is only shared between threads.
+    fcntl = None
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+_priority = contextvars.ContextVar('ors_priority', default=INTERACTIVE)
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class RateLimited(Exception):
+    pass
+
+
+class TokenBucket:
+    """A token bucket whose state lives in a file, so every process opening the path shares it.
+
+    rate is tokens per second and capacity the largest burst.
+    """
+    STATE = struct.Struct('<dd')  # tokens, wall-clock time of the last update
+
+    def __init__(self, path, rate, capacity):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+
+    def _open(self):
+        # flock belongs to the open file, which a forked child would share with its parent.
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def take(self, reserve=0.0):
+        """Take a token if `reserve` tokens would still be left.
+
+        Returns 0.0 on success, else the seconds until enough tokens will have
+        accumulated.
+        """
+        reserve = min(reserve, self.capacity - 1)
+        with self._lock:
+            fd = self._open()
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                state = os.pread(fd, self.STATE.size, 0)
+                tokens, updated = self.STATE.unpack(state) if len(state) == self.STATE.size else (self.capacity, now)
+                tokens = min(self.capacity, tokens + max(now - updated, 0.0) * self.rate)
+                if tokens >= reserve + 1:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = (reserve + 1 - tokens) / self.rate
+                os.pwrite(fd, self.STATE.pack(tokens, now), 0)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        return wait
+
+    def acquire(self, timeout, reserve=0.0):
+        """Wait up to timeout seconds for a token; raises RateLimited if none comes in time."""
+        deadline = time.monotonic() + timeout
+        wait = self.take(reserve)
+        if wait:
+            with metrics.stage('ors_wait'):
+                while wait:
+                    if time.monotonic() + wait > deadline:
+                        raise RateLimited(f"OpenRouteService quota exhausted; no capacity within {timeout:g}s")
+                    time.sleep(wait)
+                    wait = self.take(reserve)
+
+    async def aacquire(self, timeout, reserve=0.0):
+        """acquire() for the event loop: waits with asyncio.sleep."""
+        deadline = time.monotonic() + timeout
+        wait = self.take(reserve)
+        if wait:
+            with metrics.stage('ors_wait'):
+                while wait:
+                    if time.monotonic() + wait > deadline:
+                        raise RateLimited(f"OpenRouteService quota exhausted; no capacity within {timeout:g}s")
+                    await asyncio.sleep(wait)
+                    wait = self.take(reserve)
+
+
+def get_bucket(endpoint):
+    """The shared bucket for an ORS endpoint, or None when it has no configured limit."""
+    per_minute = settings.ORS_RATE_LIMITS.get(endpoint)
+    if not per_minute:
+        return None
+    key = (endpoint, per_minute, settings.ORS_RATE_LIMIT_DIR)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(key)
+            if bucket is None:
+                path = os.path.join(settings.ORS_RATE_LIMIT_DIR, f"hos-ors-{endpoint}.bucket")
+                # A burst of a tenth of the quota keeps any 60 s window within 110% of it.
+                bucket = _buckets[key] = TokenBucket(path, per_minute / 60, max(1, per_minute // 10))
+    return bucket
+
+
+@contextmanager
+def priority(level):
+    """Run the enclosed upstream calls (including those on pool threads) at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def limits():
+    """(timeout, reserve) for the current priority."""
+    if _priority.get() == BATCH:
+        return settings.ORS_RATE_LIMIT_BATCH_WAIT, settings.ORS_RATE_LIMIT_RESERVE
+    return settings.ORS_RATE_LIMIT_WAIT, 0.0
+
+
+def acquire(endpoint):
+    """Wait for quota to call an ORS endpoint at the current priority."""
+    bucket = get_bucket(endpoint)
+    if bucket is not None:
+        timeout, reserve = limits()
+        bucket.acquire(timeout, reserve * bucket.capacity)
+
+
+async def aacquire(endpoint):
+    bucket = get_bucket(endpoint)
+    if bucket is not None:
+        timeout, reserve = limits()
+        await bucket.aacquire(timeout, reserve * bucket.capacity)
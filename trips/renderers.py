@@ -0,0 +1,34 @@
+from decimal import Decimal
+
+import orjson
+from rest_framework.renderers import BaseRenderer
+
+from . import metrics
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """Serialize to JSON bytes with orjson (handles dates, UUIDs and NumPy arrays natively)."""
+    return orjson.dumps(data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+class FastJSONRenderer(BaseRenderer):
+    """JSON renderer for payloads whose keys are already camelCase.
+
+    Unlike CamelCaseJSONRenderer it never walks the data, so views that build
+    camelCase output themselves (see views.convert_keys) render in one pass.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with metrics.stage('render'):
+            return dumps(data)
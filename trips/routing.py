@@ -0,0 +1,376 @@
+"""Routing backends for get_route().
+
+ROUTING_BACKEND selects where driving routes come from:
+
+* "ors" (default) asks the hosted OpenRouteService directions API;
+* "local" answers from a preprocessed road graph file (ROUTING_GRAPH_PATH)
+  with A*, so planning needs no network and no API quota. Build the file
+  with `manage.py build_road_graph`.
+
+Every backend returns the route as [[lat, lon], ...], like get_route(), and
+driving distance matrices in miles for ordering multi-stop tours.
+"""
+import csv
+import heapq
+import mmap
+import struct
+import threading
+import xml.etree.ElementTree as ET
+from itertools import count
+from math import asin, cos, floor, inf, isqrt, radians, sin, sqrt
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .geometry import EARTH_RADIUS_METERS, METERS_PER_MILE
+
+GRAPH_MAGIC = b'HOSGRAPH'
+GRAPH_VERSION = 2
+# magic, version, node count, edge count, grid cell count, grid cell size in
+# degrees; padded to 48 bytes so the arrays stay aligned
+GRAPH_HEADER = struct.Struct('<8sI4xQQQd')
+GRID_CELL_SIZE = 0.1
+
+# OSM highway values a truck may drive on.
+DRIVABLE_HIGHWAYS = {
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link', 'unclassified', 'residential',
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+class RoutingBackend:
+    """Interface: route(coordinates) returns the driving route through [lat, lon] waypoints."""
+
+    def route(self, coordinates):
+        raise NotImplementedError
+
+    def matrix(self, coordinates, sources):
+        """Driving miles from each coordinates[i], i in sources, to every one of coordinates."""
+        raise NotImplementedError
+
+    async def aroute(self, coordinates):
+        """Async route(); by default the sync route runs on a worker thread."""
+        return await sync_to_async(self.route, thread_sensitive=False)(coordinates)
+
+
+class ORSBackend(RoutingBackend):
+    """The hosted OpenRouteService directions API (see views.fetch_route)."""
+
+    def route(self, coordinates):
+        from . import views
+
+        return views.fetch_route(coordinates)
+
+    def matrix(self, coordinates, sources):
+        from . import views
+
+        return views.fetch_matrix(coordinates, sources)
+
+    async def aroute(self, coordinates):
+        from . import views
+
+        return await views.afetch_route(coordinates)
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * asin(min(1.0, sqrt(a)))
+
+
+class RoadGraph:
+    """A directed road graph in compressed sparse row form, memory-mapped from a graph file.
+
+    File layout (little-endian): GRAPH_HEADER, then float64 node latitudes and
+    longitudes, int64 row offsets (nodes + 1), int32 edge targets and float32
+    edge lengths in meters, then a grid index over the nodes: sorted int64 cell
+    keys, int64 cell offsets (cells + 1) and int32 node indices grouped by cell
+    (see grid_cell). Only the pages a query touches are read from disk, and
+    processes mapping the same file share them.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            # Plain ndarrays over the mapping: np.memmap's per-item overhead dominates A*.
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = GRAPH_HEADER.unpack_from(self._mmap)[:2]
+        if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+            raise Exception(f"{path} is not a version {GRAPH_VERSION} road graph file; rebuild it with build_road_graph")
+        _, _, nodes, edges, cells, self.cell_size = GRAPH_HEADER.unpack_from(self._mmap)
+        self.path = path
+        offset = GRAPH_HEADER.size
+        arrays = []
+        for dtype, size in (
+            ('<f8', nodes), ('<f8', nodes), ('<i8', nodes + 1), ('<i4', edges), ('<f4', edges),
+            ('<i8', cells), ('<i8', cells + 1), ('<i4', nodes),
+        ):
+            arrays.append(np.frombuffer(self._mmap, dtype=dtype, count=size, offset=offset))
+            offset += np.dtype(dtype).itemsize * size
+        self.lat, self.lon, self.offsets, self.targets, self.lengths = arrays[:5]
+        self.cell_keys, self.cell_offsets, self.cell_nodes = arrays[5:]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def nearest(self, lat, lon):
+        """Index of the node closest to (lat, lon), by equirectangular distance.
+
+        Grid cells are searched in square rings around the query point until no
+        unsearched cell can hold a closer node, so a query reads only the nodes
+        of nearby cells. A point farther from the graph than the grid is wide
+        falls back to scanning every node.
+        """
+        scale = cos(radians(lat))
+        row, column = grid_cell(lat, lon, self.cell_size)
+        best, best_distance = None, inf
+        for ring in count():
+            if (2 * ring + 1) ** 2 > len(self.cell_keys):
+                return self._nearest_of(np.arange(len(self)), lat, lon, scale)[0]
+            candidates = self._ring_nodes(row, column, ring)
+            if len(candidates):
+                node, distance = self._nearest_of(candidates, lat, lon, scale)
+                if distance < best_distance:
+                    best, best_distance = node, distance
+            # Nodes in the next ring are at least `ring` whole cells away along one axis.
+            if best is not None and (ring * self.cell_size * scale) ** 2 >= best_distance:
+                return best
+
+    def _nearest_of(self, candidates, lat, lon, scale):
+        dx = (self.lon[candidates] - lon) * scale
+        dy = self.lat[candidates] - lat
+        distances = dx * dx + dy * dy
+        i = int(np.argmin(distances))
+        return int(candidates[i]), float(distances[i])
+
+    def _ring_nodes(self, row, column, ring):
+        """Node indices in the cells exactly `ring` cells from (row, column) along either axis."""
+        side = np.arange(-ring, ring + 1)
+        inner = side[1:-1]
+        rows = row + np.concatenate((np.full(len(side), -ring), np.full(len(side), ring), inner, inner))
+        columns = column + np.concatenate((side, side, np.full(len(inner), -ring), np.full(len(inner), ring)))
+        if ring == 0:
+            rows, columns = rows[:1], columns[:1]
+        keys = grid_key(rows, columns)[(columns >= 0) & (columns < GRID_COLUMNS)]
+        positions = np.searchsorted(self.cell_keys, keys)
+        found = positions < len(self.cell_keys)
+        positions = positions[found][self.cell_keys[positions[found]] == keys[found]]
+        offsets = self.cell_offsets
+        return np.concatenate(
+            [self.cell_nodes[offsets.item(p):offsets.item(p + 1)] for p in positions.tolist()] or [np.empty(0, np.int32)]
+        )
+
+    def shortest_path(self, source, target):
+        """A* over edge lengths with a great-circle heuristic; returns node indices or None."""
+        if source == target:
+            return [source]
+        lat, lon, offsets, targets, lengths = self.lat, self.lon, self.offsets, self.targets, self.lengths
+        goal_lat, goal_lon = lat.item(target), lon.item(target)
+        distance = {source: 0.0}
+        previous = {}
+        queue = [(0.0, 0.0, source)]
+        done = set()
+        while queue:
+            _, _, node = heapq.heappop(queue)
+            if node == target:
+                path = [node]
+                while node in previous:
+                    node = previous[node]
+                    path.append(node)
+                return path[::-1]
+            if node in done:
+                continue
+            done.add(node)
+            start, end = offsets.item(node), offsets.item(node + 1)
+            for neighbour, length in zip(targets[start:end].tolist(), lengths[start:end].tolist()):
+                candidate = distance[node] + length
+                if candidate < distance.get(neighbour, float('inf')):
+                    distance[neighbour] = candidate
+                    previous[neighbour] = node
+                    estimate = haversine_meters(lat.item(neighbour), lon.item(neighbour), goal_lat, goal_lon)
+                    # Ties go to the node nearer the goal, which keeps grid-like networks from flooding.
+                    heapq.heappush(queue, (candidate + estimate, estimate, neighbour))
+        return None
+
+    def distances_from(self, source, targets):
+        """Dijkstra from source until every node in targets is settled; returns {node: meters}."""
+        offsets, edge_targets, lengths = self.offsets, self.targets, self.lengths
+        remaining = set(targets)
+        distance = {source: 0.0}
+        found = {}
+        queue = [(0.0, source)]
+        while queue and remaining:
+            cost, node = heapq.heappop(queue)
+            if cost > distance[node]:
+                continue
+            if node in remaining:
+                remaining.discard(node)
+                found[node] = cost
+            start, end = offsets.item(node), offsets.item(node + 1)
+            for neighbour, length in zip(edge_targets[start:end].tolist(), lengths[start:end].tolist()):
+                candidate = cost + length
+                if candidate < distance.get(neighbour, float('inf')):
+                    distance[neighbour] = candidate
+                    heapq.heappush(queue, (candidate, neighbour))
+        return found
+
+
+GRID_COLUMNS = 1 << 24
+
+
+def grid_cell(lat, lon, cell_size):
+    """(row, column) of the grid cell holding (lat, lon); both are non-negative for valid coordinates."""
+    return floor((lat + 90) / cell_size), floor((lon + 180) / cell_size)
+
+
+def grid_key(rows, columns):
+    """Sortable int64 keys for grid cells, row-major."""
+    return np.asarray(rows, dtype=np.int64) * GRID_COLUMNS + np.asarray(columns, dtype=np.int64)
+
+
+class LocalGraphBackend(RoutingBackend):
+    """Shortest paths over a RoadGraph; waypoints snap to their nearest graph node."""
+
+    def __init__(self, path):
+        self.graph = RoadGraph(path)
+
+    def route(self, coordinates):
+        graph = self.graph
+        nodes = [graph.nearest(lat, lon) for lat, lon in coordinates]
+        path = [nodes[0]]
+        for source, target in zip(nodes, nodes[1:]):
+            leg = graph.shortest_path(source, target)
+            if leg is None:
+                raise Exception(f"No route in {graph.path} between {coordinates[0]} and {coordinates[-1]}")
+            path.extend(leg[1:])
+        if len(path) == 1:
+            path.append(path[0])
+        return np.column_stack((graph.lat[path], graph.lon[path])).tolist()
+
+    def matrix(self, coordinates, sources):
+        graph = self.graph
+        nodes = [graph.nearest(lat, lon) for lat, lon in coordinates]
+        rows = []
+        for i in sources:
+            found = graph.distances_from(nodes[i], nodes)
+            missing = [j for j, node in enumerate(nodes) if node not in found]
+            if missing:
+                raise Exception(f"No route in {graph.path} between {coordinates[i]} and {coordinates[missing[0]]}")
+            rows.append([found[node] / METERS_PER_MILE for node in nodes])
+        return rows
+
+
+BACKENDS = {
+    'ors': lambda: ORSBackend(),
+    'local': lambda: LocalGraphBackend(settings.ROUTING_GRAPH_PATH),
+}
+
+
+def get_backend():
+    """Return the configured backend, built once per (ROUTING_BACKEND, ROUTING_GRAPH_PATH)."""
+    key = (settings.ROUTING_BACKEND, settings.ROUTING_GRAPH_PATH)
+    backend = _backends.get(key)
+    if backend is None:
+        if settings.ROUTING_BACKEND not in BACKENDS:
+            raise Exception(f"Unknown ROUTING_BACKEND {settings.ROUTING_BACKEND!r}")
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                backend = _backends[key] = BACKENDS[settings.ROUTING_BACKEND]()
+    return backend
+
+
+def read_csv_edges(f):
+    """Yield (lat1, lon1, lat2, lon2, length_m, oneway) from a CSV edge list.
+
+    Columns: from_lat, from_lon, to_lat, to_lon, and optionally length
+    (meters; great-circle distance when blank) and oneway (1/true/yes).
+    """
+    for row in csv.DictReader(f):
+        length = row.get('length') or None
+        yield (
+            float(row['from_lat']), float(row['from_lon']), float(row['to_lat']), float(row['to_lon']),
+            float(length) if length is not None else None,
+            (row.get('oneway') or '').strip().lower() in ('1', 'true', 'yes'),
+        )
+
+
+def read_osm_edges(f):
+    """Yield edges for drivable highway ways in an OSM XML extract.
+
+    Nodes must precede ways, as in standard .osm files; oneway=yes/1/true
+    and oneway=-1 are honoured.
+    """
+    nodes = {}
+    for _, element in ET.iterparse(f, events=('end',)):
+        if element.tag == 'node':
+            nodes[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+        elif element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            if tags.get('highway') in DRIVABLE_HIGHWAYS:
+                refs = [nd.get('ref') for nd in element.iter('nd') if nd.get('ref') in nodes]
+                oneway = tags.get('oneway')
+                if oneway == '-1':
+                    refs.reverse()
+                for a, b in zip(refs, refs[1:]):
+                    yield (*nodes[a], *nodes[b], None, oneway in ('yes', '1', 'true', '-1'))
+        if element.tag in ('way', 'relation'):
+            element.clear()
+
+
+def build_graph(edges, path, precision=7, cell_size=GRID_CELL_SIZE):
+    """Write a RoadGraph file from (lat1, lon1, lat2, lon2, length_m, oneway) edges.
+
+    Endpoints equal after rounding to `precision` decimal places become one
+    node; nodes are indexed on a grid of cell_size degrees. Returns (node
+    count, directed edge count).
+    """
+    index = {}
+    lats, lons, sources, targets, lengths = [], [], [], [], []
+
+    def node(lat, lon):
+        key = (round(lat, precision), round(lon, precision))
+        if key not in index:
+            index[key] = len(lats)
+            lats.append(lat)
+            lons.append(lon)
+        return index[key]
+
+    for lat1, lon1, lat2, lon2, length, oneway in edges:
+        a, b = node(lat1, lon1), node(lat2, lon2)
+        if a == b:
+            continue
+        if length is None:
+            length = haversine_meters(lat1, lon1, lat2, lon2)
+        sources.append(a)
+        targets.append(b)
+        lengths.append(length)
+        if not oneway:
+            sources.append(b)
+            targets.append(a)
+            lengths.append(length)
+
+    sources = np.asarray(sources, dtype=np.int64)
+    order = np.argsort(sources, kind='stable')
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=len(lats))))).astype(np.int64)
+    node_keys = grid_key(
+        np.floor((np.asarray(lats, dtype=np.float64) + 90) / cell_size),
+        np.floor((np.asarray(lons, dtype=np.float64) + 180) / cell_size),
+    )
+    cell_nodes = np.argsort(node_keys, kind='stable')
+    cell_keys, cell_sizes = np.unique(node_keys, return_counts=True)
+    cell_offsets = np.concatenate(([0], np.cumsum(cell_sizes)))
+    with open(path, 'wb') as f:
+        f.write(GRAPH_HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION, len(lats), len(sources), len(cell_keys), cell_size))
+        f.write(np.asarray(lats, dtype='<f8').tobytes())
+        f.write(np.asarray(lons, dtype='<f8').tobytes())
+        f.write(offsets.astype('<i8').tobytes())
+        f.write(np.asarray(targets, dtype='<i4')[order].tobytes())
+        f.write(np.asarray(lengths, dtype='<f4')[order].tobytes())
+        f.write(cell_keys.astype('<i8').tobytes())
+        f.write(cell_offsets.astype('<i8').tobytes())
+        f.write(cell_nodes.astype('<i4').tobytes())
+    return len(lats), len(sources)
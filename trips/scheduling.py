@@ -0,0 +1,241 @@
+"""Hours-of-service scheduling on integer minutes from trip start.
+
+The engine has no Django dependencies. Durations and clock positions are plain
+ints (minutes since the start of the first trip day) and segments are
+__slots__ objects; dates are attached by split_by_day() and "HH:MM" strings
+are only produced by to_duty_log() or at the API boundary.
+
+Rules applied (property-carrying driver, 70-hour/8-day cycle):
+
+* at most 11 hours driving after 10 consecutive hours off duty;
+* no driving after the 14th hour since coming on duty;
+* a 30-minute non-driving interruption after 8 cumulative hours of driving;
+* no driving once 70 on-duty hours are used in the cycle, which a 34-hour
+  restart resets.
+"""
+from datetime import timedelta
+
+OFF_DUTY = 1
+SLEEPER_BERTH = 2
+DRIVING = 3
+ON_DUTY = 4
+
+STATUS_LABELS = {
+    OFF_DUTY: "Off Duty",
+    SLEEPER_BERTH: "Sleeper Berth",
+    DRIVING: "Driving",
+    ON_DUTY: "On Duty (Not Driving)",
+}
+
+MINUTES_PER_DAY = 24 * 60
+MAX_DRIVING = 11 * 60
+DUTY_WINDOW = 14 * 60
+DRIVING_BEFORE_BREAK = 8 * 60
+BREAK = 30
+DAILY_REST = 10 * 60
+CYCLE_LIMIT = 70 * 60
+CYCLE_RESTART = 34 * 60
+
+AVERAGE_SPEED_MPH = 60
+FUEL_INTERVAL_MILES = 1000
+FUEL_STOP = 30
+PICKUP = 60
+DROPOFF = 60
+
+
+class Segment:
+    __slots__ = ('start', 'end', 'status', 'remarks')
+
+    def __init__(self, start, end, status, remarks):
+        self.start = start
+        self.end = end
+        self.status = status
+        self.remarks = remarks
+
+    def __repr__(self):
+        return f"Segment({self.start}, {self.end}, {STATUS_LABELS[self.status]!r}, {self.remarks!r})"
+
+
+class HOSScheduler:
+    """Append duty periods to a log, inserting the breaks and rests the HOS rules require."""
+
+    def __init__(self, cycle_used=0, start=0, average_speed=AVERAGE_SPEED_MPH):
+        self.now = start
+        self.segments = []
+        self.average_speed = average_speed
+        self.cycle = cycle_used          # on-duty minutes used in the 70-hour cycle
+        self.shift_driving = 0           # driving minutes since the last 10-hour rest
+        self.shift_start = None          # minute the current 14-hour window opened
+        self.since_break = 0             # driving minutes since the last 30-minute interruption
+        self.odometer = 0.0              # miles driven since trip start
+        self.total_driving = 0
+        self.total_on_duty = 0
+
+    def _record(self, minutes, status, remarks):
+        last = self.segments[-1] if self.segments else None
+        if last is not None and last.status == status and last.remarks == remarks and last.end == self.now:
+            last.end += minutes
+        else:
+            self.segments.append(Segment(self.now, self.now + minutes, status, remarks))
+        self.now += minutes
+
+    def off_duty(self, minutes, remarks):
+        if minutes <= 0:
+            return
+        self._record(minutes, OFF_DUTY, remarks)
+        if minutes >= BREAK:
+            self.since_break = 0
+        if minutes >= DAILY_REST:
+            self.shift_driving = 0
+            self.shift_start = None
+        if minutes >= CYCLE_RESTART:
+            self.cycle = 0
+
+    def on_duty(self, minutes, remarks):
+        if minutes <= 0:
+            return
+        if self.shift_start is None:
+            self.shift_start = self.now
+        self._record(minutes, ON_DUTY, remarks)
+        self.cycle += minutes
+        self.total_on_duty += minutes
+        if minutes >= BREAK:
+            self.since_break = 0
+
+    def available_driving(self):
+        """Minutes that may be driven right now before some limit is hit."""
+        window_left = DUTY_WINDOW if self.shift_start is None else self.shift_start + DUTY_WINDOW - self.now
+        return min(
+            MAX_DRIVING - self.shift_driving,
+            window_left,
+            DRIVING_BEFORE_BREAK - self.since_break,
+            CYCLE_LIMIT - self.cycle,
+        )
+
+    def rest(self):
+        """Take the shortest off-duty period that makes driving possible again."""
+        if self.cycle >= CYCLE_LIMIT:
+            self.off_duty(CYCLE_RESTART, "34-hour restart")
+        elif self.shift_driving >= MAX_DRIVING or (
+            self.shift_start is not None and self.now >= self.shift_start + DUTY_WINDOW
+        ):
+            self.off_duty(DAILY_REST, "10-hour rest")
+        else:
+            self.off_duty(BREAK, "Mandatory 30-minute break")
+
+    def drive(self, minutes, remarks):
+        while minutes > 0:
+            available = self.available_driving()
+            if available <= 0:
+                self.rest()
+                continue
+            chunk = min(minutes, available)
+            if self.shift_start is None:
+                self.shift_start = self.now
+            self._record(chunk, DRIVING, remarks)
+            self.shift_driving += chunk
+            self.since_break += chunk
+            self.cycle += chunk
+            self.total_driving += chunk
+            self.total_on_duty += chunk
+            minutes -= chunk
+
+    def drive_distance(self, miles, remarks, fuel_stops=()):
+        """Drive miles at the average speed, stopping to fuel at any odometer marks passed.
+
+        fuel_stops is a list of (mile_marker, label) sorted by marker; markers
+        that are reached are popped from it.
+        """
+        destination = self.odometer + miles
+        while True:
+            target = destination
+            fueling = fuel_stops and fuel_stops[0][0] <= destination
+            if fueling:
+                target = max(fuel_stops[0][0], self.odometer)
+            minutes = self._minutes_at(target) - self._minutes_at(self.odometer)
+            self.drive(minutes, remarks)
+            self.odometer = target
+            if not fueling:
+                return
+            _, label = fuel_stops.pop(0)
+            self.on_duty(FUEL_STOP, f"Fueling stop at {label}")
+
+    def _minutes_at(self, miles):
+        # Rounding the cumulative time (not each chunk) keeps long trips from drifting.
+        return round(miles / self.average_speed * 60)
+
+    def end_of_day(self, remarks="End of day"):
+        self.off_duty(-self.now % MINUTES_PER_DAY, remarks)
+
+
+def plan_trip_schedule(current_location, pickup_location, dropoff_location, distance_to_pickup,
+                       distance_to_dropoff, cycle_used=0.0, fuel_stops=()):
+    """Build the HOS schedule for current -> pickup -> dropoff.
+
+    Distances are in miles, cycle_used in hours, and fuel_stops a sequence of
+    (mile_marker, label) measured from the trip start.
+    """
+    return plan_tour_schedule(
+        current_location,
+        [("pickup", pickup_location), ("dropoff", dropoff_location)],
+        [distance_to_pickup, distance_to_dropoff],
+        cycle_used=cycle_used,
+        fuel_stops=fuel_stops,
+    )
+
+
+def plan_tour_schedule(current_location, stops, leg_distances, cycle_used=0.0, fuel_stops=()):
+    """Build the HOS schedule for current -> stops[0] -> stops[1] -> ...
+
+    stops is a sequence of ("pickup" | "dropoff", location) and leg_distances
+    the miles driven to reach each of them; other arguments are as for
+    plan_trip_schedule().
+    """
+    scheduler = HOSScheduler(cycle_used=round(cycle_used * 60))
+    fuel_stops = sorted(fuel_stops)
+    for i, ((kind, location), miles) in enumerate(zip(stops, leg_distances)):
+        remarks = f"Driving from {current_location} to {location}" if i == 0 else f"Driving towards {location}"
+        scheduler.drive_distance(miles, remarks, fuel_stops)
+        if kind == "pickup":
+            scheduler.on_duty(PICKUP, f"Pickup at {location}")
+        else:
+            scheduler.on_duty(DROPOFF, f"Dropoff at {location}")
+    scheduler.end_of_day()
+    return scheduler
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def split_by_day(segments, start_date):
+    """Split segments at midnight into (date, start, end, status, remarks) rows.
+
+    start/end are minutes after that day's midnight; a segment ending exactly
+    at midnight ends at 1440 on its own day.
+    """
+    rows = []
+    for segment in segments:
+        start = segment.start
+        while start < segment.end:
+            day = start // MINUTES_PER_DAY
+            day_start = day * MINUTES_PER_DAY
+            end = min(segment.end, day_start + MINUTES_PER_DAY)
+            rows.append((start_date + timedelta(days=day), start - day_start, end - day_start,
+                         segment.status, segment.remarks))
+            start = end
+    return rows
+
+
+def to_duty_log(segments, start_date):
+    """Split segments at midnight into per-day duty log entries with "HH:MM" times ("24:00" at midnight)."""
+    return [
+        {
+            "date": str(day),
+            "start": format_minutes(start),
+            "end": format_minutes(end),
+            "status": STATUS_LABELS[status],
+            "remarks": remarks,
+        }
+        for day, start, end, status, remarks in split_by_day(segments, start_date)
+    ]
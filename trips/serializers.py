@@ -1,7 +1,27 @@
 from rest_framework import serializers
 from .models import Trip, DutyStatus
+from .scheduling import format_minutes
+
+class ClockTimeField(serializers.Field):
+    """Minutes after midnight stored as an integer, exposed as "HH:MM" ("24:00" for end of day)."""
+
+    def to_representation(self, value):
+        return format_minutes(value)
+
+    def to_internal_value(self, data):
+        try:
+            hours, minutes = map(int, str(data).split(':'))
+        except ValueError:
+            raise serializers.ValidationError("Expected a time in HH:MM format.")
+        if not (0 <= minutes < 60 and 0 <= hours * 60 + minutes <= 24 * 60):
+            raise serializers.ValidationError("Time must be between 00:00 and 24:00.")
+        return hours * 60 + minutes
 
 class DutyStatusSerializer(serializers.ModelSerializer):
+    start_time = ClockTimeField()
+    end_time = ClockTimeField()
+    status = serializers.CharField(source='get_status_display', read_only=True)
+
     class Meta:
         model = DutyStatus
         fields = ['date', 'start_time', 'end_time', 'status', 'remarks']
@@ -11,4 +31,4 @@ class TripSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Trip
-        fields = ['id', 'current_location', 'pickup_location', 'dropoff_location', 'cycle_used', 'duty_statuses']
\ No newline at end of file
+        fields = ['id', 'current_location', 'pickup_location', 'dropoff_location', 'cycle_used', 'driver', 'start_date', 'waypoints', 'endpoint_coords', 'created_at', 'duty_statuses']
@@ -0,0 +1,144 @@
+"""Truck-stop lookup for placing fueling stops at real stations.
+
+FUEL_STATIONS_PATH points at a CSV of stations (name, latitude, longitude and
+optional city, state columns). It is loaded once per process into a
+StationIndex, a uniform lat/lon grid, so a radius query only looks at the
+handful of cells it overlaps however many stations there are.
+"""
+import csv
+import threading
+from math import cos, floor, radians
+
+import numpy as np
+from django.conf import settings
+
+from .geometry import EARTH_RADIUS_MILES
+
+MILES_PER_DEGREE = 69.09
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class StationIndex:
+    """Grid spatial index over (lat, lon, label) stations; cell_size is in degrees."""
+
+    def __init__(self, stations, cell_size=0.5):
+        stations = list(stations)
+        self.cell_size = cell_size
+        self.lat = np.array([station[0] for station in stations], dtype=np.float64)
+        self.lon = np.array([station[1] for station in stations], dtype=np.float64)
+        self.labels = [station[2] for station in stations]
+        cells = {}
+        rows = np.floor(self.lat / cell_size).astype(np.int64).tolist()
+        columns = np.floor(self.lon / cell_size).astype(np.int64).tolist()
+        for i, cell in enumerate(zip(rows, columns)):
+            cells.setdefault(cell, []).append(i)
+        self.cells = {cell: np.array(members, dtype=np.int64) for cell, members in cells.items()}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def within(self, lat, lon, radius_miles):
+        """Return (indices, distances in miles) of stations within radius_miles of (lat, lon)."""
+        lat_span = radius_miles / MILES_PER_DEGREE
+        lon_span = radius_miles / (MILES_PER_DEGREE * max(cos(radians(lat)), 0.01))
+        size = self.cell_size
+        candidates = [
+            self.cells[(row, column)]
+            for row in range(floor((lat - lat_span) / size), floor((lat + lat_span) / size) + 1)
+            for column in range(floor((lon - lon_span) / size), floor((lon + lon_span) / size) + 1)
+            if (row, column) in self.cells
+        ]
+        if not candidates:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        indices = np.concatenate(candidates)
+        distances = haversine_miles(lat, lon, self.lat[indices], self.lon[indices])
+        inside = distances <= radius_miles
+        return indices[inside], distances[inside]
+
+
+def haversine_miles(lat, lon, lats, lons):
+    lat, lon, lats, lons = np.radians(lat), np.radians(lon), np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def route_distances(route_index, target_distance, window, lats, lons, resolution=0.5):
+    """Miles from each (lat, lon) to the route polyline within +/- window miles of target_distance.
+
+    The window is resampled to vertices about `resolution` miles apart, so the
+    cost does not grow with the density of the route geometry, and distances
+    are point-to-segment in a local equirectangular projection.
+    """
+    cumulative = route_index.cumulative
+    first = max(int(np.searchsorted(cumulative, target_distance - window, side='left')) - 1, 0)
+    last = min(int(np.searchsorted(cumulative, target_distance + window, side='right')) + 1, len(cumulative))
+    marks = np.arange(cumulative[first], cumulative[last - 1], resolution)
+    vertices = np.unique(np.concatenate((np.searchsorted(cumulative[first:last], marks) + first, [last - 1])))
+    points = route_index.points[vertices]
+    scale = np.array([MILES_PER_DEGREE, MILES_PER_DEGREE * cos(radians(points[:, 0].mean()))])
+    route = points * scale
+    stations = np.column_stack((lats, lons)) * scale
+    if len(route) < 2:
+        return np.hypot(*(stations - route[:1]).T)
+    start, direction = route[:-1], np.diff(route, axis=0)
+    lengths = np.maximum((direction ** 2).sum(axis=1), 1e-12)
+    offsets = stations[:, None, :] - start[None, :, :]
+    along = np.clip((offsets * direction[None]).sum(axis=2) / lengths[None], 0.0, 1.0)
+    nearest = start[None] + along[..., None] * direction[None]
+    return np.hypot(*(stations[:, None, :] - nearest).transpose(2, 0, 1)).min(axis=1)
+
+
+def snap_stops(index, route_index, target_distances, points, corridor_miles, search_miles, batch=32):
+    """Pick a station for each planned stop, or None where none qualifies.
+
+    Candidates are stations within search_miles of the planned point that lie
+    within corridor_miles of the route; the one nearest the planned point wins.
+    Candidates are checked against the corridor nearest first, `batch` at a
+    time, so the search usually stops after the first batch. Returns a list
+    of (label, [lat, lon]) or None.
+    """
+    snapped = []
+    for target_distance, (lat, lon) in zip(target_distances, points):
+        indices, distances = index.within(lat, lon, search_miles)
+        order = np.argsort(distances)
+        best = None
+        for start in range(0, len(order), batch):
+            chosen = order[start:start + batch]
+            candidates = indices[chosen]
+            off_route = route_distances(
+                route_index, target_distance, distances[chosen].max() + corridor_miles,
+                index.lat[candidates], index.lon[candidates], resolution=corridor_miles / 10,
+            )
+            inside = np.flatnonzero(off_route <= corridor_miles)
+            if len(inside):
+                best = int(candidates[inside[0]])
+                break
+        if best is None:
+            snapped.append(None)
+        else:
+            snapped.append((index.labels[best], [float(index.lat[best]), float(index.lon[best])]))
+    return snapped
+
+
+def load_stations(path):
+    """Read (lat, lon, label) stations from a CSV with name, latitude, longitude[, city, state]."""
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            label = ', '.join(part for part in (row['name'], row.get('city'), row.get('state')) if part)
+            yield float(row['latitude']), float(row['longitude']), label
+
+
+def get_station_index():
+    """The StationIndex for FUEL_STATIONS_PATH, loaded once per process; None when unset."""
+    path = settings.FUEL_STATIONS_PATH
+    if not path:
+        return None
+    index = _indexes.get(path)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(path)
+            if index is None:
+                index = _indexes[path] = StationIndex(load_stations(path))
+    return index
@@ -0,0 +1,134 @@
+"""Local stand-in for the OpenRouteService API, for tests and offline measurement.
+
+Point OPENROUTESERVICE_BASE_URL at FakeORSServer.url and the geocode,
+directions and matrix clients talk to it instead of api.openrouteservice.org.
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from math import asin, cos, radians, sin, sqrt
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_coordinates(text):
+    """Deterministic [lon, lat] inside the continental US for a location string."""
+    digest = hashlib.sha256(text.strip().lower().encode()).digest()
+    lat = 30 + 15 * int.from_bytes(digest[:4], 'big') / 2 ** 32
+    lon = -120 + 45 * int.from_bytes(digest[4:8], 'big') / 2 ** 32
+    return [round(lon, 6), round(lat, 6)]
+
+
+def fake_route(waypoints, points):
+    """A straight-line LineString through [lon, lat] waypoints with about `points` vertices."""
+    legs = max(len(waypoints) - 1, 1)
+    per_leg = max(points // legs, 1)
+    line = []
+    for (lon1, lat1), (lon2, lat2) in zip(waypoints, waypoints[1:]):
+        for i in range(per_leg):
+            f = i / per_leg
+            line.append([round(lon1 + f * (lon2 - lon1), 6), round(lat1 + f * (lat2 - lat1), 6)])
+    line.append(list(waypoints[-1]))
+    return line
+
+
+def fake_matrix(locations, sources, detour=1.2):
+    """Great-circle miles between [lon, lat] locations, stretched by a road detour factor."""
+    def miles(a, b):
+        lon1, lat1, lon2, lat2 = map(radians, (*a, *b))
+        h = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        return 2 * 3958.8 * asin(min(1.0, sqrt(h))) * detour
+    return [[round(miles(locations[i], b), 2) for b in locations] for i in sources]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server.fake
+        url = urlparse(self.path)
+        server.record('geocode')
+        time.sleep(server.latency)
+        if url.path != '/geocode/search':
+            return self._send(404, {'error': 'not found'})
+        text = parse_qs(url.query).get('text', [''])[0]
+        self._send(200, {'features': [{'geometry': {'type': 'Point', 'coordinates': fake_coordinates(text)}}]})
+
+    def do_POST(self):
+        server = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if self.path.startswith('/v2/matrix/'):
+            server.record('matrix')
+            time.sleep(server.latency)
+            locations = payload.get('locations') or []
+            sources = payload.get('sources') or range(len(locations))
+            return self._send(200, {'distances': fake_matrix(locations, sources)})
+        server.record('directions')
+        time.sleep(server.latency)
+        if not self.path.startswith('/v2/directions/'):
+            return self._send(404, {'error': 'not found'})
+        coordinates = payload.get('coordinates') or []
+        if len(coordinates) < 2:
+            return self._send(400, {'error': 'need at least two coordinates'})
+        self._send(200, {'features': [{
+            'geometry': {'type': 'LineString', 'coordinates': fake_route(coordinates, server.route_points)},
+        }]})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class FakeORSServer:
+    """Threaded HTTP server answering geocode/search, v2/directions and v2/matrix with canned data.
+
+    latency is added to every response (seconds); route_points sets the size of
+    returned route geometries. Use as a context manager or call start()/stop().
+    """
+
+    def __init__(self, latency=0.0, route_points=200, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.route_points = route_points
+        self.calls = {'geocode': 0, 'directions': 0, 'matrix': 0}
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,3 +1,1203 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import DataError, connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import jobs, ledger, logsheet, metrics, ratelimit, upstream, views
+from .benchmarks import bench_plan, bench_render, bench_stages
+from .cache import (
+    LRUCache, RouteCache, SingleFlight, geocode_cache, matrix_cache, normalize_location, plan_memo, route_cache,
+)
+from .geometry import RouteIndex, decode_polyline, encode_polyline, pack_route, simplify, unpack_route
+from .models import DriverDay, DutyStatus, GeocodeCacheEntry, PlanJob, Trip
+from .planning import compute_plan
+from .routing import LocalGraphBackend, build_graph, read_csv_edges, read_osm_edges
+from .scheduling import DRIVING, OFF_DUTY, HOSScheduler, plan_trip_schedule, to_duty_log
+from .serializers import DutyStatusSerializer
+from .stations import StationIndex, haversine_miles, snap_stops
+from .testing import FakeORSServer, fake_matrix
+from .tour import is_feasible, nearest_neighbour, order_stops, tour_length
+from .views import calculate_distance, convert_keys, day_logs, geocode_many, get_route, load_trip
+
+COORDS = {
+    'dallas, tx': [32.7767, -96.797],
+    'houston, tx': [29.7604, -95.3698],
+    'chicago, il': [41.8781, -87.6298],
+}
+
+ROUTE = [[32.7767, -96.797], [35.0, -93.0], [41.8781, -87.6298]]
+
+PLAN_PAYLOAD = {
+    'current_location': 'Dallas, TX',
+    'pickup_location': 'Houston, TX',
+    'dropoff_location': 'Chicago, IL',
+    'cycle_used': 10,
+}
+
+
+def fake_fetch_geocode(location):
+    return list(COORDS[normalize_location(location)])
+
+
+class LRUCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_expires_entries_after_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        with mock.patch('trips.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('trips.cache.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+
+    def test_evicts_by_total_bytes(self):
+        cache = LRUCache(maxsize=100, max_bytes=10, sizeof=len)
+        cache.set('a', 'xxxx')
+        cache.set('b', 'yyyy')
+        cache.set('c', 'zzzz')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.nbytes, 8)
+        cache.set('d', 'x' * 11)
+        self.assertIsNone(cache.get('d'))
+
+
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        geocode_cache.clear()
+        geocode_cache.reset_stats()
+
+    def test_normalize_location(self):
+        self.assertEqual(normalize_location('  Dallas ,TX. '), 'dallas, tx')
+        self.assertEqual(normalize_location('DALLAS,   TX'), 'dallas, tx')
+
+    def test_db_tier_refills_memory_tier(self):
+        geocode_cache.set('Dallas, TX', [1.0, 2.0])
+        geocode_cache.clear()
+        self.assertEqual(geocode_cache.get('dallas,tx'), [1.0, 2.0])
+        self.assertEqual(geocode_cache.get('dallas,tx'), [1.0, 2.0])
+        self.assertEqual(geocode_cache.stats(), {'memory_hits': 1, 'db_hits': 1, 'misses': 0})
+
+    @mock.patch('trips.views.get_route', return_value=ROUTE)
+    @mock.patch('trips.views.fetch_geocode', side_effect=fake_fetch_geocode)
+    def test_warm_plan_makes_no_geocode_calls(self, fetch_geocode, get_route):
+        client = APIClient()
+        client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+        self.assertEqual(fetch_geocode.call_count, 3)
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 3)
+
+        geocode_cache.clear()
+        plan_memo.clear()
+        response = client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(fetch_geocode.call_count, 3)
+
+
+class GeocodeManyTests(TestCase):
+    def setUp(self):
+        geocode_cache.clear()
+
+    def test_misses_are_fetched_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fetch(location):
+            barrier.wait()
+            return fake_fetch_geocode(location)
+
+        with mock.patch('trips.views.fetch_geocode', side_effect=fetch):
+            coords = geocode_many(['Dallas, TX', 'Houston, TX', 'Chicago, IL'])
+        self.assertEqual(coords, [COORDS['dallas, tx'], COORDS['houston, tx'], COORDS['chicago, il']])
+
+
+class RouteCacheTests(TestCase):
+    def test_snapped_coordinates_share_an_entry(self):
+        cache = RouteCache(max_bytes=1024, precision=3)
+        cache.set([[32.77671, -96.79701], [41.8781, -87.6298]], ROUTE)
+        self.assertEqual(cache.get([[32.77668, -96.79699], [41.87812, -87.62981]]), ROUTE)
+        self.assertIsNone(cache.get([[32.8, -96.8], [41.8781, -87.6298]]))
+        self.assertEqual(cache.stats()['bytes'], len(ROUTE) * 8)
+
+    @mock.patch('trips.views.fetch_route', return_value=ROUTE)
+    def test_repeated_lane_skips_route_api(self, fetch_route):
+        with mock.patch('trips.views.route_cache', RouteCache(max_bytes=1024, precision=4)):
+            get_route([1.0, 2.0], [], [3.0, 4.0])
+            self.assertEqual(get_route([1.0, 2.0], [], [3.0, 4.0]), ROUTE)
+        self.assertEqual(fetch_route.call_count, 1)
+
+
+class PlanMemoTests(TestCase):
+    def setUp(self):
+        plan_memo.clear()
+        self.route = mock.patch('trips.views.get_route', return_value=ROUTE)
+        self.route.start()
+        self.addCleanup(self.route.stop)
+        self.geocode = mock.patch('trips.views.geocode_many', return_value=[
+            COORDS['dallas, tx'], COORDS['houston, tx'], COORDS['chicago, il'],
+        ])
+        self.geocode_many = self.geocode.start()
+        self.addCleanup(self.geocode.stop)
+
+    def test_resubmission_replays_the_first_trip(self):
+        client = APIClient()
+        first = client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+        again = client.post('/api/plan-trip/', dict(PLAN_PAYLOAD, current_location=' dallas ,TX'), format='json')
+        self.assertEqual((first.status_code, again.status_code), (201, 200))
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(Trip.objects.count(), 1)
+        self.assertEqual(self.geocode_many.call_count, 1)
+
+    def test_idempotency_key_returns_the_original_trip_after_the_memo_expires(self):
+        client = APIClient()
+        first = client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        other_key = client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json', HTTP_IDEMPOTENCY_KEY='def')
+        self.assertEqual((first.status_code, other_key.status_code), (201, 201))
+
+        plan_memo.clear()
+        route_cache.clear()
+        with mock.patch('trips.views.geocode_many', side_effect=Exception("ORS is down")) as geocode_many, \
+                mock.patch('trips.views.get_route', side_effect=Exception("ORS is down")):
+            replay = client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()['trip'], first.json()['trip'])
+        self.assertEqual(replay.json()['totalDistance'], first.json()['totalDistance'])
+        self.assertEqual(replay.json()['stopCoords'], first.json()['stopCoords'])
+        geocode_many.assert_not_called()
+        self.assertEqual(Trip.objects.count(), 2)
+
+        conflict = client.post('/api/plan-trip/', dict(PLAN_PAYLOAD, cycle_used=20), format='json',
+                               HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(conflict.status_code, 422)
+
+    def test_only_upstream_failures_are_bad_requests(self):
+        client = APIClient(raise_request_exception=False)
+        self.route.stop()
+        with mock.patch('trips.views.get_route', side_effect=Exception("ORS is down")):
+            failed = client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+        self.route.start()
+        self.assertEqual((failed.status_code, failed.json()['error']), (400, 'Route calculation failed: ORS is down'))
+        with mock.patch('trips.views.save_plan', side_effect=DataError("value too long")):
+            broken = client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+        self.assertEqual(broken.status_code, 500)
+        self.assertNotIn(b'value too long', broken.content)
+
+    def test_singleflight_coalesces_concurrent_calls(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'plan'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+        follower.start()
+        while not flight._calls['key']._condition._waiters:  # follower is blocked on the leader's result
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('plan', False), ('plan', True)])
+
+
+ROAD_EDGES_CSV = """from_lat,from_lon,to_lat,to_lon,length,oneway
+35.0,-97.0,35.0,-96.0,,
+35.0,-96.0,35.0,-95.0,,
+35.0,-97.0,36.0,-97.0,,
+36.0,-97.0,36.0,-95.0,,
+36.0,-95.0,35.0,-95.0,,
+35.0,-95.0,35.5,-94.0,,1
+"""
+
+ROAD_OSM = """<?xml version="1.0"?>
+<osm>
+  <node id="1" lat="35.0" lon="-97.0"/><node id="2" lat="35.0" lon="-96.0"/><node id="3" lat="35.0" lon="-95.0"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="primary"/><tag k="oneway" v="yes"/></way>
+  <way id="11"><nd ref="1"/><nd ref="3"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+
+
+class LocalRoutingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'roads.graph')
+        self.assertEqual(build_graph(read_csv_edges(io.StringIO(ROAD_EDGES_CSV)), self.path), (6, 11))
+
+    def test_shortest_path_snaps_waypoints_and_respects_oneway(self):
+        backend = LocalGraphBackend(self.path)
+        self.assertEqual(
+            backend.route([[35.01, -97.02], [34.9, -95.1]]), [[35.0, -97.0], [35.0, -96.0], [35.0, -95.0]],
+        )
+        self.assertEqual(backend.route([[35.0, -95.0], [35.5, -94.0]])[-1], [35.5, -94.0])
+        with self.assertRaises(Exception):
+            backend.route([[35.5, -94.0], [35.0, -95.0]])
+
+    def test_matrix_rows_are_driving_miles_to_every_point(self):
+        backend = LocalGraphBackend(self.path)
+        [row] = backend.matrix([[35.0, -97.0], [35.0, -96.0], [35.0, -95.0]], [2])
+        self.assertAlmostEqual(row[0], 2 * row[1], places=3)
+        self.assertAlmostEqual(row[1], calculate_distance([35.0, -96.0], [35.0, -95.0]), delta=0.5)
+        with self.assertRaises(Exception):
+            backend.matrix([[35.5, -94.0], [35.0, -95.0]], [0])
+
+    def test_get_route_uses_the_configured_backend(self):
+        route_cache.clear()
+        with override_settings(ROUTING_BACKEND='local', ROUTING_GRAPH_PATH=self.path), \
+                mock.patch('trips.views.fetch_route') as fetch_route:
+            route = get_route([35.0, -97.0], [[36.0, -97.0]], [35.0, -95.0])
+        fetch_route.assert_not_called()
+        self.assertEqual(route, [[35.0, -97.0], [36.0, -97.0], [36.0, -95.0], [35.0, -95.0]])
+
+    def test_grid_nearest_matches_brute_force(self):
+        rng = np.random.default_rng(3)
+        lats, lons = rng.uniform(30, 45, 5000).tolist(), rng.uniform(-110, -80, 5000).tolist()
+        edges = [(lats[i], lons[i], lats[i + 1], lons[i + 1], None, False) for i in range(4999)]
+        build_graph(edges, self.path)
+        graph = LocalGraphBackend(self.path).graph
+        for lat, lon in [*zip(rng.uniform(28, 47, 50).tolist(), rng.uniform(-115, -75, 50).tolist()), (0.0, 0.0)]:
+            dx, dy = (graph.lon - lon) * np.cos(np.radians(lat)), graph.lat - lat
+            self.assertEqual(graph.nearest(lat, lon), int(np.argmin(dx * dx + dy * dy)))
+
+    def test_osm_extract_keeps_drivable_ways(self):
+        edges = list(read_osm_edges(io.BytesIO(ROAD_OSM.encode())))
+        self.assertEqual([edge[:4] for edge in edges], [(35.0, -97.0, 35.0, -96.0), (35.0, -96.0, 35.0, -95.0)])
+        self.assertTrue(all(edge[5] for edge in edges))
+
+
+class StationSnappingTests(TestCase):
+    def test_grid_query_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        stations = list(zip(rng.uniform(30, 45, 5000).tolist(), rng.uniform(-110, -80, 5000).tolist(), range(5000)))
+        index = StationIndex(stations)
+        indices, distances = index.within(38.0, -95.0, 60)
+        expected = np.flatnonzero(haversine_miles(38.0, -95.0, index.lat, index.lon) <= 60)
+        self.assertEqual(sorted(indices.tolist()), expected.tolist())
+        self.assertTrue(len(expected) > 10)
+
+    def test_stops_snap_to_nearest_station_inside_the_corridor(self):
+        route_index = RouteIndex([[35.0, -100.0], [35.0, -90.0]])
+        index = StationIndex([
+            (35.3, -95.0, "Off corridor"),       # ~21 miles off the route, nearest to the point
+            (35.02, -95.2, "Truck stop, OK"),    # ~1.4 miles off the route, ~11 miles along
+            (35.0, -99.9, "Far away"),
+        ])
+        point = route_index.interpolate([route_index.length / 2])[0].tolist()
+        self.assertEqual(
+            snap_stops(index, route_index, [route_index.length / 2], [point], corridor_miles=5, search_miles=50),
+            [("Truck stop, OK", [35.02, -95.2])],
+        )
+        self.assertEqual(
+            snap_stops(index, route_index, [route_index.length / 2], [point], corridor_miles=1, search_miles=50),
+            [None],
+        )
+
+    def test_compute_plan_labels_fueling_stops_with_stations(self):
+        route = [[32.7767, -96.797], [41.8781, -87.6298], [47.6062, -122.3321]]
+        plan_stops = compute_plan("A", "B", "C", 0, route[0], route[1], route[2], route)["stop_coords"]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'stations.csv')
+        with open(path, 'w') as f:
+            f.write("name,latitude,longitude,city,state\n")
+            f.write(f"Big Rig Plaza,{plan_stops[0][0] + 0.01},{plan_stops[0][1]},Joplin,MO\n")
+        with override_settings(FUEL_STATIONS_PATH=path):
+            plan = compute_plan("A", "B", "C", 0, route[0], route[1], route[2], route)
+        self.assertEqual(plan["stops"][0]["location"], "Big Rig Plaza, Joplin, MO")
+        self.assertEqual(plan["stop_coords"][0], [plan_stops[0][0] + 0.01, plan_stops[0][1]])
+        self.assertIn("(approx)", plan["stops"][1]["location"])
+        remarks = [row[4] for row in plan["duty_log"]]
+        self.assertIn("Fueling stop at Big Rig Plaza, Joplin, MO", remarks)
+
+
+class TourPlanningTests(TestCase):
+    def setUp(self):
+        for cache in (geocode_cache, route_cache, matrix_cache, plan_memo):
+            cache.clear()
+
+    def test_two_opt_keeps_pickups_before_dropoffs_and_never_lengthens(self):
+        rng = np.random.default_rng(3)
+        for shipments in (1, 4, 10):
+            matrix = (rng.uniform(1, 500, (2 * shipments + 1, 2 * shipments + 1)) * (1 - np.eye(2 * shipments + 1))).tolist()
+            tour = order_stops(matrix, shipments)
+            self.assertEqual(sorted(tour), list(range(2 * shipments + 1)))
+            self.assertEqual(tour[0], 0)
+            self.assertTrue(is_feasible(tour))
+            self.assertLessEqual(tour_length(matrix, tour), tour_length(matrix, nearest_neighbour(matrix, shipments)))
+
+    def test_tour_plan_fetches_the_matrix_in_batches_and_reuses_it(self):
+        payload = {
+            'currentLocation': 'Tour yard',
+            'shipments': [{'pickupLocation': f'Shipper {i}', 'dropoffLocation': f'Receiver {i}'} for i in range(10)],
+            'cycleUsed': 5,
+        }
+        with FakeORSServer() as server, override_settings(OPENROUTESERVICE_BASE_URL=server.url,
+                                                          MATRIX_MAX_ELEMENTS=21 * 5):
+            client = APIClient()
+            response = client.post('/api/plan-trip/', payload, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(server.calls['matrix'], 5)
+
+            started = time.perf_counter()
+            again = client.post('/api/plan-trip/', dict(payload, cycleUsed=6), format='json')
+            elapsed = time.perf_counter() - started
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(server.calls['matrix'], 5)
+        self.assertLess(elapsed, 1.0)
+
+        trip = response.json()['trip']
+        waypoints = trip['waypoints']
+        order = [1 + 2 * w['shipment'] + (w['type'] == 'dropoff') for w in waypoints]
+        self.assertTrue(is_feasible([0] + order))
+        self.assertEqual(sorted(order), list(range(1, 21)))
+        self.assertEqual(trip['pickupLocation'], waypoints[0]['location'])
+        self.assertEqual(trip['dropoffLocation'], waypoints[-1]['location'])
+        # A stop that runs past midnight is logged on both days.
+        remarks = {status['remarks'] for status in trip['dutyStatuses']}
+        self.assertEqual(len({remark for remark in remarks if remark.startswith(('Pickup at', 'Dropoff at'))}), 20)
+
+    def test_tour_replay_is_rebuilt_from_the_stored_route(self):
+        payload = {
+            'currentLocation': 'Tour yard',
+            'shipments': [{'pickupLocation': f'Shipper {i}', 'dropoffLocation': f'Receiver {i}'} for i in range(3)],
+            'cycleUsed': 5,
+        }
+        with FakeORSServer() as server, override_settings(OPENROUTESERVICE_BASE_URL=server.url):
+            client = APIClient()
+            first = client.post('/api/plan-trip/', payload, format='json', HTTP_IDEMPOTENCY_KEY='tour')
+            calls = dict(server.calls)
+            for cache in (plan_memo, geocode_cache, matrix_cache, route_cache):
+                cache.clear()
+            replay = client.post('/api/plan-trip/', payload, format='json', HTTP_IDEMPOTENCY_KEY='tour')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(dict(server.calls), calls)
+        self.assertEqual(replay.json()['trip'], first.json()['trip'])
+        self.assertEqual(replay.json()['totalDistance'], first.json()['totalDistance'])
+
+    def test_fake_matrix_is_scaled_great_circle_distance(self):
+        dallas, chicago = COORDS['dallas, tx'], COORDS['chicago, il']
+        [[_, miles]] = fake_matrix([dallas[::-1], chicago[::-1]], [0])
+        self.assertAlmostEqual(miles, calculate_distance(dallas, chicago) * 1.2, delta=0.5)
+
+    def test_rejects_malformed_shipments(self):
+        response = APIClient().post('/api/plan-trip/', {'currentLocation': 'Dallas, TX', 'shipments': ['Houston']},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RouteIndexTests(TestCase):
+    def test_length_matches_summed_haversine(self):
+        expected = sum(calculate_distance(a, b) for a, b in zip(ROUTE, ROUTE[1:]))
+        self.assertAlmostEqual(RouteIndex(ROUTE).length, expected, places=6)
+
+    def test_interpolates_batch_of_targets(self):
+        index = RouteIndex(ROUTE)
+        first_leg = calculate_distance(ROUTE[0], ROUTE[1])
+        points = index.interpolate([0, first_leg / 2, first_leg, index.length + 50])
+        self.assertEqual(points.shape, (4, 2))
+        self.assertEqual(points[0].tolist(), ROUTE[0])
+        self.assertAlmostEqual(points[1][0], (ROUTE[0][0] + ROUTE[1][0]) / 2)
+        self.assertAlmostEqual(points[2][1], ROUTE[1][1])
+        self.assertEqual(points[3].tolist(), ROUTE[-1])
+
+    def test_locates_stops_in_visiting_order(self):
+        # An out-and-back route passes the turnaround's neighbour twice.
+        route = [[30.0, -95.0], [31.0, -95.0], [32.0, -95.0], [31.0, -95.0], [30.5, -95.0]]
+        index = RouteIndex(route)
+        positions = index.locate([[32.0, -95.0], [31.01, -95.0]])
+        self.assertEqual(positions, [index.cumulative[2], index.cumulative[3]])
+
+    def test_legs_are_measured_along_the_route_through_the_pickup(self):
+        dallas, houston, chicago = COORDS['dallas, tx'], COORDS['houston, tx'], COORDS['chicago, il']
+        route = [dallas, houston, chicago]
+        plan = compute_plan("Dallas, TX", "Houston, TX", "Chicago, IL", 0, dallas, houston, chicago, route)
+        self.assertAlmostEqual(plan["total_distance"], calculate_distance(dallas, houston) + calculate_distance(houston, chicago))
+        with mock.patch('trips.views.geocode_many', return_value=route), \
+                mock.patch('trips.views.get_route', return_value=route) as get_route:
+            plan_memo.clear()
+            APIClient().post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+        get_route.assert_called_once_with(dallas, [houston], chicago)
+
+
+class PlanTripQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def plan(self, route):
+        coords = [COORDS['dallas, tx'], COORDS['houston, tx'], route[-1]]
+        plan_memo.clear()
+        with mock.patch('trips.views.geocode_many', return_value=coords), \
+                mock.patch('trips.views.get_route', return_value=route):
+            return self.client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+
+    def test_query_count_is_constant_in_trip_length(self):
+        # savepoint, trip insert, bulk duty-status insert, trip + prefetch select, release
+        with self.assertNumQueries(6):
+            short = self.plan(ROUTE[:2])
+        with self.assertNumQueries(6):
+            long = self.plan(ROUTE + [[47.6062, -122.3321], [25.7617, -80.1918]])
+        self.assertGreater(len(long.json()['trip']['dutyStatuses']), len(short.json()['trip']['dutyStatuses']))
+
+
+def long_haul_route(points=10000):
+    """A gently curving Dallas -> Chicago polyline with `points` vertices."""
+    return [
+        [32.7767 + 9.1 * i / points, -96.797 + 9.17 * i / points + 0.05 * ((i % 200) / 200)]
+        for i in range(points)
+    ]
+
+
+class RouteGeometryTests(TestCase):
+    def test_encode_polyline_matches_reference(self):
+        points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+        self.assertEqual(encode_polyline(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@'), points)
+
+    def test_simplify_keeps_endpoints_and_corners(self):
+        points = [[0, 0], [0, 0.5], [0, 1], [0.5, 1], [1, 1]]
+        self.assertEqual(simplify(points, 10).tolist(), [[0, 0], [0, 1], [1, 1]])
+        self.assertEqual(len(simplify(points, 0)), 5)
+
+    def test_simplified_polyline_response_is_an_order_of_magnitude_smaller(self):
+        route = long_haul_route()
+        coords = [route[0], COORDS['houston, tx'], route[-1]]
+        client = APIClient()
+        plan_memo.clear()
+        with mock.patch('trips.views.geocode_many', return_value=coords), \
+                mock.patch('trips.views.get_route', return_value=route):
+            full = client.post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+            compact = client.post('/api/plan-trip/?zoom=10&geometry=polyline', PLAN_PAYLOAD, format='json')
+            invalid = client.post('/api/plan-trip/?geometry=wkt', PLAN_PAYLOAD, format='json')
+        self.assertEqual(compact.status_code, 201)
+        self.assertNotIn('routeCoordinates', compact.json())
+        self.assertEqual(decode_polyline(compact.json()['routePolyline'])[0], route[0])
+        self.assertLess(len(compact.content) * 10, len(full.content))
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_out_of_range_zoom_is_a_bad_request(self):
+        trip = Trip.objects.create(current_location="A", pickup_location="B", dropoff_location="C",
+                                   route_geometry=pack_route(ROUTE, []))
+        for zoom in ('2000', '-2000', '31', 'nan'):
+            self.assertEqual(self.client.get(f'/api/trips/{trip.pk}/route/', {'zoom': zoom}).status_code, 400, zoom)
+            response = APIClient().post(f'/api/plan-trip/?zoom={zoom}', PLAN_PAYLOAD, format='json')
+            self.assertEqual((response.status_code, response.json()['error']), (400, 'zoom must be between 0 and 30'))
+        self.assertEqual(self.client.get(f'/api/trips/{trip.pk}/route/', {'zoom': '30'}).status_code, 200)
+
+    def test_pack_route_round_trips_compactly(self):
+        route = long_haul_route()
+        packed = pack_route(route, [route[10]])
+        decoded, stops = unpack_route(memoryview(packed))
+        self.assertEqual(len(decoded), len(route))
+        self.assertLess(max(abs(a - b) for p, q in zip(decoded, route) for a, b in zip(p, q)), 1e-6)
+        self.assertLess(len(packed), len(route) * 16 / 2)  # under half of raw float64 pairs
+        self.assertEqual(unpack_route(pack_route([], [])), ([], []))
+
+    def test_saved_trip_serves_its_route_without_replanning(self):
+        route = long_haul_route(500)
+        coords = [route[0], COORDS['houston, tx'], route[-1]]
+        plan_memo.clear()
+        with mock.patch('trips.views.geocode_many', return_value=coords), \
+                mock.patch('trips.views.get_route', return_value=route):
+            planned = APIClient().post('/api/plan-trip/', PLAN_PAYLOAD, format='json').json()
+        trip_id = planned['trip']['id']
+        self.assertEqual(planned['trip']['endpointCoords'], {'start': route[0], 'pickup': coords[1], 'dropoff': route[-1]})
+
+        stored = self.client.get(f'/api/trips/{trip_id}/route/').json()
+        self.assertEqual(len(stored['routeCoordinates']), len(route))
+        self.assertEqual(stored['startCoords'], route[0])
+        self.assertEqual(len(stored['stopCoords']), len(planned['stopCoords']))
+        compact = self.client.get(f'/api/trips/{trip_id}/route/', {'geometry': 'polyline', 'zoom': 10}).json()
+        self.assertIn('routePolyline', compact)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/trips/')
+            self.client.get(f'/api/trips/{trip_id}/')
+        self.assertFalse(any('route_geometry' in query['sql'] for query in queries.captured_queries))
+
+    def test_route_of_trip_saved_without_geometry_is_not_found(self):
+        trip = Trip.objects.create(current_location="A", pickup_location="B", dropoff_location="C")
+        self.assertEqual(self.client.get(f'/api/trips/{trip.pk}/route/').status_code, 404)
+        self.assertEqual(self.client.get('/api/trips/999999/route/').status_code, 404)
+
+
+class RenderTests(TestCase):
+    def test_convert_keys_leaves_coordinate_arrays_alone(self):
+        route = [[1.0, 2.0], [3.0, 4.0]]
+        data = convert_keys({'route_coordinates': route, 'stops': [{'stop_type': 'fuel'}]})
+        self.assertEqual(data, {'routeCoordinates': route, 'stops': [{'stopType': 'fuel'}]})
+        self.assertIs(data['routeCoordinates'], route)
+
+    def test_fast_render_matches_legacy_output(self):
+        self.assertTrue(bench_render(points=500, repeat=1)['identical'])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        geocode_cache.clear()
+        route_cache.clear()
+        plan_memo.clear()
+        metrics.registry.clear()
+
+    def plan(self):
+        with mock.patch('trips.views.upstream.request') as request:
+            request.side_effect = lambda method, url, **kwargs: mock.Mock(
+                status_code=200,
+                json=lambda: (
+                    {'features': [{'geometry': {'coordinates': fake_fetch_geocode(kwargs['params']['text'])[::-1]}}]}
+                    if method == 'GET' else
+                    {'features': [{'geometry': {'coordinates': [[lon, lat] for lat, lon in ROUTE]}}]}
+                ),
+            )
+            return APIClient().post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+
+    def test_server_timing_header_lists_each_stage(self):
+        response = self.plan()
+        self.assertEqual(response.status_code, 201)
+        entries = {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+        self.assertEqual(
+            set(entries), {'ors_geocode', 'geocode', 'ors_route', 'route', 'plan', 'db', 'serialize', 'render', 'total'}
+        )
+        self.assertIn('desc="3 calls"', entries['ors_geocode'])
+
+        text = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('trips_stage_duration_seconds_count{stage="ors_geocode"} 3', text)
+        self.assertIn('trips_request_duration_seconds_bucket{view="plan-trip",le="+Inf"} 1', text)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_instrumentation_records_nothing(self):
+        response = self.plan()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics.registry.families, {})
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+
+class BenchmarkTests(TestCase):
+    def test_stage_suite_reports_each_stage(self):
+        results = bench_stages(points=200, repeat=1)
+        for stage in ('interpolation', 'scheduling', 'serialization', 'compute_plan'):
+            self.assertIn('median_ms', results[stage])
+
+    def test_plan_suite_runs_offline_and_cleans_up(self):
+        results = bench_plan(points=200, repeat=2)
+        # The warm-up, two cold plans and the first warm plan each miss the caches; later warm plans hit.
+        self.assertEqual(results['upstream_calls'], {'geocode': 12, 'directions': 4, 'matrix': 0})
+        self.assertFalse(Trip.objects.exists())
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_processes_share_one_bucket(self):
+        # Three processes take 20 tokens each from a 50/s bucket holding a burst of 5.
+        path = os.path.join(self.directory, 'shared.bucket')
+        code = (
+            "import sys; from trips.ratelimit import TokenBucket; "
+            "bucket = TokenBucket(sys.argv[1], 50, 5); [bucket.acquire(30) for _ in range(20)]"
+        )
+        started = time.perf_counter()
+        workers = [subprocess.Popen([sys.executable, '-c', code, path]) for _ in range(3)]
+        self.assertEqual([worker.wait(timeout=30) for worker in workers], [0, 0, 0])
+        self.assertGreaterEqual(time.perf_counter() - started, (60 - 5) / 50)
+
+    def test_batch_priority_keeps_a_reserve_and_waits_have_a_deadline(self):
+        bucket = ratelimit.TokenBucket(os.path.join(self.directory, 'slow.bucket'), rate=0.001, capacity=4)
+        self.assertEqual([bucket.take(reserve=2) == 0 for _ in range(3)], [True, True, False])
+        self.assertEqual([bucket.take() == 0 for _ in range(3)], [True, True, False])
+        with self.assertRaises(ratelimit.RateLimited):
+            bucket.acquire(timeout=0.01)
+
+    def test_batch_plans_draw_on_the_quota_at_batch_priority(self):
+        calls = []
+
+        def record(bucket, timeout, reserve=0.0):
+            calls.append((os.path.basename(bucket.path), timeout, reserve))
+
+        geocode_cache.clear()
+        route_cache.clear()
+        plan_memo.clear()
+        with FakeORSServer() as server, mock.patch.object(ratelimit.TokenBucket, 'acquire', record), \
+                override_settings(OPENROUTESERVICE_BASE_URL=server.url, ORS_RATE_LIMIT_DIR=self.directory,
+                                  ORS_RATE_LIMITS={'geocode': 100, 'directions': 40}, PLAN_PROCESS_WORKERS=0):
+            APIClient().post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+            self.assertEqual(sorted(set(calls)), [('hos-ors-directions.bucket', 10, 0.0), ('hos-ors-geocode.bucket', 10, 0.0)])
+            calls.clear()
+            geocode_cache.clear()
+            GeocodeCacheEntry.objects.all().delete()
+            route_cache.clear()
+            response = APIClient().post('/api/plan-trips/batch/', {'trips': [dict(PLAN_PAYLOAD, cycle_used=20)]},
+                                        format='json')
+            b''.join(response.streaming_content)
+        self.assertEqual(sorted(set(calls)), [('hos-ors-directions.bucket', 120, 1.0), ('hos-ors-geocode.bucket', 120, 2.5)])
+
+    def test_sync_retries_of_throttled_requests_wait_for_a_token(self):
+        responses = [mock.Mock(status_code=429, headers={'Retry-After': '2'}), mock.Mock(status_code=200, headers={})]
+        session = mock.Mock(request=mock.Mock(side_effect=responses))
+        with mock.patch('trips.upstream.get_session', return_value=session), \
+                mock.patch('trips.ratelimit.acquire') as acquire, mock.patch('trips.upstream.time.sleep') as sleep:
+            response = upstream.request('GET', 'http://ors.invalid/geocode/search', limit='geocode')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(acquire.call_count, 2)
+        sleep.assert_called_once_with(2.0)
+
+
+class LogSheetTests(TestCase):
+    def setUp(self):
+        plan_memo.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(LOGSHEET_CACHE_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        with mock.patch('trips.views.geocode_many', return_value=[COORDS[k] for k in ('dallas, tx', 'houston, tx', 'chicago, il')]), \
+                mock.patch('trips.views.get_route', return_value=ROUTE):
+            self.trip = Trip.objects.get(pk=APIClient().post('/api/plan-trip/', PLAN_PAYLOAD, format='json').json()['trip']['id'])
+        self.days = sorted(set(self.trip.duty_statuses.values_list('date', flat=True)))
+
+    def get(self, **params):
+        response = self.client.get(f'/api/trips/{self.trip.pk}/logs/', params)
+        return response, b''.join(response.streaming_content)
+
+    def test_svg_stacks_one_sheet_per_day_and_repeat_views_come_from_disk(self):
+        self.assertGreater(len(self.days), 1)
+        with mock.patch('trips.logsheet.sheet', wraps=logsheet.sheet) as sheet:
+            response, body = self.get()
+            self.assertEqual(response['Content-Type'], 'image/svg+xml')
+            again = self.get()[1]
+        self.assertEqual(sheet.call_count, len(self.days))
+        self.assertEqual(again, body)
+        root = ET.fromstring(body)
+        self.assertEqual(len(root.findall('{http://www.w3.org/2000/svg}g')), len(self.days))
+        self.assertIn(b'Date: ' + self.days[0].isoformat().encode(), body)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, str(self.trip.pk)))), len(self.days))
+
+    def test_edited_log_renders_under_a_new_hash(self):
+        day = self.days[0].isoformat()
+        before = self.get(date=day)[1]
+        self.trip.duty_statuses.filter(date=self.days[0]).update(remarks="Corrected & signed")
+        after = self.get(date=day)[1]
+        self.assertNotEqual(after, before)
+        self.assertIn(b'Corrected &amp; signed', after)
+        self.assertEqual([name.startswith(day) for name in os.listdir(os.path.join(self.directory, str(self.trip.pk)))],
+                         [True])
+
+    def test_pdf_has_a_page_per_day_and_a_valid_xref(self):
+        response, body = self.get(format='pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(body.startswith(b'%PDF-1.4'))
+        self.assertIn(f'/Count {len(self.days)}'.encode(), body)
+        xref = int(body[body.rindex(b'startxref') + 10:].split()[0])
+        offsets = [int(line.split()[0]) for line in body[xref:].split(b'\n')[3:] if line.endswith(b' n ')]
+        self.assertEqual(len(offsets), 3 + 2 * len(self.days))
+        for number, offset in enumerate(offsets, start=1):
+            self.assertTrue(body[offset:].startswith(f'{number} 0 obj'.encode()))
+
+    def test_concurrent_renders_of_one_day_do_not_collide(self):
+        day, statuses = day_logs(load_trip(pk=self.trip.pk))[0]
+        summary = (self.trip.current_location, self.trip.pickup_location, self.trip.dropoff_location)
+        cache = logsheet.LogSheetCache(self.directory)
+        barrier = threading.Barrier(4)
+        results, errors = [], []
+
+        def render():
+            barrier.wait()
+            try:
+                results.append(cache.get(self.trip.pk, day, statuses, summary, 'svg'))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=render) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(os.listdir(os.path.join(self.directory, str(self.trip.pk))),
+                         [f"{day.isoformat()}-{logsheet.content_hash(day, statuses, summary)}.svg"])
+
+    def test_legacy_rows_past_midnight_are_drawn_up_to_midnight(self):
+        trip = Trip.objects.create(current_location="A", pickup_location="B", dropoff_location="C")
+        DutyStatus.objects.create(trip=trip, date=date(2024, 1, 1), start_time=0, end_time=1410, status=OFF_DUTY)
+        DutyStatus.objects.create(trip=trip, date=date(2024, 1, 1), start_time=1410, end_time=30, status=DRIVING)
+        response = self.client.get(f'/api/trips/{trip.pk}/logs/')
+        totals = [text.text for text in ET.fromstring(b''.join(response.streaming_content)).iter('{http://www.w3.org/2000/svg}text')
+                  if text.get('x') == f"{logsheet.GRID_LEFT + logsheet.GRID_WIDTH + 30:.2f}"][1:]
+        self.assertEqual(totals, ["23:30", "00:00", "00:30", "00:00", "24:00"])
+
+    def test_rejects_unknown_format_and_missing_trip(self):
+        self.assertEqual(self.client.get(f'/api/trips/{self.trip.pk}/logs/', {'format': 'png'}).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/trips/{self.trip.pk}/logs/', {'date': '1999-01-01'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/trips/999999/logs/').status_code, 404)
+
+
+
+class TripHistoryTests(TestCase):
+    def setUp(self):
+        created = timezone.now()
+        self.trips = []
+        for i in range(5):
+            trip = Trip.objects.create(current_location=f"Start {i}", pickup_location="Dallas, TX", dropoff_location="Chicago, IL")
+            DutyStatus.objects.create(trip=trip, date=date(2024, 1, 1), start_time=0, end_time=60, status=DRIVING)
+            self.trips.append(trip)
+        # Three trips share a timestamp, so pages must break ties on id.
+        Trip.objects.filter(pk__in=[t.pk for t in self.trips[1:4]]).update(created_at=created)
+
+    def test_pages_cover_every_trip_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            body = self.client.get('/api/trips/', params).json()
+            self.assertLessEqual(len(body['results']), 2)
+            seen += [trip['id'] for trip in body['results']]
+            cursor = body['nextCursor']
+            if cursor is None:
+                break
+        expected = list(Trip.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(body['results'][-1]['dutyStatuses'][0]['status'], 'Driving')
+
+    def test_list_loads_statuses_in_one_query(self):
+        with self.assertNumQueries(3):  # validators, trips, duty statuses
+            response = self.client.get('/api/trips/', {'limit': 5})
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_rejects_bad_cursor_and_limit(self):
+        self.assertEqual(self.client.get('/api/trips/', {'cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/trips/', {'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/trips/', {'limit': 'ten'}).status_code, 400)
+
+    def test_unchanged_list_answers_304_without_loading_trips(self):
+        response = self.client.get('/api/trips/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/trips/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.trips[0].save()
+        self.assertEqual(self.client.get('/api/trips/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_conditional_get(self):
+        url = f'/api/trips/{self.trips[0].pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.json()['currentLocation'], 'Start 0')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        Trip.objects.filter(pk=self.trips[0].pk).update(updated_at=timezone.now() + timedelta(seconds=5))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/api/trips/999999/').status_code, 404)
+
+
+class DriverLedgerTests(TestCase):
+    def setUp(self):
+        plan_memo.clear()
+
+    def plan(self, **extra):
+        with mock.patch('trips.views.geocode_many', return_value=[COORDS[k] for k in ('dallas, tx', 'houston, tx', 'chicago, il')]), \
+                mock.patch('trips.views.get_route', return_value=ROUTE):
+            payload = {key: value for key, value in PLAN_PAYLOAD.items() if key != 'cycle_used'}
+            return APIClient().post('/api/plan-trip/', {**payload, **extra}, format='json')
+
+    def logged_hours(self, driver=None, trip_id=None):
+        statuses = DutyStatus.objects.filter(status__in=ledger.ON_DUTY_STATUSES)
+        statuses = statuses.filter(trip__driver=driver) if trip_id is None else statuses.filter(trip_id=trip_id)
+        return sum(end - start for end, start in statuses.values_list('end_time', 'start_time')) / 60
+
+    def test_saving_a_plan_adds_its_log_to_the_driver_totals(self):
+        self.plan(driver='D1', cycle_used=0)
+        self.assertAlmostEqual(
+            sum(DriverDay.objects.filter(driver='D1').values_list('on_duty_minutes', flat=True)) / 60,
+            self.logged_hours('D1'),
+        )
+        self.plan(driver='D1', cycle_used=5)
+        self.assertEqual(DriverDay.objects.filter(driver='D1').count(), len(set(
+            DutyStatus.objects.filter(trip__driver='D1', status__in=ledger.ON_DUTY_STATUSES).values_list('date', flat=True)
+        )))
+        self.assertFalse(DriverDay.objects.exclude(driver='D1').exists())
+
+    def test_planning_reads_cycle_used_from_the_ledger(self):
+        start = date(2025, 6, 10)
+        DriverDay.objects.create(driver='D2', date=start - timedelta(days=7), on_duty_minutes=20 * 60)
+        DriverDay.objects.create(driver='D2', date=start - timedelta(days=8), on_duty_minutes=30 * 60)
+        with self.assertNumQueries(1):
+            self.assertEqual(ledger.cycle_used('D2', start), 20)
+        response = self.plan(driver='D2', start_date=start.isoformat()).json()
+        self.assertEqual(response['trip']['cycleUsed'], 20)
+        self.assertEqual(response['trip']['startDate'], start.isoformat())
+        self.assertEqual(response['trip']['dutyStatuses'][0]['date'], start.isoformat())
+        self.assertEqual(response['trip']['driver'], 'D2')
+        # An explicit cycle_used still wins.
+        self.assertEqual(self.plan(driver='D2', cycle_used=3).json()['trip']['cycleUsed'], 3)
+        self.assertEqual(self.plan(driver='D2', start_date='10 June').status_code, 400)
+
+    def test_non_numeric_cycle_used_is_a_bad_request(self):
+        for value in (None, [1], {}, 'ten'):
+            for url in ('/api/plan-trip/', '/api/plan-trip/jobs/'):
+                response = APIClient().post(url, {**PLAN_PAYLOAD, 'cycle_used': value}, format='json')
+                self.assertEqual(response.status_code, 400, (url, value))
+
+    def test_batch_and_async_views_name_the_invalid_field(self):
+        lines = [json.loads(line) for line in b''.join(APIClient().post(
+            '/api/plan-trips/batch/', {'trips': [{**PLAN_PAYLOAD, 'start_date': 'bad'}, {**PLAN_PAYLOAD, 'cycle_used': 'ten'}]},
+            format='json',
+        ).streaming_content).splitlines()]
+        self.assertEqual(
+            sorted((line['index'], line['status'], line['error']) for line in lines),
+            [(0, 400, "start_date must be YYYY-MM-DD"), (1, 400, "cycle_used must be a number")],
+        )
+        response = self.client.post('/api/plan-trip/async/', {**PLAN_PAYLOAD, 'start_date': 'bad'},
+                                    content_type='application/json')
+        self.assertEqual((response.status_code, response.json()), (400, {"error": "start_date must be YYYY-MM-DD"}))
+
+    def test_earlier_hours_age_out_of_the_rolling_window(self):
+        start = date(2025, 6, 1)
+        first = self.plan(driver='D4', cycle_used=0, start_date=start.isoformat()).json()['trip']
+        first_days = {status['date'] for status in first['dutyStatuses']}
+        self.assertLess(max(first_days), (start + timedelta(days=3)).isoformat())
+
+        second = self.plan(driver='D4', start_date=(start + timedelta(days=3)).isoformat()).json()['trip']
+        self.assertAlmostEqual(second['cycleUsed'], self.logged_hours(trip_id=first['id']))
+
+        # Eight days ending on day 10 start on day 3: the first trip has aged out.
+        third = self.plan(driver='D4', start_date=(start + timedelta(days=10)).isoformat()).json()['trip']
+        self.assertAlmostEqual(third['cycleUsed'], self.logged_hours(trip_id=second['id']))
+        self.assertTrue(all(minutes <= 24 * 60 for minutes in DriverDay.objects.values_list('on_duty_minutes', flat=True)))
+
+    def test_backfill_rebuilds_totals_for_existing_trips(self):
+        trip_id = self.plan(cycle_used=0).json()['trip']['id']
+        self.assertFalse(DriverDay.objects.exists())
+        etag = self.client.get(f'/api/trips/{trip_id}/')['ETag']
+        out = io.StringIO()
+        call_command('backfill_ledger', '--driver', 'D3', '--trips', str(trip_id), stdout=out)
+        self.assertIn('Attributed 1 trips', out.getvalue())
+        detail = self.client.get(f'/api/trips/{trip_id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((detail.status_code, detail.json()['driver']), (200, 'D3'))
+        incremental = self.plan(driver='D3', cycle_used=0)
+        self.assertEqual(incremental.status_code, 201)
+        before = sorted(DriverDay.objects.values_list('date', 'on_duty_minutes'))
+        call_command('backfill_ledger', stdout=io.StringIO())
+        self.assertEqual(sorted(DriverDay.objects.values_list('date', 'on_duty_minutes')), before)
+        self.assertAlmostEqual(sum(minutes for _, minutes in before) / 60, self.logged_hours('D3'))
+
+
+    def test_backfill_wraps_legacy_rows_that_run_past_midnight(self):
+        trip = Trip.objects.create(current_location="A", pickup_location="B", dropoff_location="C", driver='D5')
+        DutyStatus.objects.create(trip=trip, date=date(2024, 1, 1), start_time=1410, end_time=30, status=DRIVING)
+        DutyStatus.objects.create(trip=trip, date=date(2024, 1, 1), start_time=600, end_time=660, status=DRIVING)
+        call_command('backfill_ledger', '--driver', 'D5', stdout=io.StringIO())
+        self.assertEqual(DriverDay.objects.get(driver='D5').on_duty_minutes, 120)
+
+class ColdStartTests(TestCase):
+    def test_sync_views_do_not_import_the_async_client(self):
+        code = "import django; django.setup(); import trips.views, sys; print('httpx' in sys.modules)"
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+
+class HOSSchedulerTests(TestCase):
+    def rests(self, scheduler):
+        return [(s.start, s.end - s.start, s.remarks) for s in scheduler.segments if s.status == OFF_DUTY]
+
+    def test_break_after_eight_hours_driving(self):
+        scheduler = HOSScheduler()
+        scheduler.drive(9 * 60, "Driving")
+        self.assertEqual(self.rests(scheduler), [(480, 30, "Mandatory 30-minute break")])
+
+    def test_ten_hour_rest_after_eleven_hours_driving(self):
+        scheduler = HOSScheduler()
+        scheduler.drive(12 * 60, "Driving")
+        self.assertEqual(self.rests(scheduler)[-1], (690, 600, "10-hour rest"))
+        self.assertEqual(scheduler.total_driving, 12 * 60)
+
+    def test_no_driving_after_fourteen_hour_window(self):
+        scheduler = HOSScheduler()
+        scheduler.on_duty(10 * 60, "Loading")
+        scheduler.drive(5 * 60, "Driving")
+        self.assertEqual(self.rests(scheduler), [(14 * 60, 600, "10-hour rest")])
+
+    def test_restart_when_cycle_is_exhausted(self):
+        scheduler = HOSScheduler(cycle_used=69 * 60)
+        scheduler.drive(2 * 60, "Driving")
+        self.assertEqual(self.rests(scheduler), [(60, 34 * 60, "34-hour restart")])
+        self.assertEqual(scheduler.cycle, 60)
+
+    def test_duty_log_splits_at_midnight(self):
+        scheduler = plan_trip_schedule("A", "B", "C", 60, 600, fuel_stops=[(330, "Mile 330.0")])
+        log = to_duty_log(scheduler.segments, date(2025, 3, 25))
+        self.assertEqual(log[0], {
+            "date": "2025-03-25", "start": "00:00", "end": "01:00", "status": "Driving",
+            "remarks": "Driving from A to B",
+        })
+        self.assertEqual(log[-1]["end"], "24:00")
+        self.assertIn("Fueling stop at Mile 330.0", [entry["remarks"] for entry in log])
+        self.assertEqual(scheduler.total_driving, 11 * 60)
+        self.assertEqual(
+            sum(s.end - s.start for s in scheduler.segments if s.status == DRIVING), scheduler.total_driving
+        )
+
+
+class DutyStatusStorageTests(TestCase):
+    def test_minutes_and_status_code_serialize_as_clock_and_label(self):
+        trip = Trip.objects.create(current_location="A", pickup_location="B", dropoff_location="C")
+        status = DutyStatus.objects.create(
+            trip=trip, date=date(2025, 3, 25), start_time=425, end_time=1440,
+            status=DutyStatus.Status.DRIVING, remarks="Driving",
+        )
+        self.assertEqual(DutyStatusSerializer(status).data, {
+            "date": "2025-03-25", "start_time": "07:05", "end_time": "24:00", "status": "Driving",
+            "remarks": "Driving",
+        })
+        self.assertEqual(trip.duty_statuses.filter(status=DRIVING, start_time__lt=8 * 60).count(), 1)
+
+
+class BatchPlanTripTests(TestCase):
+    def setUp(self):
+        geocode_cache.clear()
+
+    def post_batch(self, trips):
+        with mock.patch('trips.views.fetch_geocode', side_effect=fake_fetch_geocode) as fetch_geocode, \
+                mock.patch('trips.views.get_route', return_value=ROUTE) as get_route:
+            response = APIClient().post('/api/plan-trips/batch/', {'trips': trips}, format='json')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return response, lines, fetch_geocode, get_route
+
+    @override_settings(PLAN_PROCESS_WORKERS=0)
+    def test_streams_one_line_per_trip_and_dedupes_lookups(self):
+        trips = [PLAN_PAYLOAD, PLAN_PAYLOAD, {'current_location': 'Dallas, TX'}, PLAN_PAYLOAD]
+        response, lines, fetch_geocode, get_route = self.post_batch(trips)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(sorted(line['index'] for line in lines), [0, 1, 2, 3])
+        self.assertEqual({line['index']: line['status'] for line in lines}, {0: 201, 1: 201, 2: 400, 3: 201})
+        self.assertEqual(fetch_geocode.call_count, 3)
+        self.assertEqual(get_route.call_count, 1)
+        self.assertEqual(Trip.objects.count(), 3)
+
+    @override_settings(PLAN_PROCESS_WORKERS=2)
+    def test_plans_on_process_pool(self):
+        response, lines, _, _ = self.post_batch([PLAN_PAYLOAD] * 3)
+        self.assertEqual([line['status'] for line in lines], [201, 201, 201])
+        self.assertTrue(all(line['plan']['trip']['dutyStatuses'] for line in lines))
+
+    @override_settings(PLAN_PROCESS_WORKERS=0)
+    def test_a_failed_save_answers_for_its_trip_and_the_stream_continues(self):
+        save = views.save_and_build_response
+        calls = []
+
+        def flaky_save(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise DataError("value too long")
+            return save(*args, **kwargs)
+
+        with mock.patch('trips.views.save_and_build_response', side_effect=flaky_save):
+            _, lines, _, _ = self.post_batch([PLAN_PAYLOAD, dict(PLAN_PAYLOAD, cycle_used=5)])
+        self.assertEqual(sorted(line['status'] for line in lines), [201, 500])
+        self.assertIn('value too long', next(line['error'] for line in lines if line['status'] == 500))
+        self.assertEqual(Trip.objects.count(), 1)
+
+    def test_rejects_empty_batch(self):
+        response = APIClient().post('/api/plan-trips/batch/', {'trips': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PlanJobTests(TestCase):
+    def setUp(self):
+        for cache in (geocode_cache, route_cache, plan_memo):
+            cache.clear()
+
+    def test_job_returns_at_once_and_worker_stores_the_plan(self):
+        client = APIClient()
+        with FakeORSServer(latency=0.2) as server, override_settings(OPENROUTESERVICE_BASE_URL=server.url):
+            started = time.perf_counter()
+            response = client.post('/api/plan-trip/jobs/?geometry=polyline', PLAN_PAYLOAD, format='json')
+            self.assertLess(time.perf_counter() - started, 0.2)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(server.calls['geocode'], 0)
+
+            poll = client.get(response['Location'])
+            self.assertEqual((poll.json()['status'], poll['Retry-After']), ('queued', '1'))
+
+            self.assertEqual(jobs.work(burst=True), 1)
+        body = client.get(response['Location']).json()
+        self.assertEqual((body['status'], body['attempts']), ('succeeded', 1))
+        self.assertEqual(body['result']['trip']['id'], Trip.objects.get().pk)
+        self.assertIn('routePolyline', body['result'])
+
+    def test_failed_plan_is_reported_on_the_job(self):
+        client = APIClient()
+        with mock.patch('trips.views.geocode_many', side_effect=Exception("quota exceeded")):
+            url = client.post('/api/plan-trip/jobs/', PLAN_PAYLOAD, format='json')['Location']
+            jobs.work(burst=True)
+        body = client.get(url).json()
+        self.assertEqual((body['status'], body['error']), ('failed', "Geocoding failed: quota exceeded"))
+        self.assertEqual(client.post('/api/plan-trip/jobs/', {'currentLocation': 'Dallas, TX'},
+                                     format='json').status_code, 400)
+        self.assertEqual(client.get(f'/api/plan-trip/jobs/{PlanJob().pk}/').status_code, 404)
+
+    def test_claims_skip_running_jobs_and_retry_abandoned_ones(self):
+        first, second = PlanJob.objects.create(payload=PLAN_PAYLOAD), PlanJob.objects.create(payload=PLAN_PAYLOAD)
+        self.assertEqual(jobs.claim().pk, first.pk)
+        self.assertEqual(jobs.claim().pk, second.pk)
+        self.assertIsNone(jobs.claim())
+
+        long_ago = first.created_at - timedelta(hours=1)
+        PlanJob.objects.filter(pk=first.pk).update(started_at=long_ago)
+        retry = jobs.claim()
+        self.assertEqual((retry.pk, retry.attempts), (first.pk, 2))
+
+        # The first worker finishing late must not overwrite the retry's claim.
+        jobs.run(PlanJob(pk=first.pk, payload={}, started_at=long_ago))
+        self.assertEqual(PlanJob.objects.get(pk=first.pk).status, 'running')
+
+        with override_settings(PLAN_JOB_MAX_ATTEMPTS=2):
+            PlanJob.objects.filter(pk=first.pk).update(started_at=long_ago)
+            self.assertIsNone(jobs.claim())
+            jobs.fail_abandoned(timezone.now())
+        self.assertEqual(PlanJob.objects.get(pk=first.pk).status, 'failed')
+
+
+class AsyncPlanTripViewTests(TestCase):
+    LATENCY = 0.1
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeORSServer(latency=cls.LATENCY).start()
+        cls.settings_override = override_settings(OPENROUTESERVICE_BASE_URL=cls.server.url)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        geocode_cache.clear()
+        route_cache.clear()
+
+    def payloads(self, prefix, count):
+        return [
+            {'currentLocation': f'{prefix} yard {i}', 'pickupLocation': f'{prefix} shipper {i}',
+             'dropoffLocation': f'{prefix} receiver {i}', 'cycleUsed': 5}
+            for i in range(count)
+        ]
+
+    async def test_plan(self):
+        response = await AsyncClient().post(
+            '/api/plan-trip/async/', self.payloads('single', 1)[0], content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['trip']['currentLocation'], 'single yard 0')
+        self.assertTrue(body['trip']['dutyStatuses'])
+        self.assertEqual(await Trip.objects.acount(), 1)
+
+    async def plan_concurrently(self, count, prefix='async'):
+        client = AsyncClient()
+        responses = await asyncio.gather(*(
+            client.post('/api/plan-trip/async/', payload, content_type='application/json')
+            for payload in self.payloads(prefix, count)
+        ))
+        self.assertEqual([r.status_code for r in responses], [201] * count)
+
+    def plan_sequentially(self, count):
+        client = APIClient()
+        for payload in self.payloads('sync', count):
+            self.assertEqual(client.post('/api/plan-trip/', payload, format='json').status_code, 201)
+
+    def test_concurrent_plans_overlap_upstream_waits(self):
+        count = 8
+        # Load the async HTTP client (imported on first use) outside the timed runs.
+        async_to_sync(self.plan_concurrently)(1, prefix='warmup')
+        started = time.perf_counter()
+        async_to_sync(self.plan_concurrently)(count)
+        async_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        self.plan_sequentially(count)
+        sync_elapsed = time.perf_counter() - started
+
+        # Each plan waits for two upstream round trips (geocode, then route).
+        self.assertGreaterEqual(sync_elapsed, count * 2 * self.LATENCY)
+        self.assertLess(async_elapsed, sync_elapsed / 3)
+
+
+class PlanTripPhaseTests(TransactionTestCase):
+    def setUp(self):
+        geocode_cache.clear()
+        route_cache.clear()
+        plan_memo.clear()
+        self.connection_states = []
+
+    def record_connection(self, result):
+        # Geocodes run on pool threads, so look at the request thread's connection object explicitly.
+        request_connection = connections['default']
+
+        def fetch(*args):
+            self.connection_states.append(
+                (request_connection.connection is not None, request_connection.in_atomic_block)
+            )
+            return result(*args) if callable(result) else result
+        return fetch
+
+    def test_no_connection_or_transaction_held_during_upstream_io(self):
+        with mock.patch('trips.views.fetch_geocode', side_effect=self.record_connection(fake_fetch_geocode)), \
+                mock.patch('trips.views.fetch_route', side_effect=self.record_connection(ROUTE)):
+            response = APIClient().post('/api/plan-trip/', PLAN_PAYLOAD, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.connection_states), 4)
+        self.assertEqual(set(self.connection_states), {(False, False)})
+        self.assertEqual(Trip.objects.get().duty_statuses.count(), len(response.json()['trip']['dutyStatuses']))
+
+    def test_async_view_holds_no_connection_during_upstream_io(self):
+        record_geocode = self.record_connection(fake_fetch_geocode)
+        record_route = self.record_connection(ROUTE)
+
+        async def afetch_geocode(location):
+            return record_geocode(location)
+
+        async def afetch_route(coordinates):
+            return record_route(coordinates)
+
+        with mock.patch('trips.views.afetch_geocode', side_effect=afetch_geocode), \
+                mock.patch('trips.views.afetch_route', side_effect=afetch_route):
+            response = self.client.post('/api/plan-trip/async/', PLAN_PAYLOAD, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.connection_states), 4)
+        self.assertEqual(set(self.connection_states), {(False, False)})
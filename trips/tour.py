@@ -0,0 +1,82 @@
+"""Stop ordering for trips with several pickups and dropoffs.
+
+Stops are indexed against a distance matrix: 0 is the driver's current
+position, shipment i has its pickup at 1 + 2i and its dropoff at 2 + 2i. A
+tour is an open path from 0 through every other index in which each pickup
+comes before its dropoff. Like scheduling, this module has no Django
+dependencies.
+"""
+
+
+def pickup_of(stop):
+    """The pickup index for a dropoff index (dropoffs are even, pickups odd)."""
+    return stop - 1
+
+
+def is_dropoff(stop):
+    return stop > 0 and stop % 2 == 0
+
+
+def tour_length(matrix, tour):
+    return sum(matrix[a][b] for a, b in zip(tour, tour[1:]))
+
+
+def is_feasible(tour):
+    """Every dropoff comes after its pickup."""
+    seen = set()
+    for stop in tour:
+        if is_dropoff(stop) and pickup_of(stop) not in seen:
+            return False
+        seen.add(stop)
+    return True
+
+
+def nearest_neighbour(matrix, shipments):
+    """Greedy tour: always drive to the closest stop that may be visited next."""
+    tour = [0]
+    available = {1 + 2 * i for i in range(shipments)}
+    while available:
+        here = tour[-1]
+        stop = min(available, key=lambda candidate: (matrix[here][candidate], candidate))
+        available.remove(stop)
+        if not is_dropoff(stop):
+            available.add(stop + 1)
+        tour.append(stop)
+    return tour
+
+
+def two_opt(matrix, tour):
+    """Reverse segments while that shortens the tour and keeps it feasible.
+
+    The start (index 0) stays first and the path is open, so reversing a
+    suffix only changes the edge entering it. Road distance matrices are
+    usually asymmetric, so the legs inside a reversed segment are re-summed
+    in their new direction.
+    """
+    tour = list(tour)
+    symmetric = all(matrix[i][j] == matrix[j][i] for i in range(len(matrix)) for j in range(i))
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(tour) - 1):
+            for j in range(i + 1, len(tour)):
+                segment = tour[i:j + 1]
+                candidate = tour[:i] + segment[::-1] + tour[j + 1:]
+                a, b, c = tour[i - 1], tour[i], tour[j]
+                d = tour[j + 1] if j + 1 < len(tour) else None
+                delta = matrix[a][c] - matrix[a][b]
+                if d is not None:
+                    delta += matrix[b][d] - matrix[c][d]
+                if not symmetric:
+                    delta += tour_length(matrix, segment[::-1]) - tour_length(matrix, segment)
+                if delta < -1e-9 and is_feasible(candidate):
+                    tour = candidate
+                    improved = True
+    return tour
+
+
+def order_stops(matrix, shipments):
+    """Nearest-neighbour tour improved by 2-opt; returns stop indices starting with 0."""
+    if shipments == 0:
+        return [0]
+    return two_opt(matrix, nearest_neighbour(matrix, shipments))
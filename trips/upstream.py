@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+import ssl
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import connection
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import ratelimit
+
+_session = None
+_session_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_ssl_context = None
+
+# httpx is imported on first use rather than here: a process that only serves
+# sync views never needs the async client. requests is not deferred, since
+# rest_framework.compat imports it (and certifi) at startup anyway.
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retrying a retryable response: exponential backoff, or Retry-After if longer."""
+    delay = settings.ORS_BACKOFF_FACTOR * (2 ** attempt)
+    try:
+        return max(delay, float(response.headers.get('Retry-After', 0)))
+    except ValueError:
+        return delay
+
+
+def release_db_connection():
+    """Close this thread's idle database connection ahead of slow upstream I/O.
+
+    Planning would otherwise keep a server connection checked out for the
+    whole network round trip. Django reconnects lazily on the next query.
+    Inside an atomic block the connection is needed and is left alone.
+    """
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def build_session():
+    """Create a keep-alive session with a bounded connection pool.
+
+    urllib3 only retries connection failures; retryable statuses are retried
+    by request(), so that each attempt waits for a rate-limit token.
+    """
+    retry = Retry(
+        total=settings.ORS_RETRIES,
+        backoff_factor=settings.ORS_BACKOFF_FACTOR,
+        status_forcelist=(),
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=settings.ORS_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def request(method, url, limit=None, **kwargs):
+    """Send a request over the shared session with the configured timeouts, retrying retryable statuses.
+
+    limit names the ORS quota the call draws from (see ratelimit); every
+    attempt, retries included, waits for a token first.
+    """
+    kwargs.setdefault('timeout', (settings.ORS_CONNECT_TIMEOUT, settings.ORS_READ_TIMEOUT))
+    session = get_session()
+    for attempt in range(settings.ORS_RETRIES + 1):
+        if limit is not None:
+            ratelimit.acquire(limit)
+        response = session.request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == settings.ORS_RETRIES:
+            return response
+        time.sleep(retry_delay(response, attempt))
+
+
+def get_async_client():
+    """Return the keep-alive httpx client for the running event loop.
+
+    httpx connections are bound to the loop that opened them, so each loop
+    (one under ASGI, one per request when async views run under WSGI) gets
+    its own client.
+    """
+    global _ssl_context
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import certifi
+        import httpx
+
+        if _ssl_context is None:
+            # Loading the CA bundle dominates client construction; share it across loops.
+            _ssl_context = ssl.create_default_context(cafile=certifi.where())
+        client = httpx.AsyncClient(
+            verify=_ssl_context,
+            timeout=httpx.Timeout(settings.ORS_READ_TIMEOUT, connect=settings.ORS_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=settings.ORS_ASYNC_POOL_SIZE, max_keepalive_connections=settings.ORS_POOL_SIZE),
+            transport=httpx.AsyncHTTPTransport(retries=settings.ORS_RETRIES),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def arequest(method, url, limit=None, **kwargs):
+    """Async counterpart of request(), retrying retryable statuses with exponential backoff.
+
+    Every attempt, retries included, waits for a token from the `limit` quota.
+    """
+    client = get_async_client()
+    for attempt in range(settings.ORS_RETRIES + 1):
+        if limit is not None:
+            await ratelimit.aacquire(limit)
+        response = await client.request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == settings.ORS_RETRIES:
+            return response
+        await asyncio.sleep(retry_delay(response, attempt))
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.ORS_POOL_SIZE, thread_name_prefix='ors')
+    return _executor
+
+
+def map_concurrent(fn, items, return_exceptions=False):
+    """Run fn over items on the upstream thread pool and return results in order.
+
+    With return_exceptions, a failing call yields its exception in place of a
+    result instead of raising. fn must not touch the database: pool threads are
+    not request threads, so Django would never close connections they open.
+    Each call runs in a copy of the caller's context, so context variables
+    such as the request's stage timings are visible to it.
+    """
+    if return_exceptions:
+        fn = _returning_exceptions(fn)
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    context = contextvars.copy_context()
+    return list(get_executor().map(lambda item: context.copy().run(fn, item), items))
+
+
+def _returning_exceptions(fn):
+    def call(item):
+        try:
+            return fn(item)
+        except Exception as e:
+            return e
+    return call
@@ -1,6 +1,19 @@
 from django.urls import path
-from .views import PlanTripView
+from django.views.decorators.csrf import csrf_exempt
+from .views import (
+    AsyncPlanTripView, BatchPlanTripView, MetricsView, PlanJobDetailView, PlanJobView, PlanTripView, TripDetailView,
+    TripListView, TripLogSheetView, TripRouteView,
+)
 
 urlpatterns = [
     path('plan-trip/', PlanTripView.as_view(), name='plan-trip'),
+    path('plan-trip/async/', csrf_exempt(AsyncPlanTripView.as_view()), name='plan-trip-async'),
+    path('plan-trip/jobs/', PlanJobView.as_view(), name='plan-jobs'),
+    path('plan-trip/jobs/<uuid:job_id>/', PlanJobDetailView.as_view(), name='plan-job'),
+    path('plan-trips/batch/', BatchPlanTripView.as_view(), name='plan-trips-batch'),
+    path('trips/', TripListView.as_view(), name='trips'),
+    path('trips/<int:trip_id>/', TripDetailView.as_view(), name='trip'),
+    path('trips/<int:trip_id>/route/', TripRouteView.as_view(), name='trip-route'),
+    path('trips/<int:trip_id>/logs/', TripLogSheetView.as_view(), name='trip-logs'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
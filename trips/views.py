@@ -1,316 +1,1018 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-import requests
 from django.conf import settings
-from .models import Trip, DutyStatus
+from .models import Trip, DutyStatus, PlanJob
 from .serializers import TripSerializer
-from django.db import transaction
-from datetime import datetime, timedelta
-from math import radians, sin, cos, sqrt, atan2
+from .cache import geocode_cache, matrix_cache, normalize_location, plan_memo, route_cache
+from .geometry import MAX_ZOOM, RouteIndex, calculate_distance, encode_polyline, pack_route, simplify, zoom_tolerance
+from .planning import compute_plan, compute_tour_plan, get_process_pool
+from .tour import is_dropoff, order_stops
+from .renderers import FastJSONRenderer, dumps
+from datetime import date
+from . import ledger, logsheet, metrics, ratelimit, routing, upstream
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views import View
+from asgiref.sync import sync_to_async
+from djangorestframework_camel_case.util import underscoreize
+from concurrent.futures import as_completed
+import base64
+import hashlib
+from functools import lru_cache
+import asyncio
+import json
+
+import orjson
+
+class UpstreamError(Exception):
+    """A geocode, matrix or route lookup failed; plan views answer it with 400."""
 
 def convert_keys(data):
-    """Convert snake_case keys to camelCase recursively."""
+    """Convert snake_case keys to camelCase recursively.
+
+    Lists are only walked when they hold dicts: coordinate arrays and other
+    lists of numbers are returned as-is, which keeps long routes cheap.
+    """
     if isinstance(data, dict):
         return {to_camel_case(key): convert_keys(value) for key, value in data.items()}
-    elif isinstance(data, list):
+    elif isinstance(data, list) and data and isinstance(data[0], dict):
         return [convert_keys(item) for item in data]
     return data
 
+@lru_cache(maxsize=1024)
 def to_camel_case(snake_str):
     components = snake_str.split('_')
     return components[0] + ''.join(x.capitalize() for x in components[1:])
 
 def geocode(location):
-    response = requests.get(
-        f"https://api.openrouteservice.org/geocode/search?api_key={settings.OPENROUTESERVICE_API_KEY}&text={location}"
-    )
+    """Resolve a location to [lat, lon], consulting the geocode cache before ORS."""
+    coords = geocode_cache.get(location)
+    if coords is None:
+        coords = fetch_geocode(location)
+        geocode_cache.set(location, coords)
+    return coords
+
+def geocode_many(locations, return_exceptions=False):
+    """Geocode several locations, fetching cache misses from ORS concurrently.
+
+    With return_exceptions, a location that fails to geocode maps to its
+    exception instead of aborting the whole lookup.
+    """
+    results = {location: geocode_cache.get(location) for location in locations}
+    misses = [location for location, coords in results.items() if coords is None]
+    if misses:
+        upstream.release_db_connection()
+    fetched = upstream.map_concurrent(fetch_geocode, misses, return_exceptions=return_exceptions)
+    for location, coords in zip(misses, fetched):
+        if not isinstance(coords, Exception):
+            geocode_cache.set(location, coords)
+        results[location] = coords
+    return [results[location] for location in locations]
+
+async def ageocode_many(locations):
+    """Async geocode_many(): cache misses are awaited concurrently without blocking the event loop."""
+    results = await sync_to_async(lambda: {location: geocode_cache.get(location) for location in locations})()
+    misses = [location for location, coords in results.items() if coords is None]
+    if misses:
+        await sync_to_async(upstream.release_db_connection)()
+    fetched = await asyncio.gather(*(afetch_geocode(location) for location in misses))
+    if misses:
+        await sync_to_async(lambda: [geocode_cache.set(location, coords) for location, coords in zip(misses, fetched)])()
+    results.update(zip(misses, fetched))
+    return [results[location] for location in locations]
+
+def geocode_request(location):
+    return {
+        "method": "GET",
+        "url": f"{settings.OPENROUTESERVICE_BASE_URL}/geocode/search",
+        "params": {"api_key": settings.OPENROUTESERVICE_API_KEY, "text": location},
+    }
+
+def fetch_geocode(location):
+    with metrics.stage('ors_geocode'):
+        response = upstream.request(**geocode_request(location), limit='geocode')
+    return parse_geocode(location, response)
+
+async def afetch_geocode(location):
+    with metrics.stage('ors_geocode'):
+        response = await upstream.arequest(**geocode_request(location), limit='geocode')
+    return parse_geocode(location, response)
+
+def parse_geocode(location, response):
     if response.status_code != 200 or not response.json().get('features'):
         raise Exception(f"Geocoding failed for {location}: {response.text}")
     coords = response.json()['features'][0]['geometry']['coordinates']
     return [coords[1], coords[0]]  # [lat, lon]
 
-def calculate_distance(coords1, coords2):
-    R = 3958.8  # Earth's radius in miles
-    lat1, lon1 = radians(coords1[0]), radians(coords1[1])
-    lat2, lon2 = radians(coords2[0]), radians(coords2[1])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    return R * c
-
 def get_route(start, waypoints, end):
+    """Return the driving route as [[lat, lon], ...], served from the route cache when possible."""
     coordinates = [start] + waypoints + [end]
-    response = requests.post(
-        "https://api.openrouteservice.org/v2/directions/driving-car/geojson",
-        json={"coordinates": [[coord[1], coord[0]] for coord in coordinates]},
-        headers={
+    route_coords = route_cache.get(coordinates)
+    if route_coords is None:
+        upstream.release_db_connection()
+        route_coords = routing.get_backend().route(coordinates)
+        route_cache.set(coordinates, route_coords)
+    return route_coords
+
+async def aget_route(start, waypoints, end):
+    """Async get_route(); the route cache is in-process, so only the backend call is awaited."""
+    coordinates = [start] + waypoints + [end]
+    route_coords = route_cache.get(coordinates)
+    if route_coords is None:
+        await sync_to_async(upstream.release_db_connection)()
+        route_coords = await routing.get_backend().aroute(coordinates)
+        route_cache.set(coordinates, route_coords)
+    return route_coords
+
+def route_request(coordinates):
+    return {
+        "method": "POST",
+        "url": f"{settings.OPENROUTESERVICE_BASE_URL}/v2/directions/driving-car/geojson",
+        "json": {"coordinates": [[coord[1], coord[0]] for coord in coordinates]},
+        "headers": {
             "Authorization": f"Bearer {settings.OPENROUTESERVICE_API_KEY}",
             "Content-Type": "application/json",
         },
-    )
+    }
+
+def fetch_route(coordinates):
+    with metrics.stage('ors_route'):
+        response = upstream.request(**route_request(coordinates), limit='directions')
+    return parse_route(response)
+
+async def afetch_route(coordinates):
+    with metrics.stage('ors_route'):
+        response = await upstream.arequest(**route_request(coordinates), limit='directions')
+    return parse_route(response)
+
+def parse_route(response):
     if response.status_code != 200:
         raise Exception(f"Route API failed: {response.text}")
     route_data = response.json()
     route_coords = route_data['features'][0]['geometry']['coordinates']
     return [[coord[1], coord[0]] for coord in route_coords]
 
+def get_distance_matrix(coordinates):
+    """Return driving miles between every pair of [lat, lon] points, fetching only uncached rows.
+
+    Rows are requested in batches of at most MATRIX_MAX_ELEMENTS pairs,
+    concurrently.
+    """
+    matrix = matrix_cache.get(coordinates)
+    missing = [i for i, row in enumerate(matrix) if None in row]
+    if missing:
+        upstream.release_db_connection()
+        size = max(1, settings.MATRIX_MAX_ELEMENTS // len(coordinates))
+        batches = [missing[i:i + size] for i in range(0, len(missing), size)]
+        backend = routing.get_backend()
+        fetched = upstream.map_concurrent(lambda sources: backend.matrix(coordinates, sources), batches)
+        for sources, rows in zip(batches, fetched):
+            for i, row in zip(sources, rows):
+                matrix[i] = row
+        matrix_cache.set(coordinates, matrix)
+    return matrix
+
+def matrix_request(coordinates, sources):
+    return {
+        "method": "POST",
+        "url": f"{settings.OPENROUTESERVICE_BASE_URL}/v2/matrix/driving-car",
+        "json": {
+            "locations": [[coord[1], coord[0]] for coord in coordinates],
+            "sources": list(sources),
+            "metrics": ["distance"],
+            "units": "mi",
+        },
+        "headers": {
+            "Authorization": f"Bearer {settings.OPENROUTESERVICE_API_KEY}",
+            "Content-Type": "application/json",
+        },
+    }
+
+def fetch_matrix(coordinates, sources):
+    with metrics.stage('ors_matrix'):
+        response = upstream.request(**matrix_request(coordinates, sources), limit='matrix')
+    return parse_matrix(response)
+
+def parse_matrix(response):
+    if response.status_code != 200:
+        raise Exception(f"Matrix API failed: {response.text}")
+    distances = response.json()['distances']
+    if any(miles is None for row in distances for miles in row):
+        raise Exception("Matrix API found no route between some stops")
+    return distances
+
 def calculate_distance_along_route(route_coords, target_distance):
     """Interpolate a point along the route at the target distance (in miles)."""
-    total_distance = 0.0
-    for i in range(len(route_coords) - 1):
-        point1 = route_coords[i]
-        point2 = route_coords[i + 1]
-        R = 3958.8
-        lat1, lon1 = radians(point1[0]), radians(point1[1])
-        lat2, lon2 = radians(point2[0]), radians(point2[1])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        segment_distance = R * c
-        total_distance += segment_distance
-
-        if total_distance >= target_distance:
-            overshoot = total_distance - target_distance
-            fraction = overshoot / segment_distance
-            lat = point2[0] - fraction * (point2[0] - point1[0])
-            lon = point2[1] - fraction * (point2[1] - point1[1])
-            return [lat, lon]
-    return route_coords[-1]
-
-def add_time(current_time, hours_to_add):
-    """Add hours to a time string (HH:MM) and handle day overflow."""
-    if not current_time:
-        return "00:00", 0
-    current_hours, current_minutes = map(int, current_time.split(":"))
-    total_minutes = current_hours * 60 + current_minutes + int(hours_to_add * 60)
-    days_added = total_minutes // (24 * 60)
-    remaining_minutes = total_minutes % (24 * 60)
-    new_hours = remaining_minutes // 60
-    new_minutes = remaining_minutes % 60
-    return f"{new_hours:02d}:{new_minutes:02d}", days_added
+    return RouteIndex(route_coords).interpolate([target_distance])[0].tolist()
+
+def load_trip(**lookup):
+    """Fetch a Trip with duty_statuses prefetched in log order; its route geometry is loaded on demand."""
+    return Trip.objects.defer('route_geometry').prefetch_related(
+        Prefetch('duty_statuses', queryset=DutyStatus.objects.order_by('id'))
+    ).get(**lookup)
+
+def save_plan(current_location, pickup_location, dropoff_location, cycle_used, driver, start_date, plan,
+              idempotency_key=None, waypoints=(), endpoint_coords=None, route_geometry=None):
+    """Persist a computed plan, adding it to the driver's ledger, and return its Trip with duty_statuses prefetched."""
+    trip = Trip.objects.create(
+        current_location=current_location,
+        pickup_location=pickup_location,
+        dropoff_location=dropoff_location,
+        cycle_used=cycle_used,
+        driver=driver,
+        start_date=start_date,
+        idempotency_key=idempotency_key,
+        waypoints=list(waypoints),
+        endpoint_coords=endpoint_coords,
+        route_geometry=route_geometry,
+    )
+    DutyStatus.objects.bulk_create([
+        DutyStatus(trip=trip, date=day, start_time=start, end_time=end, status=duty_status, remarks=remarks)
+        for day, start, end, duty_status, remarks in plan['duty_log']
+    ])
+    if driver:
+        ledger.record(driver, plan['duty_log'])
+    return load_trip(pk=trip.pk)
+
+def save_and_build_response(trip_input, plan, route_coordinates, coords, geometry=None, idempotency_key=None, waypoints=()):
+    """Save a plan in its own transaction and build the camelCase response body.
+
+    If another request has already saved a trip under idempotency_key, that
+    trip is returned instead of a new one.
+    """
+    # Packed before the transaction opens, so long routes do not hold it.
+    with metrics.stage('serialize'):
+        endpoint_coords = dict(zip(("start", "pickup", "dropoff"), coords))
+        packed = pack_route(route_coordinates, plan["stop_coords"])
+    try:
+        with metrics.stage('db'), transaction.atomic():
+            trip = save_plan(
+                *trip_input, plan, idempotency_key=idempotency_key, waypoints=waypoints,
+                endpoint_coords=endpoint_coords, route_geometry=packed,
+            )
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        trip = load_trip(idempotency_key=idempotency_key)
+    with metrics.stage('serialize'):
+        return convert_keys(build_response(trip, plan, route_coordinates, *coords, geometry=geometry))
+
+def parse_geometry_options(params):
+    """Read the route geometry query options.
+
+    simplify=<meters> or zoom=<level> applies Douglas-Peucker simplification
+    (zoom uses one tile pixel as the tolerance); geometry=polyline returns the
+    route as an encoded polyline in route_polyline instead of route_coordinates.
+    Raises ValueError on invalid values.
+    """
+    tolerance = None
+    if params.get('simplify'):
+        tolerance = float(params['simplify'])
+    elif params.get('zoom'):
+        zoom = float(params['zoom'])
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}")
+        tolerance = zoom_tolerance(zoom)
+    if tolerance is not None and not tolerance >= 0:
+        raise ValueError("simplify must be a non-negative number of meters")
+    encoding = params.get('geometry', 'coordinates')
+    if encoding not in ('coordinates', 'polyline'):
+        raise ValueError("geometry must be 'coordinates' or 'polyline'")
+    return {"tolerance": tolerance, "encoded": encoding == 'polyline'}
+
+def route_geometry(route_coordinates, tolerance=None, encoded=False):
+    """Response fields for the route geometry, simplified and/or encoded as requested."""
+    if tolerance:
+        route_coordinates = simplify(route_coordinates, tolerance).tolist()
+    if encoded:
+        return {"route_polyline": encode_polyline(route_coordinates)}
+    return {"route_coordinates": route_coordinates}
+
+def build_response(trip, plan, route_coordinates, start_coords, pickup_coords, dropoff_coords, geometry=None):
+    return {
+        "trip": TripSerializer(trip).data,
+        "stops": plan["stops"],
+        "total_distance": plan["total_distance"],
+        "total_driving_time": plan["total_driving_time"],
+        "total_on_duty_time": plan["total_on_duty_time"],
+        "remaining_cycle": plan["remaining_cycle"],
+        **route_geometry(route_coordinates, **(geometry or {})),
+        "start_coords": start_coords,
+        "pickup_coords": pickup_coords,
+        "stop_coords": plan["stop_coords"],
+        "end_coords": dropoff_coords,
+    }
+
+def parse_driver_log(data):
+    """Return (cycle_used, driver, start_date) from a plan request body.
+
+    cycle_used is None when a driver is given without it, and start_date
+    (YYYY-MM-DD) None when left out; resolve_driver_log() fills them in.
+    Raises ValueError on invalid values.
+    """
+    driver = str(data.get('driver') or '')
+    if len(driver) > 255:
+        raise ValueError("driver must be at most 255 characters")
+    start_date = data.get('start_date')
+    if start_date is not None:
+        if not isinstance(start_date, str):
+            raise ValueError("start_date must be YYYY-MM-DD")
+        try:
+            start_date = date.fromisoformat(start_date)
+        except ValueError:
+            raise ValueError("start_date must be YYYY-MM-DD")
+    if driver and data.get('cycle_used') is None:
+        return None, driver, start_date
+    try:
+        return float(data.get('cycle_used', 0)), driver, start_date
+    except (TypeError, ValueError):
+        raise ValueError("cycle_used must be a number")
+
+def resolve_driver_log(trip_input, trip=None):
+    """trip_input (trip or tour) with start_date defaulted to today and a missing
+    cycle_used read from the driver's hours in the 8 days ending on it.
+
+    A saved trip being replayed keeps the hours and start date it was
+    planned with, since the ledger now includes the trip itself.
+    """
+    *head, cycle_used, driver, start_date = trip_input
+    if trip is not None:
+        return (*head, trip.cycle_used, driver, trip.start_date or timezone.localdate())
+    start_date = start_date or timezone.localdate()
+    if cycle_used is None:
+        with metrics.stage('db'):
+            cycle_used = ledger.cycle_used(driver, start_date)
+    return (*head, cycle_used, driver, start_date)
+
+def parse_trip_input(data):
+    """Return (current_location, pickup_location, dropoff_location, cycle_used, driver, start_date), or None if a location is missing."""
+    current_location = data.get('current_location')
+    pickup_location = data.get('pickup_location')
+    dropoff_location = data.get('dropoff_location')
+    cycle_used, driver, start_date = parse_driver_log(data)
+
+    if not all([current_location, pickup_location, dropoff_location]):
+        return None
+    return current_location, pickup_location, dropoff_location, cycle_used, driver, start_date
+
+def parse_plan_request(data):
+    """Return (trip_input, plan, matches) for a plan request body, single trip or tour.
+
+    trip_input is None if a location is missing; raises ValueError on
+    malformed input.
+    """
+    if data.get('shipments') is None:
+        return parse_trip_input(data), plan_trip, matches_trip_input
+    return parse_tour_input(data), plan_tour, matches_tour_input
+
+def parse_tour_input(data):
+    """Return (current_location, ((pickup_location, dropoff_location), ...), cycle_used, driver, start_date) for a tour request.
+
+    Returns None if a location is missing; raises ValueError if shipments is
+    not a list of pickup/dropoff pairs or is longer than TOUR_MAX_SHIPMENTS.
+    """
+    current_location = data.get('current_location')
+    shipments = data.get('shipments')
+    cycle_used, driver, start_date = parse_driver_log(data)
+
+    if not isinstance(shipments, list) or not shipments or not all(isinstance(item, dict) for item in shipments):
+        raise ValueError("shipments must be a non-empty list of pickup and dropoff locations")
+    if len(shipments) > settings.TOUR_MAX_SHIPMENTS:
+        raise ValueError(f"At most {settings.TOUR_MAX_SHIPMENTS} shipments per trip")
+    shipments = tuple((item.get('pickup_location'), item.get('dropoff_location')) for item in shipments)
+    if not current_location or not all(location for shipment in shipments for location in shipment):
+        return None
+    return current_location, shipments, cycle_used, driver, start_date
+
+def tour_shipments(waypoints):
+    """The ((pickup_location, dropoff_location), ...) a tour's saved waypoints were planned from."""
+    shipments = {}
+    for waypoint in waypoints:
+        shipments.setdefault(waypoint['shipment'], {})[waypoint['type']] = waypoint['location']
+    return tuple((shipments[i]['pickup'], shipments[i]['dropoff']) for i in sorted(shipments))
+
+def matches_tour_input(trip, tour_input):
+    """Whether a saved trip was planned from the same (normalized) tour inputs."""
+    current_location, shipments, cycle_used, driver, start_date = tour_input
+    return (
+        bool(trip.waypoints)
+        and normalize_location(trip.current_location) == normalize_location(current_location)
+        and [tuple(map(normalize_location, shipment)) for shipment in tour_shipments(trip.waypoints)]
+        == [tuple(map(normalize_location, shipment)) for shipment in shipments]
+        and trip.driver == driver
+        and (cycle_used is None or round(trip.cycle_used, 2) == round(cycle_used, 2))
+        and (start_date is None or trip.start_date == start_date)
+    )
+
+def matches_trip_input(trip, trip_input):
+    """Whether a saved trip was planned from the same (normalized) inputs."""
+    current_location, pickup_location, dropoff_location, cycle_used, driver, start_date = trip_input
+    return (
+        not trip.waypoints
+        and normalize_location(trip.current_location) == normalize_location(current_location)
+        and normalize_location(trip.pickup_location) == normalize_location(pickup_location)
+        and normalize_location(trip.dropoff_location) == normalize_location(dropoff_location)
+        and trip.driver == driver
+        and (cycle_used is None or round(trip.cycle_used, 2) == round(cycle_used, 2))
+        and (start_date is None or trip.start_date == start_date)
+    )
+
+def plan_trip(trip_input, geometry=None, idempotency_key=None, trip=None):
+    """Resolve, compute and persist one plan; return (trip_id, rendered response body).
+
+    Given an already saved trip that has no stored geometry (an
+    Idempotency-Key replay of a trip saved before geometry was kept, see
+    replay_plan), the plan is recomputed from upstream data and returned for
+    that trip without saving anything. Raises UpstreamError when a lookup fails.
+    """
+    trip_input = resolve_driver_log(trip_input, trip)
+    current_location, pickup_location, dropoff_location, cycle_used, driver, start_date = trip_input
+
+    # Resolve
+    try:
+        with metrics.stage('geocode'):
+            coords = geocode_many([current_location, pickup_location, dropoff_location])
+    except Exception as e:
+        raise UpstreamError(f"Geocoding failed: {str(e)}")
+
+    try:
+        with metrics.stage('route'):
+            route_coordinates = get_route(coords[0], [coords[1]], coords[2])
+    except Exception as e:
+        raise UpstreamError(f"Route calculation failed: {str(e)}")
+
+    # Compute
+    with metrics.stage('plan'):
+        plan = compute_plan(*trip_input[:4], *coords, route_coordinates, start_date)
+
+    # Persist
+    if trip is None:
+        response_data = save_and_build_response(trip_input, plan, route_coordinates, coords, geometry, idempotency_key)
+    else:
+        with metrics.stage('serialize'):
+            response_data = convert_keys(build_response(trip, plan, route_coordinates, *coords, geometry=geometry))
+    with metrics.stage('render'):
+        return response_data["trip"]["id"], dumps(response_data)
+
+def replay_plan(trip, geometry=None):
+    """Rebuild the response for a saved trip from its stored geometry, with no upstream calls.
+
+    The schedule summary is recomputed locally from the stored route; the
+    duty log is the saved one. Returns None for trips saved without geometry.
+    """
+    route = trip.route()
+    if route is None or not trip.endpoint_coords:
+        return None
+    route_coordinates, _ = route
+    coords = [trip.endpoint_coords[key] for key in ("start", "pickup", "dropoff")]
+    start_date = trip.start_date or timezone.localdate()
+    with metrics.stage('plan'):
+        if trip.waypoints:
+            plan = compute_tour_plan(
+                trip.current_location, trip.cycle_used, coords[0],
+                [(waypoint["type"], waypoint["location"], waypoint["coords"]) for waypoint in trip.waypoints],
+                route_coordinates, start_date,
+            )
+        else:
+            plan = compute_plan(
+                trip.current_location, trip.pickup_location, trip.dropoff_location, trip.cycle_used,
+                *coords, route_coordinates, start_date,
+            )
+    with metrics.stage('serialize'):
+        response_data = convert_keys(build_response(trip, plan, route_coordinates, *coords, geometry=geometry))
+    with metrics.stage('render'):
+        return trip.pk, dumps(response_data)
+
+def plan_tour(tour_input, geometry=None, idempotency_key=None, trip=None):
+    """plan_trip() for a tour: several shipments, each picked up before it is dropped off.
+
+    Stops are ordered on the driving distance matrix (nearest neighbour,
+    then 2-opt) and the route is fetched through them in that order.
+    """
+    current_location, shipments, cycle_used, driver, start_date = resolve_driver_log(tour_input, trip)
+    locations = [current_location] + [location for shipment in shipments for location in shipment]
+
+    # Resolve
+    try:
+        with metrics.stage('geocode'):
+            coords = geocode_many(locations)
+    except Exception as e:
+        raise UpstreamError(f"Geocoding failed: {str(e)}")
+
+    try:
+        with metrics.stage('matrix'):
+            matrix = get_distance_matrix(coords)
+    except Exception as e:
+        raise UpstreamError(f"Distance matrix failed: {str(e)}")
+
+    with metrics.stage('order'):
+        order = order_stops(matrix, len(shipments))
+
+    try:
+        with metrics.stage('route'):
+            route_coordinates = get_route(coords[0], [coords[i] for i in order[1:-1]], coords[order[-1]])
+    except Exception as e:
+        raise UpstreamError(f"Route calculation failed: {str(e)}")
+
+    # Compute
+    waypoints = [
+        {
+            "type": "dropoff" if is_dropoff(i) else "pickup",
+            "location": locations[i],
+            "shipment": (i - 1) // 2,
+            "coords": coords[i],
+        }
+        for i in order[1:]
+    ]
+    with metrics.stage('plan'):
+        plan = compute_tour_plan(
+            current_location, cycle_used, coords[0],
+            [(waypoint["type"], waypoint["location"], waypoint["coords"]) for waypoint in waypoints],
+            route_coordinates, start_date,
+        )
+
+    # Persist: the first pickup and last dropoff stand in for the trip's pickup and dropoff.
+    trip_input = (current_location, waypoints[0]["location"], waypoints[-1]["location"], cycle_used, driver, start_date)
+    trip_coords = [coords[0], waypoints[0]["coords"], waypoints[-1]["coords"]]
+    if trip is None:
+        response_data = save_and_build_response(
+            trip_input, plan, route_coordinates, trip_coords, geometry, idempotency_key, waypoints,
+        )
+    else:
+        with metrics.stage('serialize'):
+            response_data = convert_keys(build_response(trip, plan, route_coordinates, *trip_coords, geometry=geometry))
+    with metrics.stage('render'):
+        return response_data["trip"]["id"], dumps(response_data)
+
+def plan_batch(trips, geometry=None):
+    """Plan many trips, yielding (index, status_code, body) as each one finishes.
+
+    Geocode and route lookups are deduplicated across the batch and fetched
+    concurrently; schedules are computed on the planning process pool and
+    each plan is saved in its own transaction as soon as it completes.
+    """
+    pending = []
+    for index, data in enumerate(trips):
+        try:
+            trip_input = parse_trip_input(data) if isinstance(data, dict) else None
+        except ValueError as e:
+            yield index, status.HTTP_400_BAD_REQUEST, {"error": str(e)}
+            continue
+        if trip_input is None:
+            yield index, status.HTTP_400_BAD_REQUEST, {"error": "Missing required fields"}
+            continue
+        pending.append((index, resolve_driver_log(trip_input)))
+
+    # Upstream calls run at batch priority, behind interactive plans (see ratelimit);
+    # the priority is set around each call, never across a yield.
+    locations = list(dict.fromkeys(location for _, trip_input in pending for location in trip_input[:3]))
+    with ratelimit.priority(ratelimit.BATCH):
+        coords = dict(zip(locations, geocode_many(locations, return_exceptions=True)))
+
+    routable = []
+    for index, trip_input in pending:
+        failed = [coords[location] for location in trip_input[:3] if isinstance(coords[location], Exception)]
+        if failed:
+            yield index, status.HTTP_400_BAD_REQUEST, {"error": f"Geocoding failed: {failed[0]}"}
+            continue
+        routable.append((index, trip_input, [coords[location] for location in trip_input[:3]]))
+
+    lanes = list(dict.fromkeys(tuple(map(tuple, trip_coords)) for _, _, trip_coords in routable))
+    with ratelimit.priority(ratelimit.BATCH):
+        routes = dict(zip(lanes, upstream.map_concurrent(
+            lambda lane: get_route(list(lane[0]), [list(lane[1])], list(lane[2])), lanes, return_exceptions=True,
+        )))
+
+    jobs = []
+    for index, trip_input, trip_coords in routable:
+        route_coordinates = routes[tuple(map(tuple, trip_coords))]
+        if isinstance(route_coordinates, Exception):
+            yield index, status.HTTP_400_BAD_REQUEST, {"error": f"Route calculation failed: {route_coordinates}"}
+            continue
+        jobs.append((index, trip_input, trip_coords, route_coordinates))
+
+    for (index, trip_input, trip_coords, route_coordinates), plan in run_plans(
+        jobs, lambda job: (*job[1][:4], *job[2], job[3], job[1][5])
+    ):
+        if isinstance(plan, Exception):
+            yield index, status.HTTP_500_INTERNAL_SERVER_ERROR, {"error": f"Planning failed: {plan}"}
+            continue
+        # A failed save answers for its own trip; it must not end the stream for the rest.
+        try:
+            body = {"plan": save_and_build_response(trip_input, plan, route_coordinates, trip_coords, geometry)}
+        except Exception as e:
+            yield index, status.HTTP_500_INTERNAL_SERVER_ERROR, {"error": f"Saving failed: {e}"}
+            continue
+        yield index, status.HTTP_201_CREATED, body
+
+def run_plans(jobs, plan_args):
+    """Yield (job, plan or exception) in completion order, on the process pool when one is configured."""
+    pool = get_process_pool()
+    if pool is None:
+        for job in jobs:
+            try:
+                yield job, compute_plan(*plan_args(job))
+            except Exception as e:
+                yield job, e
+        return
+    futures = {pool.submit(compute_plan, *plan_args(job)): job for job in jobs}
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result()
+        except Exception as e:
+            yield futures[future], e
 
 class PlanTripView(APIView):
-    @transaction.atomic
+    """Plan a single trip.
+
+    Planning runs in three phases so that no transaction is open while we
+    wait on OpenRouteService: resolve upstream data (the DB connection is
+    released during network I/O), compute the schedule, then persist it in
+    one short transaction (see plan_trip).
+
+    Instead of pickup_location and dropoff_location, a request may list
+    several shipments, each with its own pickup and dropoff; the stops are
+    then ordered to keep the tour short (see plan_tour).
+
+    The log starts on start_date (default: today). A request naming a
+    driver but no cycle_used is planned with the hours that driver logged
+    in the 8 days ending on it (see trips.ledger).
+
+    Identical requests are memoized for PLAN_MEMO_TTL seconds and concurrent
+    ones coalesced, so a retry or double-click replays the first response
+    (200, Idempotent-Replayed: true) instead of saving a duplicate trip. With
+    an Idempotency-Key header, any later request with that key returns the
+    trip it originally created.
+    """
+    renderer_classes = [FastJSONRenderer]
+
     def post(self, request):
-        current_location = request.data.get('current_location')
-        pickup_location = request.data.get('pickup_location')
-        dropoff_location = request.data.get('dropoff_location')
-        cycle_used = float(request.data.get('cycle_used', 0))
+        try:
+            trip_input, plan, matches = parse_plan_request(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if trip_input is None:
+            return Response({"error": "Missing required fields"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            geometry = parse_geometry_options(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        idempotency_key = request.headers.get('Idempotency-Key') or None
+        trip = None
+        if idempotency_key is not None:
+            if len(idempotency_key) > Trip._meta.get_field('idempotency_key').max_length:
+                return Response({"error": "Idempotency-Key is too long"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                with metrics.stage('db'):
+                    trip = load_trip(idempotency_key=idempotency_key)
+            except Trip.DoesNotExist:
+                pass
+            if trip is not None and not matches(trip, trip_input):
+                return Response(
+                    {"error": "Idempotency-Key was already used for a different trip"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+
+        try:
+            (_, body), replayed = plan_memo.get_or_compute(
+                plan_memo.key(trip_input, geometry, idempotency_key),
+                lambda: (trip and replay_plan(trip, geometry)) or plan(trip_input, geometry, idempotency_key, trip),
+            )
+        except UpstreamError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        replayed = replayed or trip is not None
+        response = HttpResponse(
+            body, content_type="application/json",
+            status=status.HTTP_200_OK if replayed else status.HTTP_201_CREATED,
+        )
+        if replayed:
+            response['Idempotent-Replayed'] = 'true'
+        return response
+
+class PlanJobView(APIView):
+    """Queue a plan request (same body as PlanTripView) for the plan workers.
 
-        if not all([current_location, pickup_location, dropoff_location]):
+    Responds 202 at once with the job id; poll the Location URL for the result.
+    """
+    renderer_classes = [FastJSONRenderer]
+
+    def post(self, request):
+        try:
+            trip_input, _, _ = parse_plan_request(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if trip_input is None:
             return Response({"error": "Missing required fields"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            geometry = parse_geometry_options(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with metrics.stage('db'):
+            job = PlanJob.objects.create(payload=dict(request.data.items()), geometry=geometry)
+        url = reverse('plan-job', args=[job.pk])
+        return Response(
+            {"jobId": job.pk, "status": job.status, "statusUrl": url},
+            status=status.HTTP_202_ACCEPTED, headers={"Location": url},
+        )
+
+class PlanJobDetailView(View):
+    """Poll a plan job: its status, and the plan response once it has succeeded."""
+
+    def get(self, request, job_id):
+        job = PlanJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return JsonResponse({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        body = {
+            "job_id": job.pk,
+            "status": job.status,
+            "attempts": job.attempts,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+        if job.status == PlanJob.Status.SUCCEEDED:
+            # The stored plan is already rendered JSON; embed it without re-parsing.
+            body["result"] = orjson.Fragment(bytes(job.result))
+        elif job.status == PlanJob.Status.FAILED:
+            body["error"] = job.error
+        response = HttpResponse(dumps(convert_keys(body)), content_type="application/json")
+        if job.status in (PlanJob.Status.QUEUED, PlanJob.Status.RUNNING):
+            response['Retry-After'] = str(max(1, round(settings.PLAN_JOB_POLL_INTERVAL)))
+        return response
+
+class BatchPlanTripView(APIView):
+    """Plan a list of trips, streaming one NDJSON line per trip as each plan completes."""
+    renderer_classes = [FastJSONRenderer]
 
+    def post(self, request):
+        trips = request.data.get('trips')
+        if not isinstance(trips, list) or not trips:
+            return Response({"error": "Expected a non-empty list of trips"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(trips) > settings.BATCH_PLAN_MAX_TRIPS:
+            return Response(
+                {"error": f"At most {settings.BATCH_PLAN_MAX_TRIPS} trips per batch"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         try:
-            start_coords = geocode(current_location)
-            pickup_coords = geocode(pickup_location)
-            dropoff_coords = geocode(dropoff_location)
-        except Exception as e:
-            return Response({"error": f"Geocoding failed: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+            geometry = parse_geometry_options(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        lines = (
+            dumps({"index": index, "status": code, **body}) + b"\n"
+            for index, code, body in plan_batch(trips, geometry)
+        )
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
 
-        distance_to_pickup = calculate_distance(start_coords, pickup_coords)
-        distance_to_dropoff = calculate_distance(pickup_coords, dropoff_coords)
-        total_distance = distance_to_pickup + distance_to_dropoff
+class AsyncPlanTripView(View):
+    """PlanTripView for the ASGI deployment.
+
+    Upstream lookups are awaited on the shared async client, so one worker
+    can hold many plans in flight; ORM work runs through sync_to_async.
+    """
+
+    async def post(self, request):
+        try:
+            data = underscoreize(json.loads(request.body or b"{}"))
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            trip_input = parse_trip_input(data) if isinstance(data, dict) else None
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if trip_input is None:
+            return JsonResponse({"error": "Missing required fields"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            geometry = parse_geometry_options(request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            route_coordinates = get_route(start_coords, [], dropoff_coords)
+            with metrics.stage('geocode'):
+                coords = await ageocode_many(list(trip_input[:3]))
         except Exception as e:
-            return Response({"error": f"Route calculation failed: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-
-        num_fueling_stops = int(total_distance / 1000)
-        stops = []
-        stop_coordinates = []
-        distance_per_stop = total_distance / (num_fueling_stops + 1) if num_fueling_stops > 0 else total_distance
-        for i in range(num_fueling_stops):
-            target_distance = (i + 1) * distance_per_stop
-            stop_coords = calculate_distance_along_route(route_coords=route_coordinates, target_distance=target_distance)
-            stops.append({
-                "location": f"Mile {target_distance:.1f} (approx)",
-                "type": "Fueling Stop",
+            return JsonResponse({"error": f"Geocoding failed: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with metrics.stage('route'):
+                route_coordinates = await aget_route(coords[0], [coords[1]], coords[2])
+        except Exception as e:
+            return JsonResponse({"error": f"Route calculation failed: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        with metrics.stage('plan'):
+            trip_input = await sync_to_async(resolve_driver_log)(trip_input)
+            plan = await sync_to_async(compute_plan, thread_sensitive=False)(
+                *trip_input[:4], *coords, route_coordinates, trip_input[5],
+            )
+        response_data = await sync_to_async(save_and_build_response)(
+            trip_input, plan, route_coordinates, coords, geometry,
+        )
+        with metrics.stage('render'):
+            body = dumps(response_data)
+        return HttpResponse(body, content_type="application/json", status=status.HTTP_201_CREATED)
+
+
+def encode_cursor(trip):
+    return base64.urlsafe_b64encode(f"{trip.created_at.isoformat()},{trip.pk}".encode()).decode()
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a list cursor; raises ValueError if it is malformed."""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(',')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (TypeError, UnicodeError, ValueError, base64.binascii.Error):
+        raise ValueError("Invalid cursor")
+    if created_at is None:
+        raise ValueError("Invalid cursor")
+    return created_at, pk
+
+def parse_page_options(params):
+    """Return (limit, cursor position or None) for the trip list; raises ValueError on invalid values."""
+    limit = int(params.get('limit', settings.TRIP_PAGE_SIZE))
+    if not 1 <= limit <= settings.TRIP_PAGE_MAX_SIZE:
+        raise ValueError(f"limit must be between 1 and {settings.TRIP_PAGE_MAX_SIZE}")
+    return limit, decode_cursor(params['cursor']) if params.get('cursor') else None
+
+def trip_page(limit, after):
+    """Trips newest first, starting after the (created_at, id) position; fetches one extra row to detect a next page."""
+    trips = Trip.objects.defer('route_geometry').order_by('-created_at', '-id')
+    if after is not None:
+        created_at, pk = after
+        trips = trips.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    return trips[:limit + 1]
+
+def trip_list_validators(request):
+    """(ETag, Last-Modified) of a trip list page, from its rows' ids and update times only."""
+    if not hasattr(request, '_trip_validators'):
+        try:
+            limit, after = parse_page_options(request.GET)
+        except ValueError:
+            request._trip_validators = None, None
+            return request._trip_validators
+        rows = list(trip_page(limit, after).values_list('pk', 'updated_at'))
+        digest = hashlib.sha256(repr(rows).encode()).hexdigest()[:32]
+        request._trip_validators = f'"{digest}"', max((updated_at for _, updated_at in rows), default=None)
+    return request._trip_validators
+
+def trip_detail_validators(request, trip_id):
+    """(ETag, Last-Modified) of one trip, from its update time."""
+    if not hasattr(request, '_trip_validators'):
+        updated_at = Trip.objects.filter(pk=trip_id).values_list('updated_at', flat=True).first()
+        request._trip_validators = (
+            (None, None) if updated_at is None else (f'"{trip_id}-{updated_at.timestamp():.6f}"', updated_at)
+        )
+    return request._trip_validators
+
+@method_decorator(condition(
+    etag_func=lambda request: trip_list_validators(request)[0],
+    last_modified_func=lambda request: trip_list_validators(request)[1],
+), name='get')
+class TripListView(View):
+    """Saved trips with their duty statuses, newest first.
+
+    Pages are keyset-paginated on (created_at, id): ?limit=N, then the
+    nextCursor of each page as ?cursor=. Responses carry an ETag and
+    Last-Modified computed from the page's ids and update times alone, so
+    an unchanged page answers If-None-Match / If-Modified-Since with a 304
+    before any trip is loaded.
+    """
+
+    def get(self, request):
+        try:
+            limit, after = parse_page_options(request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        with metrics.stage('db'):
+            trips = list(trip_page(limit, after).prefetch_related(
+                Prefetch('duty_statuses', queryset=DutyStatus.objects.order_by('id'))
+            ))
+        next_cursor = encode_cursor(trips[limit - 1]) if len(trips) > limit else None
+        with metrics.stage('serialize'):
+            body = convert_keys({
+                "results": TripSerializer(trips[:limit], many=True).data,
+                "next_cursor": next_cursor,
             })
-            stop_coordinates.append(stop_coords)
+        with metrics.stage('render'):
+            return HttpResponse(dumps(body), content_type="application/json")
+
+@method_decorator(condition(
+    etag_func=lambda request, trip_id: trip_detail_validators(request, trip_id)[0],
+    last_modified_func=lambda request, trip_id: trip_detail_validators(request, trip_id)[1],
+), name='get')
+class TripDetailView(View):
+    """One saved trip with its duty statuses; supports conditional GET like TripListView."""
 
-        trip = Trip.objects.create(
-            current_location=current_location,
-            pickup_location=pickup_location,
-            dropoff_location=dropoff_location,
-            cycle_used=cycle_used,
+    def get(self, request, trip_id):
+        try:
+            with metrics.stage('db'):
+                trip = load_trip(pk=trip_id)
+        except Trip.DoesNotExist:
+            return JsonResponse({"error": "Trip not found"}, status=status.HTTP_404_NOT_FOUND)
+        with metrics.stage('serialize'):
+            body = convert_keys(TripSerializer(trip).data)
+        with metrics.stage('render'):
+            return HttpResponse(dumps(body), content_type="application/json")
+
+@method_decorator(condition(
+    etag_func=lambda request, trip_id: trip_detail_validators(request, trip_id)[0],
+    last_modified_func=lambda request, trip_id: trip_detail_validators(request, trip_id)[1],
+), name='get')
+class TripRouteView(View):
+    """A saved trip's route and stop positions, as stored when it was planned.
+
+    Takes the same simplify/zoom/geometry options as PlanTripView.
+    """
+
+    def get(self, request, trip_id):
+        try:
+            geometry = parse_geometry_options(request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        with metrics.stage('db'):
+            trip = Trip.objects.filter(pk=trip_id).only('endpoint_coords', 'route_geometry').first()
+        if trip is None:
+            return JsonResponse({"error": "Trip not found"}, status=status.HTTP_404_NOT_FOUND)
+        with metrics.stage('decode'):
+            route = trip.route()
+        if route is None:
+            return JsonResponse({"error": "No route stored for this trip"}, status=status.HTTP_404_NOT_FOUND)
+        route_coordinates, stop_coords = route
+        endpoints = trip.endpoint_coords or {}
+        with metrics.stage('serialize'):
+            body = convert_keys({
+                **route_geometry(route_coordinates, **geometry),
+                "start_coords": endpoints.get("start"),
+                "pickup_coords": endpoints.get("pickup"),
+                "stop_coords": stop_coords,
+                "end_coords": endpoints.get("dropoff"),
+            })
+        with metrics.stage('render'):
+            return HttpResponse(dumps(body), content_type="application/json")
+
+def day_logs(trip):
+    """A trip's duty statuses as [(date, [(start, end, status, remarks), ...]), ...] in log order."""
+    days = {}
+    for duty_status in trip.duty_statuses.all():
+        days.setdefault(duty_status.date, []).append(
+            (duty_status.start_time, duty_status.end_time, duty_status.status, duty_status.remarks)
         )
+    return list(days.items())
 
-        driving_time_to_pickup = distance_to_pickup / 60
-        driving_time_to_dropoff = distance_to_dropoff / 60
-        total_driving_time = driving_time_to_pickup + driving_time_to_dropoff
-        total_on_duty_time = total_driving_time + 3  # 1h pickup + 1h dropoff + 1h fueling stops
-        remaining_cycle = 70 - cycle_used - total_on_duty_time
-
-        duty_statuses = []
-        start_date = datetime(2025, 3, 25).date()
-        current_date = start_date
-        day_offset = 0
-        current_location = current_location
-
-        # Start of the trip
-        start_time = "00:00"
-        end_time, days_added = add_time(start_time, driving_time_to_pickup)
-        day_offset += days_added
-        current_date = start_date + timedelta(days=day_offset)
-        duty_statuses.append({
-            "date": str(current_date),
-            "start": start_time,
-            "end": end_time,
-            "status": "Driving",
-            "remarks": f"Driving from {current_location} to {pickup_location}",
-        })
-        current_location = pickup_location
-
-        # Pickup
-        start_time = end_time
-        end_time, days_added = add_time(start_time, 1)
-        day_offset += days_added
-        current_date = start_date + timedelta(days=day_offset)
-        duty_statuses.append({
-            "date": str(current_date),
-            "start": start_time,
-            "end": end_time,
-            "status": "On Duty (Not Driving)",
-            "remarks": f"Pickup at {pickup_location}",
-        })
-
-        # Mandatory 30-minute break
-        start_time = end_time
-        end_time, days_added = add_time(start_time, 0.5)
-        day_offset += days_added
-        current_date = start_date + timedelta(days=day_offset)
-        duty_statuses.append({
-            "date": str(current_date),
-            "start": start_time,
-            "end": end_time,
-            "status": "Off Duty",
-            "remarks": "Mandatory 30-minute break",
-        })
-
-        # Drive to dropoff with fueling stops
-        remaining_distance = distance_to_dropoff
-        distance_covered = 0
-        start_time = end_time
-        for i in range(num_fueling_stops + 1):
-            leg_distance = min(remaining_distance, 1000)
-            driving_time = leg_distance / 60
-            distance_covered += leg_distance
-            remaining_distance -= leg_distance
-
-            # Split driving time across days if it crosses midnight
-            current_time = start_time
-            remaining_driving_time = driving_time
-            while remaining_driving_time > 0:
-                current_minutes = int(current_time.split(":")[0]) * 60 + int(current_time.split(":")[1])
-                minutes_to_midnight = (24 * 60) - current_minutes
-                hours_to_midnight = minutes_to_midnight / 60.0
-
-                if remaining_driving_time <= hours_to_midnight:
-                    end_time, days_added = add_time(current_time, remaining_driving_time)
-                    day_offset += days_added
-                    current_date = start_date + timedelta(days=day_offset)
-                    duty_statuses.append({
-                        "date": str(current_date),
-                        "start": current_time,
-                        "end": end_time,
-                        "status": "Driving",
-                        "remarks": f"Driving towards {dropoff_location}",
-                    })
-                    remaining_driving_time = 0
-                else:
-                    end_time = "24:00"
-                    duty_statuses.append({
-                        "date": str(current_date),
-                        "start": current_time,
-                        "end": end_time,
-                        "status": "Driving",
-                        "remarks": f"Driving towards {dropoff_location}",
-                    })
-                    remaining_driving_time -= hours_to_midnight
-                    current_time = "00:00"
-                    day_offset += 1
-                    current_date = start_date + timedelta(days=day_offset)
-
-            start_time = end_time
-
-            if i < num_fueling_stops:
-                end_time, days_added = add_time(start_time, 0.5)  # 30 minutes for fueling stop
-                day_offset += days_added
-                current_date = start_date + timedelta(days=day_offset)
-                duty_statuses.append({
-                    "date": str(current_date),
-                    "start": start_time,
-                    "end": end_time,
-                    "status": "Off Duty",
-                    "remarks": f"Fueling stop at {stops[i]['location']}",
-                })
-
-                start_time = end_time
-                end_time, days_added = add_time(start_time, 0.5)  # 30 minutes break
-                day_offset += days_added
-                current_date = start_date + timedelta(days=day_offset)
-                duty_statuses.append({
-                    "date": str(current_date),
-                    "start": start_time,
-                    "end": end_time,
-                    "status": "Off Duty",
-                    "remarks": "Mandatory 30-minute break",
-                })
-                start_time = end_time
-
-        # Dropoff
-        end_time, days_added = add_time(start_time, 1)
-        day_offset += days_added
-        current_date = start_date + timedelta(days=day_offset)
-        duty_statuses.append({
-            "date": str(current_date),
-            "start": start_time,
-            "end": end_time,
-            "status": "On Duty (Not Driving)",
-            "remarks": f"Dropoff towards {dropoff_location}",
-        })
-
-        # End of the day
-        start_time = end_time
-        end_time = "24:00"
-        duty_statuses.append({
-            "date": str(current_date),
-            "start": start_time,
-            "end": end_time,
-            "status": "Off Duty",
-            "remarks": "End of day - HOS limit reached",
-        })
-
-        # Save duty statuses
-        for status_entry in duty_statuses:
-            DutyStatus.objects.create(
-                trip=trip,
-                date=status_entry['date'],
-                start_time=status_entry['start'],
-                end_time=status_entry['end'],
-                status=status_entry['status'],
-                remarks=status_entry['remarks'],
-            )
+class TripLogSheetView(View):
+    """A trip's daily log sheets, streamed one day at a time.
 
-        trip.refresh_from_db()
-        serializer = TripSerializer(trip)
-
-        response_data = {
-            "trip": serializer.data,
-            "stops": stops,
-            "total_distance": total_distance,
-            "total_driving_time": total_driving_time,
-            "total_on_duty_time": total_on_duty_time,
-            "remaining_cycle": remaining_cycle,
-            "route_coordinates": route_coordinates,
-            "start_coords": start_coords,
-            "pickup_coords": pickup_coords,
-            "stop_coords": stop_coordinates,
-            "end_coords": dropoff_coords,
-        }
-        camel_case_response = convert_keys(response_data)
-        return Response(camel_case_response, status=status.HTTP_201_CREATED)
\ No newline at end of file
+    ?format=svg (default) returns every day stacked in one SVG document and
+    ?format=pdf a PDF with a page per day; ?date=YYYY-MM-DD limits it to
+    one day. Sheets come from the on-disk cache (see logsheet.LogSheetCache).
+    """
+    CONTENT_TYPES = {"svg": "image/svg+xml", "pdf": "application/pdf"}
+
+    def get(self, request, trip_id):
+        fmt = request.GET.get('format', 'svg')
+        if fmt not in self.CONTENT_TYPES:
+            return JsonResponse({"error": "format must be 'svg' or 'pdf'"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            trip = load_trip(pk=trip_id)
+        except Trip.DoesNotExist:
+            return JsonResponse({"error": "Trip not found"}, status=status.HTTP_404_NOT_FOUND)
+        days = day_logs(trip)
+        if request.GET.get('date'):
+            try:
+                day = date.fromisoformat(request.GET['date'])
+            except ValueError:
+                return JsonResponse({"error": "date must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+            days = [(d, statuses) for d, statuses in days if d == day]
+        if not days:
+            return JsonResponse({"error": "No log for that day"}, status=status.HTTP_404_NOT_FOUND)
+
+        cache = logsheet.LogSheetCache(settings.LOGSHEET_CACHE_DIR)
+        summary = (trip.current_location, trip.pickup_location, trip.dropoff_location)
+        pages = (cache.get(trip.pk, day, statuses, summary, fmt) for day, statuses in days)
+        if fmt == "pdf":
+            body = logsheet.pdf_document(pages, len(days))
+        elif len(days) == 1:
+            body = pages
+        else:
+            body = logsheet.stack_svg(pages, len(days))
+        response = StreamingHttpResponse(body, content_type=self.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'inline; filename="trip-{trip.pk}-logs.{fmt}"'
+        return response
+
+class MetricsView(View):
+    """Latency histograms of this process in the Prometheus text format."""
+
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            raise Http404
+        return HttpResponse(metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,5 @@
 import os
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hos_app.settings')
-app = get_wsgi_application()
\ No newline at end of file
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hos_app.settings_serverless')
+app = get_wsgi_application()